@@ -0,0 +1,60 @@
+#!/bin/bash
+
+set -e
+
+# Build slim Lambda deployment packages into dist/
+#
+# boto3 and its dependencies ship with the python3.11 Lambda runtime, so they
+# are left out of the zips by default. Set INCLUDE_BOTO3=true to bundle the
+# pinned version from requirements.txt instead.
+
+INCLUDE_BOTO3=${INCLUDE_BOTO3:-false}
+BUILD_DIR=build/lambdas
+
+# Packages already provided by the Lambda runtime
+RUNTIME_PACKAGES="boto3|botocore|s3transfer|jmespath|python-dateutil|urllib3|six"
+
+mkdir -p dist
+
+build_lambda() {
+    local lambda_name=$1
+    local src_dir=src/lambdas/$lambda_name
+    local out_dir=$BUILD_DIR/$lambda_name
+
+    echo "Building $lambda_name lambda..."
+
+    rm -rf "$out_dir" "dist/$lambda_name.zip"
+    mkdir -p "$out_dir"
+
+    # Handler code only - no venvs, caches or editor files
+    cp "$src_dir"/*.py "$out_dir"/
+    # Modules shared by every function, packaged next to the handler
+    cp src/lambdas/common/*.py "$out_dir"/
+
+    # Third-party dependencies, minus what the runtime already provides
+    local requirements="$out_dir/requirements.txt"
+    if [ "$INCLUDE_BOTO3" = "true" ]; then
+        cp "$src_dir/requirements.txt" "$requirements"
+    else
+        grep -v -i -E "^($RUNTIME_PACKAGES)([=<>~! ]|$)" "$src_dir/requirements.txt" > "$requirements" || true
+    fi
+
+    if [ -s "$requirements" ]; then
+        pip install -r "$requirements" -t "$out_dir" \
+            --platform manylinux2014_x86_64 --implementation cp --python-version 3.11 \
+            --only-binary=:all: --no-compile --quiet
+    fi
+    rm -f "$requirements"
+
+    # Strip files that are never imported at runtime
+    find "$out_dir" -type d \( -name "__pycache__" -o -name "tests" -o -name "*.dist-info" \) -prune -exec rm -rf {} +
+    find "$out_dir" -type f \( -name "*.pyc" -o -name "*.pyi" \) -delete
+
+    (cd "$out_dir" && zip -qr9 "../../../dist/$lambda_name.zip" .)
+
+    echo "  dist/$lambda_name.zip: $(du -h "dist/$lambda_name.zip" | cut -f1)"
+}
+
+for lambda_name in ${@:-upload process status}; do
+    build_lambda "$lambda_name"
+done
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Summarize per-scan AWS cost from the cost records on the scan items.
+
+Reads cost_upload and cost_process from every scan created in the
+window, prices the operations, and reports cost per 1000 scans overall,
+by detection mode, for fresh vs. reused results, and for the most
+expensive users. Prices default to us-east-1 on-demand list prices and
+can be overridden, e.g. --price dynamodb_rcu=0.283e-6 for eu-west-1.
+Storage and the status polling costs (reported as CloudWatch metrics)
+are not included.
+
+Usage:
+    python scripts/cost_report.py --environment dev [--days 7] [--top-users 10]
+                                  [--price rekognition_calls=0.0008] [--json report.json]
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+
+import boto3
+
+PROJECT = 'cat-detection'
+
+# USD per unit
+DEFAULT_PRICES = {
+    'dynamodb_rcu': 0.25e-6,
+    'dynamodb_wcu': 1.25e-6,
+    'rekognition_calls': 0.001,
+    's3_put_requests': 0.005e-3,
+    's3_get_requests': 0.0004e-3,
+    's3_bytes_in': 0.0,
+    's3_bytes_out': 0.0,
+    'sqs_requests': 0.40e-6
+}
+
+
+def scan_cost(item):
+    """Sum of the upload and process counters recorded on a scan item."""
+    totals = {}
+    for record in (item.get('cost_upload') or {}, item.get('cost_process') or {}):
+        for name, value in record.items():
+            totals[name] = totals.get(name, 0.0) + float(value)
+    return totals
+
+
+def price(counters, prices):
+    return sum(value * prices.get(name, 0.0) for name, value in counters.items())
+
+
+class CostSummary:
+    """Totals for one group of scans."""
+
+    def __init__(self):
+        self.scans = 0
+        self.counters = {}
+
+    def add(self, counters):
+        self.scans += 1
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0.0) + value
+
+    def per_thousand(self, prices):
+        return price(self.counters, prices) * 1000 / self.scans if self.scans else 0.0
+
+    def as_dict(self, prices):
+        return {
+            'scans': self.scans,
+            'cost_usd': round(price(self.counters, prices), 6),
+            'cost_per_1000_scans_usd': round(self.per_thousand(prices), 6),
+            'counters_per_scan': {k: round(v / self.scans, 3) for k, v in sorted(self.counters.items())}
+        }
+
+
+def summarize(items, prices):
+    """Group scan items into overall, per-mode, fresh/reused and per-user summaries."""
+    groups = {'overall': CostSummary(), 'by_mode': {}, 'by_result': {}, 'by_user': {}}
+    for item in items:
+        if 'cost_process' not in item and 'cost_upload' not in item:
+            continue
+        counters = scan_cost(item)
+        groups['overall'].add(counters)
+        groups['by_mode'].setdefault(item.get('detection_mode', 'full'), CostSummary()).add(counters)
+        result = 'error' if item.get('status') == 'ERROR' else ('reused' if item.get('reused_from') else 'fresh')
+        groups['by_result'].setdefault(result, CostSummary()).add(counters)
+        groups['by_user'].setdefault(item.get('user_id', 'anonymous'), CostSummary()).add(counters)
+    return groups
+
+
+def read_scans(table, since):
+    kwargs = {
+        'FilterExpression': 'created_at >= :since',
+        'ExpressionAttributeValues': {':since': since},
+        'ProjectionExpression': 'scan_id, user_id, #status, detection_mode, reused_from, cost_upload, cost_process',
+        'ExpressionAttributeNames': {'#status': 'status'}
+    }
+    while True:
+        response = table.scan(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def parse_prices(overrides):
+    prices = dict(DEFAULT_PRICES)
+    for override in overrides or []:
+        name, _, value = override.partition('=')
+        if name not in prices:
+            raise SystemExit(f"Unknown price '{name}'; expected one of {', '.join(prices)}")
+        prices[name] = float(value)
+    return prices
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-scan cost report')
+    parser.add_argument('--environment', required=True, help='dev, staging or prod')
+    parser.add_argument('--region', default='eu-west-1')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--top-users', type=int, default=10)
+    parser.add_argument('--price', action='append', metavar='NAME=USD', help='Override a unit price')
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+
+    prices = parse_prices(args.price)
+    table = boto3.resource('dynamodb', region_name=args.region).Table(f"{args.environment}-{PROJECT}-scan-results")
+    since = (datetime.utcnow() - timedelta(days=args.days)).isoformat()
+    groups = summarize(read_scans(table, since), prices)
+
+    overall = groups['overall']
+    print(f"Scans with cost records in the last {args.days} days: {overall.scans}")
+    if not overall.scans:
+        return
+    print(f"Cost per 1000 scans: ${overall.per_thousand(prices):.4f}")
+    print("Operations per scan:")
+    for name, value in sorted(overall.counters.items()):
+        share = value * prices.get(name, 0.0) / max(price(overall.counters, prices), 1e-12)
+        print(f"  {name:18s} {value / overall.scans:10.3f}  ({share:6.1%} of cost)")
+    for title, key in (('By detection mode', 'by_mode'), ('By result', 'by_result')):
+        print(f"{title}:")
+        for name, summary in sorted(groups[key].items()):
+            print(f"  {name:12s} {summary.scans:8d} scans  ${summary.per_thousand(prices):.4f} / 1000")
+    print(f"Top {args.top_users} users by total cost:")
+    users = sorted(groups['by_user'].items(), key=lambda u: price(u[1].counters, prices), reverse=True)
+    for user_id, summary in users[:args.top_users]:
+        print(f"  {user_id:24s} {summary.scans:8d} scans  ${price(summary.counters, prices):.4f}")
+
+    if args.json:
+        report = {
+            'days': args.days,
+            'prices': prices,
+            'overall': overall.as_dict(prices),
+            'by_mode': {k: v.as_dict(prices) for k, v in groups['by_mode'].items()},
+            'by_result': {k: v.as_dict(prices) for k, v in groups['by_result'].items()},
+            'by_user': {k: v.as_dict(prices) for k, v in users[:args.top_users]}
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,34 +9,7 @@ echo "Deploying to environment: $ENVIRONMENT"
 
 # Build Lambda packages
 echo "Building Lambda packages..."
-mkdir -p dist
-
-build_lambda() {
-    local lambda_name=$1
-    echo "Building $lambda_name lambda..."
-    
-    cd src/lambdas/$lambda_name
-    
-    # Create virtual environment
-    python3 -m venv venv
-    source venv/bin/activate
-    
-    # Install dependencies
-    pip install -r requirements.txt -t .
-    
-    # Create zip package
-    zip -r ../../../dist/$lambda_name.zip . -x "venv/*" "*.pyc" "__pycache__/*"
-    
-    # Cleanup
-    deactivate
-    rm -rf venv
-    
-    cd ../../..
-}
-
-build_lambda "upload"
-build_lambda "process"
-build_lambda "status"
+./scripts/build-lambdas.sh
 
 # Deploy infrastructure
 echo "Deploying infrastructure..."
@@ -58,7 +31,7 @@ echo "Building and deploying web UI..."
 cd src/web-ui
 
 npm install
-REACT_APP_API_URL=$API_URL npm run build
+REACT_APP_API_URL=$API_URL REACT_APP_BINARY_UPLOAD=true npm run build
 
 # Deploy to S3
 aws s3 sync build/ s3://$WEB_BUCKET --delete --region $AWS_REGION
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Export captured traffic from CloudWatch Logs into a replay corpus.
+
+Functions deployed with capture_mode = "log" print one {"capture": ...}
+line per recorded API event, SQS record and Rekognition response. This
+pulls those lines for a time window from every function's log group and
+writes them, oldest first, as a JSONL corpus for tests/perf/replay.py.
+
+Usage:
+    python scripts/export_capture.py --environment dev --output corpus.jsonl
+                                     [--hours 1] [--end 2026-10-19T12:00:00]
+                                     [--functions upload,process,status,stats,history]
+"""
+import argparse
+import json
+from datetime import datetime, timedelta, timezone
+
+import boto3
+
+PROJECT = 'cat-detection'
+FUNCTIONS = ('upload', 'process', 'status', 'stats', 'history')
+
+# Matches the JSON log lines written by capture.record() in log mode
+FILTER_PATTERN = '{ $.capture.kind = * }'
+
+
+def capture_records(logs, log_group, start, end):
+    """Yield the capture records logged to one log group between start and end."""
+    paginator = logs.get_paginator('filter_log_events')
+    pages = paginator.paginate(
+        logGroupName=log_group,
+        startTime=int(start.timestamp() * 1000),
+        endTime=int(end.timestamp() * 1000),
+        filterPattern=FILTER_PATTERN
+    )
+    try:
+        for page in pages:
+            for event in page.get('events', []):
+                try:
+                    yield json.loads(event['message'])['capture']
+                except (ValueError, KeyError):
+                    continue
+    except logs.exceptions.ResourceNotFoundException:
+        print(f"  {log_group} does not exist, skipping")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export captured traffic into a replay corpus')
+    parser.add_argument('--environment', required=True, help='dev, staging or prod')
+    parser.add_argument('--region', default='eu-west-1')
+    parser.add_argument('--output', required=True, help='Corpus JSONL file to write')
+    parser.add_argument('--hours', type=float, default=1.0, help='Length of the window to export')
+    parser.add_argument('--end', help='End of the window (ISO 8601, UTC); defaults to now')
+    parser.add_argument('--functions', default=','.join(FUNCTIONS), help='Comma-separated functions to export')
+    args = parser.parse_args()
+
+    end = datetime.fromisoformat(args.end) if args.end else datetime.utcnow()
+    # Naive times are UTC, as everywhere else in the project
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    start = end - timedelta(hours=args.hours)
+    logs = boto3.client('logs', region_name=args.region)
+
+    records = []
+    for function in (f.strip() for f in args.functions.split(',') if f.strip()):
+        log_group = f"/aws/lambda/{args.environment}-{PROJECT}-{function}"
+        before = len(records)
+        records.extend(capture_records(logs, log_group, start, end))
+        print(f"  {function:8s} {len(records) - before:8d} records")
+
+    records.sort(key=lambda r: r['t'])
+    with open(args.output, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+
+    kinds = {}
+    for record in records:
+        kinds[record['kind']] = kinds.get(record['kind'], 0) + 1
+    print(f"Wrote {len(records)} records ({', '.join(f'{k}: {v}' for k, v in sorted(kinds.items())) or 'none'}) "
+          f"from {start.isoformat()} to {end.isoformat()} to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Backfill user_shard on scans written before the sharded user index existed.
+
+Runs a segmented parallel Scan for items that have a user_id but no
+user_shard and sets user_shard with a conditional update, so the
+user-shard-created-index GSI covers the full history. Safe to re-run and
+to run while the upload Lambda is writing new scans.
+
+Run with the same HOT_USERS/USER_SHARDS values the upload Lambda uses.
+
+Usage:
+    python scripts/migrate_user_shards.py --environment dev [--segments 8] [--rate 200] [--dry-run]
+"""
+import argparse
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError
+
+from rate_limit import RateLimiter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../src/lambdas/upload'))
+
+from user_shards import user_shard_key
+
+PROJECT = 'cat-detection'
+
+
+class ShardMigration:
+    def __init__(self, table, rate, dry_run=False):
+        self.table = table
+        self.limiter = RateLimiter(rate)
+        self.dry_run = dry_run
+        self.counts = {'scanned': 0, 'updated': 0, 'skipped': 0, 'failed': 0}
+        self._lock = threading.Lock()
+
+    def count(self, key, value=1):
+        with self._lock:
+            self.counts[key] += value
+
+    def migrate_segment(self, segment, total_segments):
+        kwargs = {
+            'Segment': segment,
+            'TotalSegments': total_segments,
+            'FilterExpression': 'attribute_exists(user_id) AND attribute_not_exists(user_shard)',
+            'ProjectionExpression': 'scan_id, user_id'
+        }
+        while True:
+            response = self.table.scan(**kwargs)
+            self.count('scanned', response.get('ScannedCount', 0))
+            for item in response.get('Items', []):
+                self.migrate_item(item)
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def migrate_item(self, item):
+        if self.dry_run:
+            self.count('updated')
+            return
+        self.limiter.acquire()
+        try:
+            self.table.update_item(
+                Key={'scan_id': item['scan_id']},
+                UpdateExpression='SET user_shard = :shard',
+                # The upload Lambda may have written the shard in the meantime
+                ConditionExpression='attribute_not_exists(user_shard)',
+                ExpressionAttributeValues={':shard': user_shard_key(item['user_id'], item['scan_id'])}
+            )
+            self.count('updated')
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                self.count('skipped')
+            else:
+                print(f"Failed to migrate {item['scan_id']}: {str(e)}")
+                self.count('failed')
+
+    def run(self, segments):
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            # list() surfaces exceptions raised inside a segment
+            list(executor.map(lambda s: self.migrate_segment(s, segments), range(segments)))
+        return self.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill user_shard for the sharded user index')
+    parser.add_argument('--environment', required=True, help='dev, staging or prod')
+    parser.add_argument('--region', default='eu-west-1')
+    parser.add_argument('--segments', type=int, default=8, help='Parallel scan segments')
+    parser.add_argument('--rate', type=float, default=200.0, help='Updates per second across all segments')
+    parser.add_argument('--dry-run', action='store_true', help='Count items to migrate without writing')
+    args = parser.parse_args()
+
+    table = boto3.resource('dynamodb', region_name=args.region).Table(
+        f"{args.environment}-{PROJECT}-scan-results")
+    migration = ShardMigration(table, args.rate, dry_run=args.dry_run)
+
+    mode = ' (dry run)' if args.dry_run else ''
+    print(f"Backfilling user_shard on {table.name} with {args.segments} segments{mode}")
+    counts = migration.run(args.segments)
+    print("Summary: " + ' '.join(f"{k}={v}" for k, v in counts.items()))
+    sys.exit(1 if counts['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
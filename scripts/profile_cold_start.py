@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Cold-start profiler for the Lambda handlers.
+
+Imports each handler in a fresh interpreter with `-X importtime`, then times
+init_clients(), and reports the slowest top-level imports per handler.
+With --budget-ms it exits non-zero when import + init exceeds the budget,
+which is how CI keeps cold starts in check.
+
+Usage:
+    python scripts/profile_cold_start.py [--handlers upload,process,status]
+                                         [--top 10] [--budget-ms 1500] [--runs 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+LAMBDAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src/lambdas')
+HANDLERS = ['upload', 'process', 'status']
+
+# Separates interpreter start-up imports from the handler's own in -X importtime output
+MARKER = '--- handler import ---'
+
+# Runs inside the child interpreter; prints a single JSON line on stdout
+CHILD_SCRIPT = """
+import importlib.util, json, os, sys, time
+# Resolve sibling and common modules the way the packaged Lambda does
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[1]), '..', 'common'))
+sys.path.insert(0, os.path.dirname(sys.argv[1]))
+sys.stderr.write(sys.argv[2] + '\\n')
+sys.stderr.flush()
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('handler', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+module.init_clients()
+initialized = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000.0,
+    'init_ms': (initialized - imported) * 1000.0
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Sum -X importtime output per top-level package (cumulative microseconds).
+
+    Only imports made after the handler starts loading are counted, and only
+    at the outermost nesting level so packages are not double counted.
+    """
+    totals = {}
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+    for line in lines:
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        cumulative_us = int(parts[1].strip())
+        raw_name = parts[2].rstrip()
+        depth = len(raw_name) - len(raw_name.lstrip())
+        package = raw_name.strip().split('.')[0]
+        if depth <= 1:
+            totals[package] = totals.get(package, 0) + cumulative_us
+    return totals
+
+
+def profile_handler(name):
+    path = os.path.join(LAMBDAS_DIR, name, 'handler.py')
+    env = dict(os.environ)
+    # Client construction needs a region but makes no network calls
+    env.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+    env.pop('AWS_LAMBDA_FUNCTION_NAME', None)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT, path, MARKER],
+        capture_output=True, text=True, env=env, check=False
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Profiling {name} failed:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['modules'] = parse_importtime(result.stderr)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report cold-start import and init time per handler')
+    parser.add_argument('--handlers', default=','.join(HANDLERS))
+    parser.add_argument('--top', type=int, default=10, help='Number of top-level imports to show')
+    parser.add_argument('--runs', type=int, default=3, help='Take the fastest of N fresh interpreters')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='Fail if import + init exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    over_budget = []
+    for name in args.handlers.split(','):
+        runs = [profile_handler(name) for _ in range(args.runs)]
+        best = min(runs, key=lambda r: r['import_ms'] + r['init_ms'])
+        total_ms = best['import_ms'] + best['init_ms']
+
+        print(f"\n{name}: import {best['import_ms']:.1f}ms + init {best['init_ms']:.1f}ms "
+              f"= {total_ms:.1f}ms")
+        ranked = sorted(best['modules'].items(), key=lambda kv: kv[1], reverse=True)
+        for package, micros in ranked[:args.top]:
+            print(f"  {micros / 1000.0:8.1f}ms  {package}")
+
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            over_budget.append((name, total_ms))
+
+    if over_budget:
+        print()
+        for name, total_ms in over_budget:
+            print(f"FAIL: {name} cold start {total_ms:.1f}ms exceeds budget of {args.budget_ms:.0f}ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Token-bucket rate limiter shared by the operational scripts.
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Allow at most `rate` operations per second, with bursts of up to `burst`.
+
+    Thread-safe, so one limiter can pace a whole worker pool.
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, count=1):
+        """Block until `count` operations may proceed."""
+        if count > self.capacity:
+            raise ValueError(f'cannot acquire {count} tokens from a bucket of {self.capacity:.0f}')
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= count:
+                    self.tokens -= count
+                    return
+                wait = (count - self.tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Re-score or re-detect the stored scan corpus after a taxonomy or detector change.
+
+Two modes:
+  --mode rescore   (default) re-applies the current is_cat_related() taxonomy
+                   to the labels already stored on each scan. No Rekognition
+                   calls, so it is bounded only by DynamoDB throughput.
+  --mode redetect  runs detection again on the original image with the
+                   current detector settings (one Rekognition call per scan).
+                   Scans stored before s3_bucket was recorded on the item
+                   are read from --bucket, which defaults to the images
+                   bucket the upload function is configured with.
+
+Scans are enumerated with a segmented parallel Scan, or read from a
+DynamoDB export to S3 (DYNAMODB_JSON format) downloaded to --export-dir.
+Only COMPLETED scans are touched. Each update is conditional on the
+scan's updated_at being unchanged since it was read, so scans
+re-processed concurrently are skipped rather than overwritten. Unchanged
+results are not written at all. Scans that can't be redone (no stored
+labels, or no image key) are counted as skipped.
+
+Only the scan items are rewritten: the daily statistics counters keep
+the verdicts counted when the scans were first processed.
+
+Progress is checkpointed per segment after every page, with that
+segment's counts, so a resumed run doesn't count again what another
+segment had done but not yet checkpointed; re-run with the same
+--checkpoint to resume. --dry-run reports how many verdicts would
+flip without writing anything.
+
+Usage:
+    python scripts/redetect.py --environment dev --dry-run
+    python scripts/redetect.py --environment prod --segments 32 --write-rate 500 --checkpoint rescore.json
+    python scripts/redetect.py --environment prod --mode redetect --detect-rate 20 --checkpoint redetect.json
+    python scripts/redetect.py --environment prod --export-dir ./export/data --checkpoint rescore.json
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+from rate_limit import RateLimiter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src/lambdas/common'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src/lambdas/process'))
+
+import handler as process_handler
+
+PROJECT = 'cat-detection'
+
+# Items handled per page when reading an export file
+EXPORT_PAGE_SIZE = 100
+
+# Flipped scans listed in the report
+MAX_SAMPLE_FLIPS = 50
+
+COUNTERS = (
+    'scanned', 'eligible', 'skipped', 'unchanged', 'updated',
+    'flipped_to_cat', 'flipped_to_no_cat', 'conflicts', 'failed'
+)
+
+SCAN_ATTRIBUTES = [
+    'scan_id', 'status', 'updated_at', 'cats_found', 'has_cat', 'cat_count', 'highest_confidence',
+    'cat_confidence', 'debug_data', 'debug_labels', 's3_bucket', 's3_key', 'image_key', 'reused_from'
+]
+
+
+def stored_verdict(item):
+    return bool(item.get('cats_found', item.get('has_cat', False)))
+
+
+def result_changed(item, result):
+    """True if writing the result would change what the status endpoint returns."""
+    stored_labels = [label['Name'] for label in item.get('debug_data', {}).get('cat_labels', [])]
+    return (
+        stored_verdict(item) != result['cats_found']
+        or int(item.get('cat_count', 0)) != result['cat_count']
+        or item.get('highest_confidence', item.get('cat_confidence')) != result['highest_confidence']
+        or stored_labels != [label['Name'] for label in result['cat_labels']]
+    )
+
+
+class Checkpoint:
+    """Per-segment resume positions and counts, saved atomically as JSON."""
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.segments = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved['settings'] != settings:
+                raise SystemExit(f"Checkpoint {path} was written with {saved['settings']}, not {settings}")
+            self.segments = saved['segments']
+            print(f"Resuming from {path}: {sum(s['done'] for s in self.segments.values())} segments done")
+
+    def segment(self, segment):
+        return self.segments.get(str(segment), {'done': False, 'position': None, 'counts': {}})
+
+    @property
+    def counts(self):
+        """Totals over every segment, as of each segment's last checkpoint."""
+        totals = {}
+        for state in self.segments.values():
+            for key, value in state.get('counts', {}).items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def save(self, segment, position, done, counts):
+        """Record a segment's position and its own counts up to that position."""
+        with self._lock:
+            self.segments[str(segment)] = {'done': done, 'position': position, 'counts': dict(counts)}
+            if not self.path:
+                return
+            temporary = f"{self.path}.tmp"
+            with open(temporary, 'w') as f:
+                json.dump({'settings': self.settings, 'segments': self.segments}, f)
+            os.replace(temporary, self.path)
+
+
+def table_pages(table, segment, total_segments, position):
+    """Pages of one parallel Scan segment, each with the position to resume after it."""
+    kwargs = {
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'FilterExpression': '#status = :completed',
+        'ProjectionExpression': ', '.join(f'#a{i}' for i in range(len(SCAN_ATTRIBUTES))),
+        'ExpressionAttributeNames': dict({f'#a{i}': a for i, a in enumerate(SCAN_ATTRIBUTES)}, **{'#status': 'status'}),
+        'ExpressionAttributeValues': {':completed': 'COMPLETED'}
+    }
+    if position:
+        kwargs['ExclusiveStartKey'] = position
+    while True:
+        response = table.scan(**kwargs)
+        last_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), response.get('ScannedCount', 0), last_key
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def export_pages(path, position):
+    """Pages of one export data file; the position is the number of lines consumed."""
+    deserializer = TypeDeserializer()
+    consumed = position or 0
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        page, page_start, line_number = [], consumed, consumed
+        for line_number, line in enumerate(f, start=1):
+            if line_number <= consumed:
+                continue
+            if line.strip():
+                image = json.loads(line)['Item']
+                item = {k: deserializer.deserialize(v) for k, v in image.items()}
+                if item.get('status') == 'COMPLETED':
+                    page.append(item)
+            if line_number - page_start >= EXPORT_PAGE_SIZE:
+                yield page, line_number - page_start, line_number
+                page, page_start = [], line_number
+        yield page, line_number - page_start, None
+
+
+class Redetector:
+    def __init__(self, table, mode, workers, write_rate, detect_rate, dry_run=False, checkpoint=None,
+                 bucket=None):
+        self.table = table
+        self.mode = mode
+        self.bucket = bucket
+        self.dry_run = dry_run
+        self.checkpoint = checkpoint
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.write_limiter = RateLimiter(write_rate)
+        self.detect_limiter = RateLimiter(detect_rate)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        # Per segment as well, since each segment checkpoints only its own progress
+        self.segment_counts = {}
+        if checkpoint:
+            for segment, state in checkpoint.segments.items():
+                self.segment_counts[int(segment)] = dict(dict.fromkeys(COUNTERS, 0), **state.get('counts', {}))
+            self.counts.update(checkpoint.counts)
+        self.sample_flips = []
+        self._lock = threading.Lock()
+
+    def count(self, key, value=1, segment=None):
+        with self._lock:
+            self.counts[key] += value
+            if segment is not None:
+                counts = self.segment_counts.setdefault(segment, dict.fromkeys(COUNTERS, 0))
+                counts[key] += value
+
+    def new_result(self, item):
+        """Detection result under the current taxonomy/settings, or None if the scan can't be redone."""
+        if self.mode == 'rescore':
+            labels = item.get('debug_data', {}).get('all_labels', item.get('debug_labels'))
+            if labels is None:
+                return None
+            return process_handler.score_labels(labels, verbose=False)
+        # Older scans don't record their bucket; all images live in the environment's one
+        bucket = item.get('s3_bucket') or self.bucket
+        key = item.get('image_key') or item.get('s3_key')
+        if not bucket or not key:
+            return None
+        self.detect_limiter.acquire()
+        return process_handler.detect_cats_in_image(key, bucket, 'full')
+
+    def process_item(self, item, segment=None):
+        try:
+            result = self.new_result(item)
+            if result is None:
+                self.count('skipped', segment=segment)
+                return
+            self.count('eligible', segment=segment)
+            if not result_changed(item, result):
+                self.count('unchanged', segment=segment)
+                return
+
+            before, after = stored_verdict(item), result['cats_found']
+            if before != after:
+                self.count('flipped_to_cat' if after else 'flipped_to_no_cat', segment=segment)
+                with self._lock:
+                    if len(self.sample_flips) < MAX_SAMPLE_FLIPS:
+                        self.sample_flips.append({
+                            'scan_id': item['scan_id'],
+                            'cats_found': after,
+                            'cat_labels': [label['Name'] for label in result['cat_labels']]
+                        })
+
+            if self.dry_run or self.write_result(item, result):
+                self.count('updated', segment=segment)
+            else:
+                self.count('conflicts', segment=segment)
+        except Exception as e:
+            print(f"Failed to re-process {item.get('scan_id')}: {str(e)}")
+            self.count('failed', segment=segment)
+
+    def write_result(self, item, result):
+        """Store the new result unless the scan changed since it was read; False on conflict."""
+        timestamp = datetime.utcnow().isoformat()
+        fields = {
+            'cats_found': result['cats_found'],
+            'has_cat': result['cats_found'],
+            'cat_count': result['cat_count'],
+            'highest_confidence': result['highest_confidence'],
+            'cat_confidence': result['highest_confidence'],
+            'total_labels': result['total_labels'],
+            'debug_data': {'cat_labels': result['cat_labels'], 'all_labels': result['all_labels']},
+            'debug_labels': result['all_labels'],
+            'updated_at': timestamp
+        }
+        remove = []
+        if self.mode == 'redetect':
+            # A fresh full detection replaces a degraded or near-duplicate result
+            fields['detection_mode'] = 'full'
+            fields['redetected_at'] = timestamp
+            remove = ['reused_from', 'reuse_distance']
+        else:
+            fields['rescored_at'] = timestamp
+
+        update_expression = "SET " + ", ".join(f"#f{i} = :f{i}" for i in range(len(fields)))
+        if remove:
+            update_expression += " REMOVE " + ", ".join(remove)
+        names = {f'#f{i}': name for i, name in enumerate(fields)}
+        names['#status'] = 'status'
+        values = {f':f{i}': value for i, value in enumerate(fields.values())}
+        values[':completed'] = 'COMPLETED'
+        values[':seen'] = item.get('updated_at')
+        # The condition is evaluated against the item before the update
+        seen = f"#f{list(fields).index('updated_at')}"
+
+        self.write_limiter.acquire()
+        try:
+            self.table.update_item(
+                Key={'scan_id': item['scan_id']},
+                UpdateExpression=update_expression,
+                ConditionExpression=f"#status = :completed AND {seen} = :seen",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def run_segment(self, segment, pages):
+        for items, scanned, position in pages:
+            # list() waits for the page so the checkpoint never runs ahead of the writes
+            list(self.pool.map(lambda item: self.process_item(item, segment), items))
+            self.count('scanned', scanned, segment)
+            if self.checkpoint:
+                with self._lock:
+                    counts = dict(self.segment_counts[segment])
+                self.checkpoint.save(segment, position, position is None, counts)
+
+    def run(self, segment_sources):
+        """Process {segment: pages-iterator} in parallel, one thread per segment."""
+        started = time.monotonic()
+        stop = threading.Event()
+
+        def report():
+            while not stop.wait(10):
+                elapsed = time.monotonic() - started
+                print(f"[{elapsed:7.1f}s] " + ' '.join(f"{k}={v}" for k, v in self.counts.items()))
+
+        reporter = threading.Thread(target=report, daemon=True)
+        reporter.start()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(segment_sources))) as segments:
+                futures = [segments.submit(self.run_segment, s, pages) for s, pages in segment_sources.items()]
+                for future in futures:
+                    future.result()
+        finally:
+            stop.set()
+            self.pool.shutdown()
+        return self.counts
+
+
+def images_bucket(environment, region):
+    """The images bucket, as configured on the upload function (its name has a random suffix)."""
+    function = boto3.client('lambda', region_name=region).get_function_configuration(
+        FunctionName=f"{environment}-{PROJECT}-upload"
+    )
+    return function['Environment']['Variables']['S3_BUCKET']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-score or re-detect stored scans')
+    parser.add_argument('--environment', required=True, help='dev, staging or prod')
+    parser.add_argument('--region', default='eu-west-1')
+    parser.add_argument('--mode', choices=['rescore', 'redetect'], default='rescore')
+    parser.add_argument('--segments', type=int, default=16, help='Parallel Scan segments')
+    parser.add_argument('--export-dir', help='Read a DynamoDB export (DYNAMODB_JSON data files) instead of scanning')
+    parser.add_argument('--workers', type=int, default=16, help='Threads re-processing items')
+    parser.add_argument('--write-rate', type=float, default=200.0, help='Conditional updates per second')
+    parser.add_argument('--detect-rate', type=float, default=20.0, help='Rekognition calls per second (redetect)')
+    parser.add_argument('--bucket', help='Images bucket for scans that do not record one (redetect); '
+                                         'defaults to the upload function\'s S3_BUCKET')
+    parser.add_argument('--checkpoint', help='Checkpoint file; re-run with the same file to resume')
+    parser.add_argument('--dry-run', action='store_true', help='Report verdict flips without writing')
+    parser.add_argument('--report', help='Write the counts and a sample of flipped scans to this JSON file')
+    args = parser.parse_args()
+
+    table = boto3.resource('dynamodb', region_name=args.region).Table(f"{args.environment}-{PROJECT}-scan-results")
+    process_handler._aws = {
+        'rekognition': boto3.client('rekognition', region_name=args.region),
+        's3': boto3.client('s3', region_name=args.region),
+        'dynamodb': boto3.resource('dynamodb', region_name=args.region)
+    }
+
+    if args.export_dir:
+        files = sorted(os.path.join(args.export_dir, name) for name in os.listdir(args.export_dir)
+                       if name.endswith(('.json', '.json.gz')))
+        settings = {'mode': args.mode, 'source': 'export', 'files': [os.path.basename(f) for f in files],
+                    'dry_run': args.dry_run}
+    else:
+        settings = {'mode': args.mode, 'source': 'scan', 'segments': args.segments, 'dry_run': args.dry_run}
+    checkpoint = Checkpoint(args.checkpoint, settings)
+
+    bucket = args.bucket
+    if args.mode == 'redetect' and not bucket:
+        bucket = images_bucket(args.environment, args.region)
+        print(f"Scans without s3_bucket are read from {bucket}")
+
+    segment_sources = {}
+    if args.export_dir:
+        for segment, path in enumerate(files):
+            state = checkpoint.segment(segment)
+            if not state['done']:
+                segment_sources[segment] = export_pages(path, state['position'])
+    else:
+        for segment in range(args.segments):
+            state = checkpoint.segment(segment)
+            if not state['done']:
+                segment_sources[segment] = table_pages(table, segment, args.segments, state['position'])
+
+    redetector = Redetector(table, args.mode, args.workers, args.write_rate, args.detect_rate,
+                            dry_run=args.dry_run, checkpoint=checkpoint, bucket=bucket)
+    mode = ' (dry run)' if args.dry_run else ''
+    print(f"{args.mode.capitalize()} of {table.name}: {len(segment_sources)} segments to go{mode}")
+    counts = redetector.run(segment_sources)
+
+    print("\nSummary: " + ' '.join(f"{k}={v}" for k, v in counts.items()))
+    flips = counts['flipped_to_cat'] + counts['flipped_to_no_cat']
+    print(f"Verdicts {'that would flip' if args.dry_run else 'flipped'}: {flips} "
+          f"({counts['flipped_to_cat']} to cat, {counts['flipped_to_no_cat']} to no cat) "
+          f"of {counts['eligible']} scans")
+    if counts['skipped']:
+        missing = 'stored labels' if args.mode == 'rescore' else 'an image key'
+        print(f"Skipped {counts['skipped']} scans without {missing}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'counts': counts, 'sample_flips': redetector.sample_flips}, f, indent=2, default=str)
+
+    sys.exit(1 if counts['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
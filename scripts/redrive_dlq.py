@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Redrive failed scans from the processing dead letter queue.
+
+Pulls messages from the DLQ in batches, resets each affected scan that
+has not completed (ERROR, or a stuck PROCESSING or PENDING - a scan whose
+processor failed before it could update the status) back to PENDING, and
+re-enqueues it on the processing queue with SendMessageBatch at a bounded
+rate. The reset is conditional on the scan's updated_at and redrive_count
+being those just read, so a scan the processor touched in the meantime is
+left alone. Each scan is redriven at most once per run; further DLQ
+copies of it are deleted as duplicates. Scans that can never succeed - missing records, images
+Rekognition rejects, or scans already redriven too often - are reported
+and left in the DLQ (or deleted with --purge-permanent).
+
+Usage:
+    python scripts/redrive_dlq.py --environment dev [--rate 10] [--max-messages 1000]
+                                  [--max-redrives 3] [--dry-run] [--purge-permanent]
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+import boto3
+from botocore.exceptions import ClientError
+
+from rate_limit import RateLimiter
+
+PROJECT = 'cat-detection'
+
+# SQS batch APIs accept at most 10 entries
+SQS_BATCH_SIZE = 10
+
+# Rekognition errors that will fail again no matter how often the scan is retried
+PERMANENT_ERRORS = [
+    'InvalidImageFormatException',
+    'ImageTooLargeException',
+    'InvalidS3ObjectException',
+    'Missing S3 info in message'
+]
+
+
+def classify_failure(item, max_redrives):
+    """
+    Decide whether a scan from the DLQ can be redriven.
+
+    Returns None if it should be retried, otherwise the reason it is permanent.
+    """
+    if item is None:
+        return 'scan record not found'
+    error_message = item.get('error_message', '')
+    for error in PERMANENT_ERRORS:
+        if error in error_message:
+            return error
+    if int(item.get('redrive_count', 0)) >= max_redrives:
+        return f'redriven {max_redrives} times already'
+    return None
+
+
+class Redriver:
+    def __init__(self, sqs, dynamodb, dlq_url, queue_url, table_name, rate,
+                 max_redrives, dry_run=False, purge_permanent=False):
+        self.sqs = sqs
+        self.dynamodb = dynamodb
+        self.table = dynamodb.Table(table_name)
+        self.table_name = table_name
+        self.dlq_url = dlq_url
+        self.queue_url = queue_url
+        self.limiter = RateLimiter(rate, burst=max(SQS_BATCH_SIZE, rate))
+        self.max_redrives = max_redrives
+        self.dry_run = dry_run
+        self.purge_permanent = purge_permanent
+        self.counts = {
+            'received': 0,
+            'redriven': 0,
+            'stale': 0,
+            'duplicate': 0,
+            'permanent': 0,
+            'failed': 0
+        }
+        self.permanent = {}
+        self.seen = set()
+
+    def run(self, max_messages, visibility_timeout):
+        started = time.monotonic()
+        empty_polls = 0
+        while self.counts['received'] < max_messages and empty_polls < 2:
+            batch_size = min(SQS_BATCH_SIZE, max_messages - self.counts['received'])
+            response = self.sqs.receive_message(
+                QueueUrl=self.dlq_url,
+                MaxNumberOfMessages=batch_size,
+                WaitTimeSeconds=2,
+                # Hide received messages for the rest of the run so they are not seen twice
+                VisibilityTimeout=visibility_timeout
+            )
+            messages = response.get('Messages', [])
+            if not messages:
+                empty_polls += 1
+                continue
+            empty_polls = 0
+            self.counts['received'] += len(messages)
+            self.process_batch(messages)
+
+            elapsed = time.monotonic() - started
+            print(f"[{elapsed:7.1f}s] " + ' '.join(f"{k}={v}" for k, v in self.counts.items()))
+        return self.counts
+
+    def process_batch(self, messages):
+        scan_ids = {}
+        for message in messages:
+            try:
+                scan_ids[message['MessageId']] = json.loads(message['Body'])['scan_id']
+            except (ValueError, KeyError, TypeError):
+                scan_ids[message['MessageId']] = None
+
+        items = self.fetch_scans([s for s in scan_ids.values() if s])
+
+        to_send = []
+        to_delete = []
+        for message in messages:
+            scan_id = scan_ids[message['MessageId']]
+            item = items.get(scan_id) if scan_id else None
+
+            if item is not None and item.get('status') == 'COMPLETED':
+                # Succeeded on a later attempt; the DLQ copy is stale
+                self.counts['stale'] += 1
+                to_delete.append(message)
+                continue
+
+            if scan_id in self.seen:
+                # Another copy of a scan already handled in this run
+                self.counts['duplicate'] += 1
+                to_delete.append(message)
+                continue
+            if scan_id:
+                self.seen.add(scan_id)
+
+            reason = classify_failure(item, self.max_redrives) if scan_id else 'malformed message body'
+            if reason:
+                self.counts['permanent'] += 1
+                self.permanent[scan_id or message['MessageId']] = reason
+                if self.purge_permanent:
+                    to_delete.append(message)
+                continue
+
+            if self.dry_run or self.reset_scan(item):
+                to_send.append(message)
+            elif self.scan_status(scan_id) == 'COMPLETED':
+                # Completed since the batch was read
+                self.counts['stale'] += 1
+                to_delete.append(message)
+            else:
+                # Changed under us in some other way; leave the message for the next run
+                self.counts['failed'] += 1
+
+        if self.dry_run:
+            self.counts['redriven'] += len(to_send)
+            return
+
+        sent = self.send_batch(to_send)
+        self.delete_batch(sent + to_delete)
+
+    def fetch_scans(self, scan_ids):
+        """Read the scan records for a batch with a single BatchGetItem."""
+        items = {}
+        request = {self.table_name: {'Keys': [{'scan_id': s} for s in set(scan_ids)]}} if scan_ids else None
+        while request:
+            response = self.dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(self.table_name, []):
+                items[item['scan_id']] = item
+            request = response.get('UnprocessedKeys') or None
+        return items
+
+    def scan_status(self, scan_id):
+        item = self.table.get_item(Key={'scan_id': scan_id}, ConsistentRead=True).get('Item')
+        return item.get('status') if item else None
+
+    def reset_scan(self, item):
+        """Move a scan back to PENDING; False if it changed since it was read."""
+        values = {
+            ':pending': 'PENDING',
+            ':updated': datetime.utcnow().isoformat(),
+            ':one': 1
+        }
+        # Every status change writes updated_at, and every redrive bumps redrive_count
+        conditions = []
+        for name, attribute in (('#updated', 'updated_at'), ('#redrives', 'redrive_count')):
+            if attribute in item:
+                conditions.append(f"{name} = :seen_{attribute}")
+                values[f':seen_{attribute}'] = item[attribute]
+            else:
+                conditions.append(f"attribute_not_exists({name})")
+        try:
+            self.table.update_item(
+                Key={'scan_id': item['scan_id']},
+                UpdateExpression="SET #status = :pending, #updated = :updated "
+                                 "ADD #redrives :one REMOVE error_message",
+                ConditionExpression=" AND ".join(conditions),
+                ExpressionAttributeNames={'#status': 'status', '#updated': 'updated_at',
+                                          '#redrives': 'redrive_count'},
+                ExpressionAttributeValues=values
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def restore_error(self, scan_id):
+        """Undo reset_scan when the message could not be re-enqueued."""
+        try:
+            self.table.update_item(
+                Key={'scan_id': scan_id},
+                UpdateExpression="SET #status = :error, error_message = :message",
+                ConditionExpression="#status = :pending",
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':error': 'ERROR',
+                    ':pending': 'PENDING',
+                    ':message': 'Redrive failed to re-enqueue the scan'
+                }
+            )
+        except ClientError as e:
+            print(f"Failed to restore ERROR status for {scan_id}: {str(e)}")
+
+    def send_batch(self, messages):
+        """Re-enqueue messages at the configured rate; returns those that were sent."""
+        if not messages:
+            return []
+        self.limiter.acquire(len(messages))
+        by_id = {str(i): m for i, m in enumerate(messages)}
+        response = self.sqs.send_message_batch(
+            QueueUrl=self.queue_url,
+            Entries=[{'Id': i, 'MessageBody': m['Body']} for i, m in by_id.items()]
+        )
+        for failure in response.get('Failed', []):
+            message = by_id[failure['Id']]
+            scan_id = json.loads(message['Body'])['scan_id']
+            print(f"Failed to re-enqueue {scan_id}: {failure.get('Message', failure.get('Code'))}")
+            self.restore_error(scan_id)
+            self.counts['failed'] += 1
+        sent = [by_id[s['Id']] for s in response.get('Successful', [])]
+        self.counts['redriven'] += len(sent)
+        return sent
+
+    def delete_batch(self, messages):
+        if not messages:
+            return
+        response = self.sqs.delete_message_batch(
+            QueueUrl=self.dlq_url,
+            Entries=[{'Id': str(i), 'ReceiptHandle': m['ReceiptHandle']} for i, m in enumerate(messages)]
+        )
+        for failure in response.get('Failed', []):
+            print(f"Failed to delete DLQ message: {failure.get('Message', failure.get('Code'))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Redrive failed scans from the processing DLQ')
+    parser.add_argument('--environment', required=True, help='dev, staging or prod')
+    parser.add_argument('--region', default='eu-west-1')
+    parser.add_argument('--rate', type=float, default=10.0, help='Messages re-enqueued per second')
+    parser.add_argument('--max-messages', type=int, default=1000)
+    parser.add_argument('--max-redrives', type=int, default=3,
+                        help='Treat scans already redriven this many times as permanent failures')
+    parser.add_argument('--visibility-timeout', type=int, default=900,
+                        help='Seconds received DLQ messages stay hidden during the run')
+    parser.add_argument('--dry-run', action='store_true', help='Classify messages without changing anything')
+    parser.add_argument('--purge-permanent', action='store_true',
+                        help='Delete permanently failing messages from the DLQ')
+    parser.add_argument('--report', help='Write the permanent failures to this JSON file')
+    args = parser.parse_args()
+
+    prefix = f"{args.environment}-{PROJECT}"
+    sqs = boto3.client('sqs', region_name=args.region)
+    dynamodb = boto3.resource('dynamodb', region_name=args.region)
+
+    redriver = Redriver(
+        sqs,
+        dynamodb,
+        dlq_url=sqs.get_queue_url(QueueName=f"{prefix}-processing-dlq")['QueueUrl'],
+        queue_url=sqs.get_queue_url(QueueName=f"{prefix}-processing-queue")['QueueUrl'],
+        table_name=f"{prefix}-scan-results",
+        rate=args.rate,
+        max_redrives=args.max_redrives,
+        dry_run=args.dry_run,
+        purge_permanent=args.purge_permanent
+    )
+
+    mode = ' (dry run)' if args.dry_run else ''
+    print(f"Redriving up to {args.max_messages} messages at {args.rate:g}/s{mode}")
+    counts = redriver.run(args.max_messages, args.visibility_timeout)
+
+    print("\nSummary: " + ' '.join(f"{k}={v}" for k, v in counts.items()))
+    if redriver.permanent:
+        print("Permanently failing scans:")
+        for scan_id, reason in list(redriver.permanent.items())[:20]:
+            print(f"  {scan_id}: {reason}")
+        if len(redriver.permanent) > 20:
+            print(f"  ... and {len(redriver.permanent) - 20} more")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'counts': counts, 'permanent': redriver.permanent}, f, indent=2)
+
+    sys.exit(1 if counts['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Opt-in recording of real traffic for offline replay (tests/perf/replay.py).
+
+With CAPTURE_MODE set, handlers record what they were asked to do: API
+Gateway events, SQS records and Rekognition detect_labels responses, as
+one JSON record per line. Records are sanitized before they leave the
+handler - image bytes are replaced by their size, type and dimensions,
+user ids by stable pseudonyms, and only the headers the handlers read
+are kept - so a corpus has production-shaped payloads and label
+distributions without any customer data.
+
+CAPTURE_MODE:
+    off   (default) record nothing
+    log   print each record as a {"capture": ...} log line; deployed
+          functions use this, and scripts/export_capture.py pulls the
+          lines from CloudWatch Logs into a corpus file
+    file  append to CAPTURE_DIR/<source>-<pid>.jsonl, for local runs
+
+CAPTURE_SAMPLE_RATE (default 1.0) records that fraction of requests.
+Sampling is keyed on the scan id where there is one, so the status polls
+of a recorded scan are recorded too. CAPTURE_SALT salts the user id
+pseudonyms.
+
+Shared by the upload, process and status Lambdas; scripts/build-lambdas.sh
+copies src/lambdas/common into each package.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from decimal import Decimal
+
+CORPUS_VERSION = 1
+
+DEFAULT_CAPTURE_DIR = '/tmp/capture'
+
+# Request headers the handlers act on; everything else (auth, cookies, IPs) is dropped
+KEPT_HEADERS = ('content-type', 'if-none-match', 'accept')
+
+# User ids left as they are: shared ids that shape the load but identify nobody
+PUBLIC_USER_IDS = ('anonymous',)
+
+_write_lock = threading.Lock()
+
+
+def capture_mode():
+    mode = os.environ.get('CAPTURE_MODE', 'off').strip().lower()
+    return mode if mode in ('log', 'file') else 'off'
+
+
+def sample_rate():
+    try:
+        return min(1.0, max(0.0, float(os.environ.get('CAPTURE_SAMPLE_RATE', '1.0'))))
+    except ValueError:
+        return 0.0
+
+
+def active(key=None):
+    """
+    Whether to record this request. Checked before building a record, which can be costly.
+    """
+    if capture_mode() == 'off':
+        return False
+    rate = sample_rate()
+    if key is None:
+        return random.random() < rate
+    # Deterministic per key, so every record about one scan is kept or dropped together
+    return zlib.crc32(str(key).encode('utf-8')) % 10000 < rate * 10000
+
+
+def pseudonym(user_id):
+    """Stable stand-in for a user id; the same user maps to the same pseudonym in every record."""
+    if user_id is None or user_id in PUBLIC_USER_IDS:
+        return user_id
+    salt = os.environ.get('CAPTURE_SALT', '')
+    return 'user-' + hashlib.sha256(f"{salt}{user_id}".encode('utf-8')).hexdigest()[:16]
+
+
+def sanitize_api_event(event, body=None):
+    """
+    The parts of an API Gateway proxy event the handlers read, with user ids pseudonymized.
+
+    `body` replaces the request body; by default only its length is kept.
+    """
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    path_params = dict(event.get('pathParameters') or {})
+    query_params = dict(event.get('queryStringParameters') or {})
+    for params in (path_params, query_params):
+        if 'user_id' in params:
+            params['user_id'] = pseudonym(params['user_id'])
+
+    raw_body = event.get('body')
+    return {
+        'httpMethod': event.get('httpMethod'),
+        'resource': event.get('resource'),
+        'pathParameters': path_params or None,
+        'queryStringParameters': query_params or None,
+        'headers': {k: headers[k] for k in KEPT_HEADERS if k in headers},
+        'isBase64Encoded': bool(event.get('isBase64Encoded')),
+        'body': body if body is not None else ({'length': len(raw_body)} if raw_body else None)
+    }
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def record(kind, source, data, started_at=None):
+    """
+    Write one corpus record: kind is 'api', 'sqs' or 'rekognition', source the handler that saw it.
+
+    Never raises; a capture failure must not fail the request.
+    """
+    mode = capture_mode()
+    if mode == 'off':
+        return
+    try:
+        line = json.dumps({
+            'v': CORPUS_VERSION,
+            't': round(started_at if started_at is not None else time.time(), 3),
+            'kind': kind,
+            'source': source,
+            'data': data
+        }, default=_json_default)
+        if mode == 'log':
+            print(f'{{"capture": {line}}}')
+            return
+        directory = os.environ.get('CAPTURE_DIR', DEFAULT_CAPTURE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{source}-{os.getpid()}.jsonl")
+        with _write_lock:
+            with open(path, 'a') as f:
+                f.write(line + '\n')
+    except Exception as e:
+        print(f"Capture failed: {str(e)}")
@@ -0,0 +1,112 @@
+"""
+Per-scan accounting of billable AWS operations.
+
+A CostMeter collects the DynamoDB capacity (from ReturnConsumedCapacity),
+Rekognition calls, S3 requests and bytes, and SQS requests spent on one
+scan. Handlers attach the totals to the scan item (cost_upload,
+cost_process) and log them in CloudWatch embedded metric format;
+scripts/cost_report.py turns them into money.
+
+Shared by the upload, process and status Lambdas; scripts/build-lambdas.sh
+copies src/lambdas/common into each package.
+"""
+import json
+import threading
+import time
+from decimal import Decimal
+
+METRIC_NAMESPACE = 'CatDetection/Cost'
+
+COUNTERS = (
+    'dynamodb_rcu',
+    'dynamodb_wcu',
+    'rekognition_calls',
+    's3_get_requests',
+    's3_put_requests',
+    's3_bytes_in',
+    's3_bytes_out',
+    'sqs_requests'
+)
+
+METRIC_UNITS = {
+    's3_bytes_in': 'Bytes',
+    's3_bytes_out': 'Bytes'
+}
+
+
+def consumed_capacity(response):
+    """Total capacity units in a response made with ReturnConsumedCapacity='TOTAL'."""
+    consumed = response.get('ConsumedCapacity') or []
+    # Single-table calls return a dict, batch calls a list of per-table dicts
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum(float(entry.get('CapacityUnits', 0)) for entry in consumed)
+
+
+class CostMeter:
+    """Thread-safe counters for the operations performed on behalf of one scan."""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    def add(self, counter, amount=1):
+        with self._lock:
+            self.counts[counter] += amount
+
+    def dynamodb_read(self, response):
+        self.add('dynamodb_rcu', consumed_capacity(response))
+        return response
+
+    def dynamodb_write(self, response):
+        self.add('dynamodb_wcu', consumed_capacity(response))
+        return response
+
+    def rekognition_call(self):
+        self.add('rekognition_calls')
+
+    def s3_get(self, size):
+        self.add('s3_get_requests')
+        self.add('s3_bytes_out', size)
+
+    def s3_put(self, size):
+        self.add('s3_put_requests')
+        self.add('s3_bytes_in', size)
+
+    def sqs_request(self):
+        self.add('sqs_requests')
+
+    def as_item(self):
+        """The counters as a DynamoDB map (numbers as Decimal)."""
+        with self._lock:
+            return {k: Decimal(str(round(v, 2))) for k, v in self.counts.items() if v}
+
+    def as_dict(self):
+        with self._lock:
+            return {k: v for k, v in self.counts.items() if v}
+
+    def emit(self, stage, user_id, detection_mode):
+        """
+        Log the counters as CloudWatch metrics per stage and detection mode.
+
+        The user id is a plain log property, not a dimension: a per-user
+        dimension would create one metric series per user.
+        """
+        values = self.as_dict()
+        if not values:
+            return
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRIC_NAMESPACE,
+                    'Dimensions': [['Stage', 'DetectionMode']],
+                    'Metrics': [{'Name': k, 'Unit': METRIC_UNITS.get(k, 'Count')} for k in values]
+                }]
+            },
+            'Stage': stage,
+            'UserId': user_id or 'anonymous',
+            'DetectionMode': detection_mode or 'full'
+        }
+        record.update(values)
+        print(json.dumps(record))
@@ -1,9 +1,59 @@
+import io
 import json
 import boto3
 import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from datetime import datetime
 
+from botocore.exceptions import ClientError
+
+import capture
+import perceptual_hash
+import thumbnails
+from cost_meter import CostMeter
+
+# Rekognition settings, the same in every detection mode so a verdict never
+# depends on how busy the system was
+DETECTION_SETTINGS = {'MaxLabels': 20, 'MinConfidence': 70.0}
+
+# The upload Lambda queues scans in 'degraded' mode while the processing backlog
+# is long. Those skip the optional work - downloading the image for the
+# near-duplicate lookup and index, and thumbnails - to drain the backlog faster.
+DETECTION_MODES = ('full', 'degraded')
+
+# stats_recorded value of a scan whose failure, not its result, is in the statistics
+ERROR_STATS_RECORDED = 'ERROR'
+
+# Band index entries read per query page, and at most per band
+PHASH_BAND_PAGE_SIZE = 200
+DEFAULT_PHASH_MAX_BAND_ENTRIES = 1000
+
+# Derived display images are stored under this prefix, next to images/
+THUMBNAIL_PREFIX = 'thumbnails'
+
+# Worker pool for uploading thumbnails in parallel; reused across warm invocations
+_executor = ThreadPoolExecutor(max_workers=4)
+
+# AWS clients, created once per container by init_clients()
+_aws = None
+
+
+def init_clients():
+    """
+    Create the AWS clients on first use and reuse them across warm invocations.
+    """
+    global _aws
+    if _aws is None:
+        _aws = {
+            'rekognition': boto3.client('rekognition'),
+            's3': boto3.client('s3'),
+            'dynamodb': boto3.resource('dynamodb')
+        }
+    return _aws
+
 def process(event, context):
     """
     Process SQS messages containing image scan requests.
@@ -13,10 +63,6 @@ def process(event, context):
     try:
         print(f"Process Lambda started. Available env vars: {list(os.environ.keys())}")
         
-        # Initialize AWS clients
-        rekognition = boto3.client('rekognition')
-        dynamodb = boto3.resource('dynamodb')
-        
         # Get environment variables
         dynamodb_table = os.environ['DYNAMODB_TABLE']
         print(f"Using DynamoDB table: {dynamodb_table}")
@@ -29,29 +75,91 @@ def process(event, context):
             # Get S3 info from the message (not environment variables)
             s3_bucket = message_body.get('s3_bucket')
             image_key = message_body.get('image_key') or message_body.get('s3_key')
+            detection_mode = message_body.get('detection_mode', 'full')
+            if detection_mode not in DETECTION_MODES:
+                detection_mode = 'full'
             
             print(f"Processing scan {scan_id} for image {image_key} in bucket {s3_bucket}")
             
             if not s3_bucket or not image_key:
                 raise Exception(f"Missing S3 info in message: bucket={s3_bucket}, key={image_key}")
             
+            # Billable operations for this scan, stored on the item as cost_process
+            meter = CostMeter()
+            capturing = capture.active(scan_id)
+            started_at = time.time()
+            image_bytes = None
+            
             # Update status to processing
-            update_scan_status(scan_id, 'PROCESSING', dynamodb_table)
+            scan = update_scan_status(scan_id, 'PROCESSING', dynamodb_table, meter=meter)
+            user_id = scan.get('user_id', 'anonymous')
             
             try:
-                # Perform cat detection
-                result = detect_cats_in_image(image_key, s3_bucket)
+                # Download the image once for hashing and thumbnails, if either is enabled;
+                # degraded mode does neither
+                optional_work = detection_mode == 'full'
+                wants_thumbnails = optional_work and thumbnails_enabled()
+                if optional_work and (os.environ.get('PHASH_TABLE') or wants_thumbnails):
+                    image_bytes = fetch_image(s3_bucket, image_key, meter)
+                
+                # Reuse the result of a near-duplicate image if one has already been scanned
+                image_hash = compute_image_hash(image_bytes)
+                reused = find_near_duplicate(image_hash, scan_id, dynamodb_table, meter) if image_hash is not None else None
+                
+                extra_fields = {'detection_mode': detection_mode}
+                if message_body.get('cost_upload'):
+                    extra_fields['cost_upload'] = {
+                        k: Decimal(str(v)) for k, v in message_body['cost_upload'].items()
+                    }
+                if image_hash is not None:
+                    extra_fields['phash'] = perceptual_hash.to_hex(image_hash)
+                
+                if reused:
+                    result = reused['result']
+                    extra_fields['reused_from'] = reused['scan_id']
+                    extra_fields['reuse_distance'] = reused['distance']
+                    print(f"Reusing result of scan {reused['scan_id']} (distance {reused['distance']})")
+                else:
+                    # Perform cat detection
+                    result = detect_cats_in_image(image_key, s3_bucket, detection_mode, meter,
+                                                  capture_scan_id=scan_id if capturing else None)
+                
+                # Only scans with their own detection result become reuse sources.
+                # Indexed before the results are stored so the cost record includes it;
+                # lookups ignore sources that are not COMPLETED.
+                if image_hash is not None and not reused:
+                    index_image_hash(image_hash, scan_id, meter)
+                
+                # Small display images
+                if wants_thumbnails and image_bytes is not None:
+                    thumbnail_keys = store_thumbnails(scan_id, s3_bucket, image_bytes, result['cat_labels'], meter)
+                    if thumbnail_keys:
+                        extra_fields['thumbnail_keys'] = thumbnail_keys
                 
                 # Store results
-                store_scan_results(scan_id, image_key, result, dynamodb_table)
+                extra_fields['cost_process'] = meter.as_item()
+                store_scan_results(scan_id, image_key, result, dynamodb_table, extra_fields, meter=meter)
                 
                 print(f"Successfully processed scan {scan_id}")
                 
             except Exception as e:
                 print(f"Error processing scan {scan_id}: {str(e)}")
                 # Update status to error
-                update_scan_status(scan_id, 'ERROR', dynamodb_table, str(e))
+                scan = update_scan_status(scan_id, 'ERROR', dynamodb_table, str(e),
+                                          extra_fields={'cost_process': meter.as_item()}, meter=meter)
+                # SQS retries a failing message several times; count the failure once per scan
+                error_day = stats_day()
+                if claim_error_stats(scan_id, dynamodb_table, error_day, meter):
+                    record_scan_stats(scan_id, scan.get('user_id', 'anonymous'), error=True, day=error_day,
+                                      meter=meter)
                 raise
+            finally:
+                meter.emit('process', user_id, detection_mode)
+                if capturing:
+                    capture.record('sqs', 'process', {
+                        'message': message_body,
+                        'image': capture_image_summary(image_bytes)
+                    }, started_at=started_at)
     
     except Exception as e:
         print(f"Error in process handler: {str(e)}")
@@ -59,16 +167,20 @@ def process(event, context):
         print(traceback.format_exc())
         raise
 
-def detect_cats_in_image(image_key, bucket_name):
+def detect_cats_in_image(image_key, bucket_name, detection_mode='full', meter=None, capture_scan_id=None):
     """
     Use AWS Rekognition to detect cats in the image.
+    
+    With capture_scan_id set, the raw response is recorded for offline replay.
     """
+    meter = meter or CostMeter()
     try:
-        rekognition = boto3.client('rekognition')
+        rekognition = init_clients()['rekognition']
         
-        print(f"Calling Rekognition for s3://{bucket_name}/{image_key}")
+        print(f"Calling Rekognition for s3://{bucket_name}/{image_key} ({detection_mode} mode)")
         
         # Call Rekognition to detect labels
+        meter.rekognition_call()
         response = rekognition.detect_labels(
             Image={
                 'S3Object': {
@@ -76,14 +188,19 @@ def detect_cats_in_image(image_key, bucket_name):
                     'Name': image_key
                 }
             },
-            MaxLabels=20,
-            MinConfidence=70.0
+            **DETECTION_SETTINGS
         )
         
         print(f"Rekognition found {len(response['Labels'])} labels")
         
-        # Process the response to find cat-related labels
-        cat_labels = []
+        if capture_scan_id:
+            capture.record('rekognition', 'process', {
+                'scan_id': capture_scan_id,
+                'image_key': image_key,
+                'detection_mode': detection_mode,
+                'Labels': response['Labels']
+            })
+        
         all_labels = []
         
         for label in response['Labels']:
@@ -114,30 +231,8 @@ def detect_cats_in_image(image_key, bucket_name):
                 label_data['Instances'].append(instance_data)
             
             all_labels.append(label_data)
-            
-            # Check if this is a cat-related label
-            if is_cat_related(label['Name']):
-                cat_labels.append(label_data)
-                print(f"Found cat label: {label['Name']} with confidence {label['Confidence']}")
         
-        # Determine if cats were found
-        cats_found = len(cat_labels) > 0
-        
-        # Calculate highest confidence cat detection
-        highest_confidence = Decimal('0')
-        if cat_labels:
-            highest_confidence = max(label['Confidence'] for label in cat_labels)
-        
-        print(f"Cat detection result: cats_found={cats_found}, count={len(cat_labels)}, highest_confidence={highest_confidence}")
-        
-        return {
-            'cats_found': cats_found,
-            'cat_count': len(cat_labels),
-            'highest_confidence': highest_confidence,
-            'cat_labels': cat_labels,
-            'all_labels': all_labels,
-            'total_labels': len(all_labels)
-        }
+        return score_labels(all_labels)
         
     except Exception as e:
         print(f"Error in detect_cats_in_image: {str(e)}")
@@ -145,6 +240,41 @@ def detect_cats_in_image(image_key, bucket_name):
         print(traceback.format_exc())
         raise
 
+def score_labels(all_labels, verbose=True):
+    """
+    Turn a list of stored-format labels into a detection result using the current taxonomy.
+    
+    Also used by scripts/redetect.py to re-score stored labels without calling Rekognition.
+    """
+    # Process the labels to find cat-related ones
+    cat_labels = []
+    for label_data in all_labels:
+        # Check if this is a cat-related label
+        if is_cat_related(label_data['Name']):
+            cat_labels.append(label_data)
+            if verbose:
+                print(f"Found cat label: {label_data['Name']} with confidence {label_data['Confidence']}")
+    
+    # Determine if cats were found
+    cats_found = len(cat_labels) > 0
+    
+    # Calculate highest confidence cat detection
+    highest_confidence = Decimal('0')
+    if cat_labels:
+        highest_confidence = max(label['Confidence'] for label in cat_labels)
+    
+    if verbose:
+        print(f"Cat detection result: cats_found={cats_found}, count={len(cat_labels)}, highest_confidence={highest_confidence}")
+    
+    return {
+        'cats_found': cats_found,
+        'cat_count': len(cat_labels),
+        'highest_confidence': highest_confidence,
+        'cat_labels': cat_labels,
+        'all_labels': all_labels,
+        'total_labels': len(all_labels)
+    }
+
 def is_cat_related(label_name):
     """
     Check if a label is cat-related with improved logic.
@@ -169,13 +299,13 @@ def is_cat_related(label_name):
     # Check for cat keywords
     return any(keyword in label_lower for keyword in cat_keywords)
 
-def update_scan_status(scan_id, status, table_name, error_message=None):
+def update_scan_status(scan_id, status, table_name, error_message=None, extra_fields=None, meter=None):
     """
-    Update the scan status in DynamoDB.
+    Update the scan status in DynamoDB and return the updated item.
     """
+    meter = meter or CostMeter()
     try:
-        dynamodb = boto3.resource('dynamodb')
-        table = dynamodb.Table(table_name)
+        table = init_clients()['dynamodb'].Table(table_name)
         
         update_expression = "SET #status = :status, #updated = :updated"
         expression_attribute_names = {
@@ -192,26 +322,34 @@ def update_scan_status(scan_id, status, table_name, error_message=None):
             expression_attribute_names['#error'] = 'error_message'
             expression_attribute_values[':error'] = error_message
         
-        table.update_item(
+        for index, (key, value) in enumerate((extra_fields or {}).items()):
+            update_expression += f", #x{index} = :x{index}"
+            expression_attribute_names[f'#x{index}'] = key
+            expression_attribute_values[f':x{index}'] = value
+        
+        response = meter.dynamodb_write(table.update_item(
             Key={'scan_id': scan_id},
             UpdateExpression=update_expression,
             ExpressionAttributeNames=expression_attribute_names,
-            ExpressionAttributeValues=expression_attribute_values
-        )
+            ExpressionAttributeValues=expression_attribute_values,
+            ReturnValues='ALL_NEW',
+            ReturnConsumedCapacity='TOTAL'
+        ))
         
         print(f"Updated scan {scan_id} status to {status}")
+        return response.get('Attributes', {})
         
     except Exception as e:
         print(f"Error updating scan status: {str(e)}")
         raise
 
-def store_scan_results(scan_id, image_key, detection_result, table_name):
+def store_scan_results(scan_id, image_key, detection_result, table_name, extra_fields=None, meter=None):
     """
     Store the complete scan results in DynamoDB.
     """
+    meter = meter or CostMeter()
     try:
-        dynamodb = boto3.resource('dynamodb')
-        table = dynamodb.Table(table_name)
+        table = init_clients()['dynamodb'].Table(table_name)
         
         # Prepare the item for DynamoDB with both old and new field names for compatibility
         timestamp = datetime.utcnow().isoformat()
@@ -219,7 +357,6 @@ def store_scan_results(scan_id, image_key, detection_result, table_name):
         highest_confidence = detection_result['highest_confidence']
         
         item = {
-            'scan_id': scan_id,
             'image_key': image_key,
             's3_key': image_key,  # For compatibility
             'status': 'COMPLETED',
@@ -234,8 +371,10 @@ def store_scan_results(scan_id, image_key, detection_result, table_name):
             'has_cat': cats_found,
             'cat_confidence': highest_confidence,
             
-            'created_at': timestamp,
-            'updated_at': timestamp
+            'updated_at': timestamp,
+            
+            # Marks the scan as counted in the statistics table
+            'stats_recorded': True
         }
         
         # Add detailed results for debug mode
@@ -247,13 +386,358 @@ def store_scan_results(scan_id, image_key, detection_result, table_name):
         # Legacy debug data field
         item['debug_labels'] = detection_result['all_labels']
         
-        # Store in DynamoDB
-        table.put_item(Item=item)
+        if extra_fields:
+            item.update(extra_fields)
+        
+        # Update rather than overwrite so the fields written at upload time
+        # (user_id, created_at, content_type, ...) are preserved
+        set_clauses = ["#created_at = if_not_exists(#created_at, :created_at)"]
+        expression_attribute_names = {'#created_at': 'created_at'}
+        expression_attribute_values = {':created_at': timestamp}
+        for index, (key, value) in enumerate(item.items()):
+            set_clauses.append(f"#f{index} = :f{index}")
+            expression_attribute_names[f'#f{index}'] = key
+            expression_attribute_values[f':f{index}'] = value
+        
+        response = meter.dynamodb_write(table.update_item(
+            Key={'scan_id': scan_id},
+            UpdateExpression="SET " + ", ".join(set_clauses),
+            ExpressionAttributeNames=expression_attribute_names,
+            ExpressionAttributeValues=expression_attribute_values,
+            ReturnValues='ALL_OLD',
+            ReturnConsumedCapacity='TOTAL'
+        ))
+        previous = response.get('Attributes', {})
         
         print(f"Stored results for scan {scan_id}: cats_found={cats_found}, confidence={highest_confidence}")
         
+        # Count each scan once, even if SQS redelivers an already completed message.
+        # A scan counted as an error by an earlier attempt is moved over to the completed scans.
+        if previous.get('stats_recorded') is not True:
+            retract_error_day = None
+            if previous.get('stats_recorded') == ERROR_STATS_RECORDED:
+                # Errors claimed before error_stats_day was stored are taken back from today
+                retract_error_day = previous.get('error_stats_day') or stats_day()
+            record_scan_stats(
+                scan_id,
+                previous.get('user_id', 'anonymous'),
+                cats_found=cats_found,
+                highest_confidence=highest_confidence,
+                retract_error_day=retract_error_day,
+                meter=meter
+            )
+        
     except Exception as e:
         print(f"Error storing scan results: {str(e)}")
         import traceback
         print(traceback.format_exc())
-        raise
\ No newline at end of file
+        raise
+
+def phash_max_distance():
+    """
+    Hamming distance within which a previous result is reused, capped at what the band index can find.
+    """
+    configured = int(os.environ.get('PHASH_MAX_DISTANCE', '3'))
+    return min(configured, perceptual_hash.MAX_INDEXED_DISTANCE)
+
+def fetch_image(bucket_name, image_key, meter=None):
+    """
+    Download the uploaded image, or return None if it can't be read.
+    """
+    meter = meter or CostMeter()
+    try:
+        response = init_clients()['s3'].get_object(Bucket=bucket_name, Key=image_key)
+        image_bytes = response['Body'].read()
+        meter.s3_get(len(image_bytes))
+        return image_bytes
+    except Exception as e:
+        print(f"Could not download {image_key}: {str(e)}")
+        return None
+
+def compute_image_hash(image_bytes):
+    """
+    Compute the perceptual hash of the downloaded image.
+    
+    Returns None when near-duplicate reuse is disabled (no PHASH_TABLE), the image could
+    not be downloaded, Pillow is not packaged, the image is too flat to hash meaningfully,
+    or hashing fails for any reason - detection then simply runs as normal.
+    """
+    if not os.environ.get('PHASH_TABLE') or image_bytes is None:
+        return None
+    
+    try:
+        value = perceptual_hash.dhash(image_bytes)
+        if value is None or not perceptual_hash.is_informative(value):
+            return None
+        return value
+    except Exception as e:
+        print(f"Perceptual hashing skipped: {str(e)}")
+        return None
+
+def capture_image_summary(image_bytes):
+    """
+    Size, format and dimensions of a scanned image for the capture corpus, or None if it wasn't downloaded.
+    """
+    if image_bytes is None:
+        return None
+    summary = {'image_bytes': len(image_bytes)}
+    try:
+        from PIL import Image
+        # Only the header is parsed; the pixels are never decoded
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            summary['image_type'] = Image.MIME.get(image.format)
+            summary['width'], summary['height'] = image.size
+    except Exception as e:
+        print(f"Could not read image header for capture: {str(e)}")
+    return summary
+
+def thumbnails_enabled():
+    return os.environ.get('THUMBNAILS_ENABLED', 'true').lower() == 'true'
+
+def store_thumbnails(scan_id, bucket_name, image_bytes, cat_labels, meter=None):
+    """
+    Render the preview and cat crops and upload them under thumbnails/<scan_id>/.
+    
+    Returns {'preview': key, 'cats': [key, ...]} for the scan item, or None. Best effort:
+    a scan without thumbnails is still a complete scan.
+    """
+    meter = meter or CostMeter()
+    try:
+        rendered = thumbnails.render_thumbnails(image_bytes, cat_labels)
+        if rendered is None:
+            return None
+        
+        prefix = f"{THUMBNAIL_PREFIX}/{scan_id}"
+        objects = {f"{prefix}/preview.jpg": rendered['preview']}
+        cat_keys = []
+        for index, crop in enumerate(rendered['cats']):
+            cat_keys.append(f"{prefix}/cat-{index}.jpg")
+            objects[cat_keys[-1]] = crop
+        
+        s3 = init_clients()['s3']
+        futures = []
+        for key, body in objects.items():
+            meter.s3_put(len(body))
+            futures.append(_executor.submit(
+                s3.put_object,
+                Bucket=bucket_name,
+                Key=key,
+                Body=body,
+                ContentType='image/jpeg',
+                # Keys are per scan and never rewritten
+                CacheControl='public, max-age=31536000, immutable'
+            ))
+        for future in futures:
+            future.result()
+        
+        print(f"Stored {len(objects)} thumbnails for scan {scan_id} "
+              f"({sum(len(body) for body in objects.values())} bytes)")
+        return {'preview': f"{prefix}/preview.jpg", 'cats': cat_keys}
+    except Exception as e:
+        print(f"Error storing thumbnails: {str(e)}")
+        return None
+
+def find_near_duplicate(image_hash, scan_id, table_name, meter=None):
+    """
+    Look up the band index for a completed scan within the configured Hamming distance.
+    
+    Each band is read page by page up to PHASH_MAX_BAND_ENTRIES entries, which bounds
+    the cost of very common bands; candidates beyond that cap can be missed.
+    
+    Returns {'scan_id', 'distance', 'result'} for the closest match, or None.
+    """
+    meter = meter or CostMeter()
+    try:
+        dynamodb = init_clients()['dynamodb']
+        index = dynamodb.Table(os.environ['PHASH_TABLE'])
+        max_distance = phash_max_distance()
+        
+        candidates = {}
+        max_entries = int(os.environ.get('PHASH_MAX_BAND_ENTRIES', DEFAULT_PHASH_MAX_BAND_ENTRIES))
+        for band_key in perceptual_hash.band_keys(image_hash):
+            params = {
+                'KeyConditionExpression': 'band_key = :band',
+                'ExpressionAttributeValues': {':band': band_key},
+                'ReturnConsumedCapacity': 'TOTAL'
+            }
+            read = 0
+            while read < max_entries:
+                params['Limit'] = min(PHASH_BAND_PAGE_SIZE, max_entries - read)
+                response = meter.dynamodb_read(index.query(**params))
+                for entry in response.get('Items', []):
+                    distance = perceptual_hash.hamming_distance(image_hash, perceptual_hash.from_hex(entry['phash']))
+                    if entry['scan_id'] != scan_id and distance <= max_distance:
+                        candidates[entry['scan_id']] = distance
+                read += len(response.get('Items', []))
+                if 'LastEvaluatedKey' not in response:
+                    break
+                params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+            else:
+                print(f"Band {band_key} has more than {max_entries} entries; stopped reading it")
+        
+        # Closest first; skip sources that have since been deleted or reprocessed into an error
+        table = dynamodb.Table(table_name)
+        for source_id, distance in sorted(candidates.items(), key=lambda c: c[1]):
+            source = meter.dynamodb_read(table.get_item(
+                Key={'scan_id': source_id},
+                ReturnConsumedCapacity='TOTAL'
+            )).get('Item')
+            if source and source.get('status') == 'COMPLETED':
+                return {
+                    'scan_id': source_id,
+                    'distance': distance,
+                    'result': detection_result_from_item(source)
+                }
+        return None
+        
+    except Exception as e:
+        print(f"Near-duplicate lookup failed: {str(e)}")
+        return None
+
+def detection_result_from_item(item):
+    """
+    Rebuild a detect_cats_in_image() result from a stored scan item.
+    """
+    debug_data = item.get('debug_data', {})
+    all_labels = debug_data.get('all_labels', item.get('debug_labels', []))
+    return {
+        'cats_found': item.get('cats_found', item.get('has_cat', False)),
+        'cat_count': item.get('cat_count', 0),
+        'highest_confidence': item.get('highest_confidence', item.get('cat_confidence', Decimal('0'))),
+        'cat_labels': debug_data.get('cat_labels', []),
+        'all_labels': all_labels,
+        'total_labels': item.get('total_labels', len(all_labels))
+    }
+
+def index_image_hash(image_hash, scan_id, meter=None):
+    """
+    Add a completed scan's hash to the band index. Best effort, like the statistics.
+    """
+    meter = meter or CostMeter()
+    try:
+        index_table = os.environ['PHASH_TABLE']
+        client = init_clients()['dynamodb'].meta.client
+        phash = perceptual_hash.to_hex(image_hash)
+        # A single BatchWriteItem (BANDS <= 25 items); unlike batch_writer() it reports consumed capacity
+        request = {index_table: [
+            {'PutRequest': {'Item': {'band_key': band_key, 'scan_id': scan_id, 'phash': phash}}}
+            for band_key in perceptual_hash.band_keys(image_hash)
+        ]}
+        for _ in range(3):
+            response = meter.dynamodb_write(client.batch_write_item(
+                RequestItems=request,
+                ReturnConsumedCapacity='TOTAL'
+            ))
+            request = response.get('UnprocessedItems')
+            if not request:
+                break
+        if request:
+            raise Exception(f"{len(request[index_table])} band entries left unprocessed")
+        print(f"Indexed perceptual hash {phash} for scan {scan_id}")
+    except Exception as e:
+        print(f"Error indexing perceptual hash: {str(e)}")
+
+def stats_shard(scan_id):
+    """
+    Pick the counter shard for a scan. Spreading increments over several items
+    keeps busy buckets (today, the anonymous user) from becoming hot keys.
+    """
+    shard_count = int(os.environ.get('STATS_SHARDS', '10'))
+    return zlib.crc32(scan_id.encode('utf-8')) % shard_count
+
+def confidence_bucket(confidence):
+    """
+    Histogram bucket attribute for a cat confidence, in steps of 10 (conf_70 .. conf_90).
+    """
+    lower_bound = min(int(confidence) // 10 * 10, 90)
+    return f"conf_{lower_bound}"
+
+def stats_day():
+    return datetime.utcnow().strftime('%Y-%m-%d')
+
+def claim_error_stats(scan_id, table_name, day, meter=None):
+    """
+    Mark a failed scan as counted in the statistics on `day`, unless it already is.
+    
+    Returns True only for the first failed attempt, so retries of the same message
+    (and redrives of an already failed scan) are not counted again. The day is kept
+    on the scan so a later success takes the error back from the right counters.
+    """
+    meter = meter or CostMeter()
+    if not os.environ.get('STATS_TABLE'):
+        return False
+    try:
+        table = init_clients()['dynamodb'].Table(table_name)
+        meter.dynamodb_write(table.update_item(
+            Key={'scan_id': scan_id},
+            UpdateExpression="SET stats_recorded = :error, error_stats_day = :day",
+            ConditionExpression="attribute_not_exists(stats_recorded)",
+            ExpressionAttributeValues={':error': ERROR_STATS_RECORDED, ':day': day},
+            ReturnConsumedCapacity='TOTAL'
+        ))
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print(f"Error marking scan stats: {str(e)}")
+        return False
+
+def record_scan_stats(scan_id, user_id, cats_found=False, highest_confidence=None, error=False,
+                      day=None, retract_error_day=None, meter=None):
+    """
+    Increment the sharded daily counters for a finished scan, both globally and for the user.
+    
+    The scan is counted on `day` (today by default). With retract_error_day, the error
+    counted for an earlier failed attempt of the scan is taken back from that day's counters.
+    
+    Statistics are best effort: failures are logged and never fail the scan itself.
+    """
+    stats_table = os.environ.get('STATS_TABLE')
+    if not stats_table:
+        return
+    
+    meter = meter or CostMeter()
+    try:
+        table = init_clients()['dynamodb'].Table(stats_table)
+        day = day or stats_day()
+        shard = stats_shard(scan_id)
+        
+        def add(counter_day, update_expression, expression_attribute_values, expression_attribute_names=None):
+            for stat_key in (f"global#{counter_day}#{shard}", f"user#{user_id}#{counter_day}#{shard}"):
+                params = {
+                    'Key': {'stat_key': stat_key},
+                    'UpdateExpression': update_expression,
+                    'ExpressionAttributeValues': expression_attribute_values,
+                    'ReturnConsumedCapacity': 'TOTAL'
+                }
+                if expression_attribute_names:
+                    params['ExpressionAttributeNames'] = expression_attribute_names
+                meter.dynamodb_write(table.update_item(**params))
+        
+        update_expression = "ADD total_scans :scans, cats_found :cats, error_count :errors"
+        expression_attribute_names = None
+        expression_attribute_values = {
+            ':scans': 0 if error else 1,
+            ':cats': 1 if cats_found else 0,
+            ':errors': 1 if error else (-1 if retract_error_day == day else 0)
+        }
+        
+        if cats_found and highest_confidence is not None:
+            update_expression += ", #hist :one"
+            expression_attribute_names = {'#hist': confidence_bucket(highest_confidence)}
+            expression_attribute_values[':one'] = 1
+        
+        add(day, update_expression, expression_attribute_values, expression_attribute_names)
+        if retract_error_day and retract_error_day != day:
+            add(retract_error_day, "ADD error_count :errors", {':errors': -1})
+        
+        print(f"Recorded stats for scan {scan_id}: user={user_id}, day={day}, shard={shard}")
+        
+    except Exception as e:
+        print(f"Error recording scan stats: {str(e)}")
+
+# Build the clients during the Lambda init phase, which runs with boosted CPU
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+    try:
+        init_clients()
+    except Exception as e:
+        print(f"Deferred AWS client initialization: {str(e)}")
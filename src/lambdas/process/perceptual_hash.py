@@ -0,0 +1,80 @@
+"""
+Perceptual hashing for near-duplicate detection.
+
+A 64-bit difference hash (dHash) changes little when an image is
+re-compressed, resized or lightly edited, so two uploads of the same photo
+end up a small Hamming distance apart. The image is hashed as displayed,
+after its EXIF orientation is applied, so a copy whose pixels are stored
+rotated still matches. Hashes are split into bands for the
+index: by the pigeonhole principle, two hashes within distance
+BANDS - 1 share at least one band exactly, so an exact lookup per band
+finds every candidate.
+
+Pillow is imported lazily; without it hashing is simply disabled.
+"""
+import io
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+
+# The largest distance the band index is guaranteed to find
+MAX_INDEXED_DISTANCE = BANDS - 1
+
+# Flat or near-flat images hash to (almost) all zeros or all ones and would
+# match each other regardless of content
+MIN_INFORMATIVE_BITS = 4
+
+
+def dhash(image_bytes):
+    """
+    Return the 64-bit difference hash of an encoded image, or None if Pillow is unavailable.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    image = Image.open(io.BytesIO(image_bytes))
+    # Let the JPEG decoder downscale while decoding instead of decoding full size
+    image.draft('L', (HASH_SIZE * 4, HASH_SIZE * 4))
+    image = ImageOps.exif_transpose(image)
+    # One byte per pixel in 'L' mode
+    pixels = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS).tobytes()
+
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def is_informative(value):
+    """False for hashes of flat images, which must not be used for reuse."""
+    ones = bin(value).count('1')
+    return MIN_INFORMATIVE_BITS <= ones <= HASH_BITS - MIN_INFORMATIVE_BITS
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def to_hex(value):
+    return f"{value:016x}"
+
+
+def from_hex(text):
+    return int(text, 16)
+
+
+def band_keys(value):
+    """Index keys for a hash: one 'b<band>#<bits>' key per band."""
+    mask = (1 << BAND_BITS) - 1
+    keys = []
+    for band in range(BANDS):
+        bits = (value >> (band * BAND_BITS)) & mask
+        keys.append(f"b{band}#{bits:0{BAND_BITS // 4}x}")
+    return keys
@@ -0,0 +1,143 @@
+"""
+Small display images derived from a scan: a downscaled preview of the whole
+image and one crop per detected cat, taken from the Rekognition bounding
+boxes. Result pages load these instead of the multi-megabyte original.
+
+JPEGs are decoded only at the scale the preview and crops need, and
+never beyond MAX_DECODED_PIXELS, so a 9000x9000 upload does not exhaust
+the function's memory. Pillow is imported lazily; without it no
+thumbnails are rendered.
+"""
+import io
+
+PREVIEW_EDGE = 640
+CROP_EDGE = 256
+JPEG_QUALITY = 80
+
+# At most this many cat crops per scan, most confident first
+MAX_CROPS = 4
+
+# Context kept around each bounding box, as a fraction of its size
+CROP_PADDING = 0.1
+
+# Boxes overlapping more than this are the same cat reported under two labels
+DUPLICATE_IOU = 0.7
+
+# Most pixels decoded for one scan (about 3 bytes each, plus a few working copies).
+# Crops that would need more are skipped, and so are whole images the decoder can't reduce.
+MAX_DECODED_PIXELS = 16_000_000
+
+# Scales the JPEG decoder can reduce to while decoding (Image.draft), smallest first
+DRAFT_SCALES = (1 / 8, 1 / 4, 1 / 2, 1)
+
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+EXIF_ORIENTATION = 0x0112
+
+
+def cat_boxes(cat_labels):
+    """Distinct cat bounding boxes as (confidence, left, top, width, height), most confident first."""
+    boxes = []
+    for label in cat_labels:
+        for instance in label.get('Instances', []):
+            box = instance.get('BoundingBox')
+            if box:
+                boxes.append((
+                    float(instance.get('Confidence', label.get('Confidence', 0))),
+                    float(box['Left']), float(box['Top']), float(box['Width']), float(box['Height'])
+                ))
+    boxes.sort(reverse=True)
+
+    distinct = []
+    for box in boxes:
+        if all(iou(box[1:], other[1:]) <= DUPLICATE_IOU for other in distinct):
+            distinct.append(box)
+    return distinct[:MAX_CROPS]
+
+
+def iou(a, b):
+    """Intersection over union of two (left, top, width, height) boxes."""
+    overlap_w = max(0.0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    overlap_h = max(0.0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    overlap = overlap_w * overlap_h
+    union = a[2] * a[3] + b[2] * b[3] - overlap
+    return overlap / union if union > 0 else 0.0
+
+
+def crop_rectangle(box, width, height):
+    """Pixel rectangle for a relative bounding box, padded and clamped to the image."""
+    _, left, top, box_w, box_h = box
+    pad_w, pad_h = box_w * CROP_PADDING, box_h * CROP_PADDING
+    x0 = max(0, int((left - pad_w) * width))
+    y0 = max(0, int((top - pad_h) * height))
+    x1 = min(width, int(round((left + box_w + pad_w) * width)))
+    y1 = min(height, int(round((top + box_h + pad_h) * height)))
+    return x0, y0, x1, y1
+
+
+def decode_scale(required, draftable):
+    """Smallest scale the decoder can produce that is at least `required` (1 without draft support)."""
+    if draftable:
+        for scale in DRAFT_SCALES:
+            if scale >= required:
+                return scale
+    return 1
+
+
+def _encode(image, edge):
+    image = image.copy()
+    image.thumbnail((edge, edge))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def render_thumbnails(image_bytes, cat_labels):
+    """
+    Return {'preview': jpeg_bytes, 'cats': [jpeg_bytes, ...]}, or None if Pillow is unavailable
+    or the image is too large to decode within MAX_DECODED_PIXELS.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+
+    image = Image.open(io.BytesIO(image_bytes))
+    draftable = image.format == 'JPEG'
+    # Bounding boxes refer to the image as displayed, after EXIF rotation
+    width, height = image.size
+    if image.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+
+    def decoded_pixels(scale):
+        return width * height * scale * scale
+
+    scale = decode_scale(PREVIEW_EDGE / max(width, height), draftable)
+    if decoded_pixels(scale) > MAX_DECODED_PIXELS:
+        print(f"Not rendering thumbnails for a {width}x{height} {image.format} image")
+        return None
+
+    boxes = []
+    for box in cat_boxes(cat_labels):
+        x0, y0, x1, y1 = crop_rectangle(box, width, height)
+        needed = decode_scale(CROP_EDGE / max(x1 - x0, y1 - y0, 1), draftable)
+        if decoded_pixels(needed) > MAX_DECODED_PIXELS:
+            print(f"Skipping a {x1 - x0}x{y1 - y0} cat crop of a {width}x{height} image")
+            continue
+        boxes.append(box)
+        scale = max(scale, needed)
+
+    if scale < 1:
+        # Let the JPEG decoder skip detail neither the preview nor any crop can show
+        image.draft('RGB', (max(1, int(image.size[0] * scale)), max(1, int(image.size[1] * scale))))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    crops = []
+    for box in boxes:
+        rectangle = crop_rectangle(box, *image.size)
+        if rectangle[2] > rectangle[0] and rectangle[3] > rectangle[1]:
+            crops.append(_encode(image.crop(rectangle), CROP_EDGE))
+
+    return {'preview': _encode(image, PREVIEW_EDGE), 'cats': crops}
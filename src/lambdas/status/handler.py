@@ -1,13 +1,164 @@
+import hashlib
+import heapq
 import json
 import boto3
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from decimal import Decimal
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
+from boto3.dynamodb.conditions import Key
+from botocore.config import Config
 
-# Environment variables - using original name
-DYNAMODB_TABLE = os.environ['DYNAMODB_TABLE']
+import capture
+from cost_meter import CostMeter
+
+# Longest window the stats endpoint will sum over
+MAX_STATS_DAYS = 31
+
+# Bump whenever the shape of the status response changes, so cached copies revalidate
+STATUS_SCHEMA_VERSION = '3'
+
+# Lifetime of the presigned thumbnail URLs in a status response
+DEFAULT_THUMBNAIL_URL_EXPIRY = 3600
+
+# Finished results only change if a scan is re-detected (new updated_at, new ETag);
+# ERROR can still be redriven back to PENDING, so it is cached briefly
+CACHE_CONTROL = {
+    'COMPLETED': 'public, max-age=86400',
+    'ERROR': 'public, max-age=60'
+}
+IN_PROGRESS_CACHE_CONTROL = 'no-cache'
+
+# Write-sharded user index; HOT_USERS and USER_SHARDS must match the upload Lambda
+USER_INDEX = 'user-shard-created-index'
+DEFAULT_HOT_USERS = 'anonymous'
+DEFAULT_USER_SHARDS = 16
+MAX_HISTORY_LIMIT = 100
+
+# History pages resume after <created_at>|<scan_id>: scans created in the same
+# instant are ordered by scan id, so a page boundary between them loses none
+HISTORY_CURSOR_SEPARATOR = '|'
+
+# Worker pool for fanning history queries out across user shards
+_executor = ThreadPoolExecutor(max_workers=16)
+
+# AWS clients, created once per container by init_clients()
+_aws = None
+
+
+def init_clients():
+    """
+    Create the AWS clients on first use and reuse them across warm invocations.
+    """
+    global _aws
+    if _aws is None:
+        _aws = {
+            'dynamodb': boto3.resource('dynamodb'),
+            # Presigning is local; the client never calls S3
+            's3': boto3.client('s3', config=Config(signature_version='s3v4'))
+        }
+    return _aws
+
+def decimal_to_number(obj):
+    """Convert DynamoDB Decimal types to regular numbers for JSON"""
+    if isinstance(obj, dict):
+        return {k: decimal_to_number(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [decimal_to_number(v) for v in obj]
+    elif isinstance(obj, Decimal):
+        # Convert Decimal to int if it's a whole number, otherwise float
+        if obj % 1 == 0:
+            return int(obj)
+        else:
+            return float(obj)
+    else:
+        return obj
+
+def status_etag(item, debug_mode, url_window=None):
+    """
+    Strong ETag for a status response: it only changes when the scan is updated,
+    the response schema changes, or the debug representation is requested.
+    
+    Responses with presigned URLs pass the current URL window; see cache_headers_for().
+    """
+    fingerprint = '|'.join([
+        STATUS_SCHEMA_VERSION,
+        item['scan_id'],
+        item.get('status', ''),
+        item.get('updated_at', ''),
+        'debug' if debug_mode else '',
+        '' if url_window is None else str(url_window)
+    ])
+    return '"' + hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:32] + '"'
+
+def thumbnail_url_expiry():
+    return int(os.environ.get('THUMBNAIL_URL_EXPIRY_SECONDS', DEFAULT_THUMBNAIL_URL_EXPIRY))
+
+def cache_headers_for(item, debug_mode, now=None):
+    """
+    ETag and Cache-Control for a status response.
+    
+    Presigned thumbnail URLs expire and differ on every response, so for scans with
+    thumbnails the ETag is weak and tied to a window of half the URL lifetime, and the
+    response is only fresh until that window ends. A cached or revalidated copy is
+    therefore never used after its URLs have expired.
+    """
+    cache_control = CACHE_CONTROL.get(item.get('status'), IN_PROGRESS_CACHE_CONTROL)
+    if item.get('status') == 'COMPLETED' and item.get('thumbnail_keys'):
+        now = int(time.time() if now is None else now)
+        window_seconds = max(1, thumbnail_url_expiry() // 2)
+        window = now // window_seconds
+        etag = 'W/' + status_etag(item, debug_mode, url_window=window)
+        cache_control = f"public, max-age={window_seconds - now % window_seconds}"
+    else:
+        etag = status_etag(item, debug_mode)
+    return {
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+
+def thumbnail_urls(item):
+    """
+    Presigned GET URLs for a scan's thumbnails, in the shape of its thumbnail_keys.
+    """
+    s3 = init_clients()['s3']
+    bucket = item['s3_bucket']
+    expiry = thumbnail_url_expiry()
+    
+    def presign(key):
+        return s3.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': key},
+            ExpiresIn=expiry
+        )
+    
+    keys = item['thumbnail_keys']
+    return {
+        'preview': presign(keys['preview']),
+        'cats': [presign(key) for key in keys.get('cats', [])],
+        'expires_in': expiry
+    }
+
+def etag_matches(if_none_match, etag):
+    """
+    If-None-Match check, using the weak comparison RFC 7232 prescribes for it.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
 
 def lambda_handler(event, context):
     """
@@ -18,10 +169,14 @@ def lambda_handler(event, context):
         # Enable CORS for all responses
         cors_headers = {
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Headers': 'Content-Type,If-None-Match',
             'Access-Control-Allow-Methods': 'OPTIONS,GET'
         }
         
+        # Polls of a recorded scan are recorded with it, for offline replay
+        if capture.active((event.get('pathParameters') or {}).get('id')):
+            capture.record('api', 'status', capture.sanitize_api_event(event))
+        
         # Handle preflight OPTIONS request
         if event.get('httpMethod') == 'OPTIONS':
             return {
@@ -47,12 +202,25 @@ def lambda_handler(event, context):
         query_params = event.get('queryStringParameters') or {}
         debug_mode = query_params.get('debug', 'false').lower() == 'true'
         
+        # Environment variables - using original name. Read per request rather
+        # than at import so a misconfigured function fails with a 500, not an init crash
+        dynamodb_table = os.environ.get('DYNAMODB_TABLE')
+        if not dynamodb_table:
+            print("ERROR: Missing environment variable: 'DYNAMODB_TABLE'")
+            return {
+                'statusCode': 500,
+                'headers': cors_headers,
+                'body': json.dumps({'error': "Missing environment variable: 'DYNAMODB_TABLE'"})
+            }
+        
         # Get item from DynamoDB
-        table = dynamodb.Table(DYNAMODB_TABLE)
+        table = init_clients()['dynamodb'].Table(dynamodb_table)
         
-        response = table.get_item(
-            Key={'scan_id': scan_id}
-        )
+        meter = CostMeter()
+        response = meter.dynamodb_read(table.get_item(
+            Key={'scan_id': scan_id},
+            ReturnConsumedCapacity='TOTAL'
+        ))
         
         if 'Item' not in response:
             return {
@@ -63,22 +231,18 @@ def lambda_handler(event, context):
         
         item = response['Item']
         print(f"Found item with status: {item.get('status')}")
+        # Polling is part of what a scan costs
+        meter.emit('status', item.get('user_id'), item.get('detection_mode'))
         
-        # Convert Decimal types back to float/int for JSON serialization
-        def decimal_to_number(obj):
-            """Convert DynamoDB Decimal types to regular numbers for JSON"""
-            if isinstance(obj, dict):
-                return {k: decimal_to_number(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [decimal_to_number(v) for v in obj]
-            elif isinstance(obj, Decimal):
-                # Convert Decimal to int if it's a whole number, otherwise float
-                if obj % 1 == 0:
-                    return int(obj)
-                else:
-                    return float(obj)
-            else:
-                return obj
+        # Browsers and the API Gateway cache revalidate with the ETag instead of re-downloading
+        cache_headers = cache_headers_for(item, debug_mode)
+        request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        if etag_matches(request_headers.get('if-none-match'), cache_headers['ETag']):
+            return {
+                'statusCode': 304,
+                'headers': {**cors_headers, **cache_headers},
+                'body': ''
+            }
         
         # Convert all Decimal types in the item
         item = decimal_to_number(item)
@@ -113,6 +277,16 @@ def lambda_handler(event, context):
                 'confidence': highest_confidence
             })
             
+            # Result copied from a near-duplicate image instead of a fresh detection.
+            # Only the fact is returned: the source is another user's scan, and scan ids
+            # are all that protects /status.
+            if 'reused_from' in item:
+                result['reused'] = True
+            
+            # Small preview and cat crops, so result pages don't load the original
+            if item.get('thumbnail_keys'):
+                result['thumbnails'] = thumbnail_urls(item)
+            
             # Add debug data if requested
             if debug_mode:
                 if 'debug_data' in item:
@@ -124,7 +298,7 @@ def lambda_handler(event, context):
         
         return {
             'statusCode': 200,
-            'headers': cors_headers,
+            'headers': {**cors_headers, **cache_headers},
             'body': json.dumps(result)
         }
         
@@ -143,4 +317,305 @@ def lambda_handler(event, context):
 
 # Keep the old function name for compatibility
 def status(event, context):
-    return lambda_handler(event, context)
\ No newline at end of file
+    return lambda_handler(event, context)
+
+def stats(event, context):
+    """
+    Return detection statistics for the last N days, globally and optionally for one user.
+    
+    Reads the sharded daily counter items maintained by the process Lambda, so the
+    cost is O(days x shards) key lookups regardless of how many scans there were.
+    
+    GET /stats is public and global only. One user's counts are served on
+    GET /stats/{user_id}, which like /history requires IAM authorization.
+    """
+    
+    cors_headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Allow-Methods': 'OPTIONS,GET'
+    }
+    
+    try:
+        if capture.active():
+            capture.record('api', 'stats', capture.sanitize_api_event(event))
+        
+        if event.get('httpMethod') == 'OPTIONS':
+            return {
+                'statusCode': 200,
+                'headers': cors_headers,
+                'body': json.dumps({'message': 'CORS preflight'})
+            }
+        
+        stats_table = os.environ.get('STATS_TABLE')
+        if not stats_table:
+            print("ERROR: Missing environment variable: 'STATS_TABLE'")
+            return {
+                'statusCode': 500,
+                'headers': cors_headers,
+                'body': json.dumps({'error': "Missing environment variable: 'STATS_TABLE'"})
+            }
+        
+        path_params = event.get('pathParameters') or {}
+        query_params = event.get('queryStringParameters') or {}
+        user_id = path_params.get('user_id') or query_params.get('user_id')
+        identity = (event.get('requestContext') or {}).get('identity') or {}
+        if user_id and not identity.get('userArn'):
+            return {
+                'statusCode': 403,
+                'headers': cors_headers,
+                'body': json.dumps({'error': 'Per-user statistics require IAM authorization (GET /stats/{user_id})'})
+            }
+        
+        try:
+            days = int(query_params.get('days', '7'))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= MAX_STATS_DAYS:
+            return {
+                'statusCode': 400,
+                'headers': cors_headers,
+                'body': json.dumps({'error': f'days must be between 1 and {MAX_STATS_DAYS}'})
+            }
+        
+        today = datetime.utcnow().date()
+        day_list = [(today - timedelta(days=offset)).isoformat() for offset in range(days)]
+        
+        meter = CostMeter()
+        result = {
+            'days': days,
+            'from': day_list[-1],
+            'to': day_list[0],
+            'global': read_stats(stats_table, 'global', day_list, meter)
+        }
+        if user_id:
+            result['user'] = dict(read_stats(stats_table, f"user#{user_id}", day_list, meter), user_id=user_id)
+        meter.emit('stats', user_id or 'all', 'none')
+        
+        return {
+            'statusCode': 200,
+            'headers': cors_headers,
+            'body': json.dumps(result)
+        }
+        
+    except Exception as e:
+        print(f"Error in stats handler: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        return {
+            'statusCode': 500,
+            'headers': cors_headers,
+            'body': json.dumps({
+                'error': 'Internal server error',
+                'details': str(e)
+            })
+        }
+
+def read_stats(table_name, prefix, day_list, meter=None):
+    """
+    Sum every shard of the daily counter items for a key prefix ('global' or 'user#<id>').
+    """
+    meter = meter or CostMeter()
+    shard_count = int(os.environ.get('STATS_SHARDS', '10'))
+    keys = [
+        {'stat_key': f"{prefix}#{day}#{shard}"}
+        for day in day_list
+        for shard in range(shard_count)
+    ]
+    
+    totals = {'total_scans': 0, 'cats_found': 0, 'error_count': 0}
+    histogram = {}
+    dynamodb = init_clients()['dynamodb']
+    
+    # BatchGetItem accepts at most 100 keys per request
+    for start in range(0, len(keys), 100):
+        request = {table_name: {'Keys': keys[start:start + 100]}}
+        while request:
+            response = meter.dynamodb_read(dynamodb.batch_get_item(
+                RequestItems=request,
+                ReturnConsumedCapacity='TOTAL'
+            ))
+            for item in response.get('Responses', {}).get(table_name, []):
+                for name, value in item.items():
+                    if name in totals:
+                        totals[name] += int(value)
+                    elif name.startswith('conf_'):
+                        bucket = name[len('conf_'):]
+                        histogram[bucket] = histogram.get(bucket, 0) + int(value)
+            request = response.get('UnprocessedKeys') or None
+    
+    totals['hit_rate'] = round(totals['cats_found'] / totals['total_scans'], 4) if totals['total_scans'] else 0
+    totals['confidence_histogram'] = histogram
+    return totals
+
+def history(event, context):
+    """
+    Return a user's most recent scans, newest first.
+    
+    High-volume users are spread over several GSI partitions, so their shards are
+    queried in parallel and the pages merged by created_at.
+    
+    Listing scan ids would defeat the only protection of /status and its thumbnail
+    URLs - that the ids can't be guessed - so this is an admin endpoint: the API
+    method requires IAM authorization, and requests without an IAM caller are refused.
+    """
+    
+    cors_headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Allow-Methods': 'OPTIONS,GET'
+    }
+    
+    try:
+        if capture.active():
+            capture.record('api', 'history', capture.sanitize_api_event(event))
+        
+        if event.get('httpMethod') == 'OPTIONS':
+            return {
+                'statusCode': 200,
+                'headers': cors_headers,
+                'body': json.dumps({'message': 'CORS preflight'})
+            }
+        
+        identity = (event.get('requestContext') or {}).get('identity') or {}
+        if not identity.get('userArn'):
+            return {
+                'statusCode': 403,
+                'headers': cors_headers,
+                'body': json.dumps({'error': 'History requires IAM authorization'})
+            }
+        
+        path_params = event.get('pathParameters') or {}
+        user_id = path_params.get('user_id')
+        if not user_id:
+            return {
+                'statusCode': 400,
+                'headers': cors_headers,
+                'body': json.dumps({'error': 'user_id is required'})
+            }
+        
+        query_params = event.get('queryStringParameters') or {}
+        try:
+            limit = int(query_params.get('limit', '20'))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_HISTORY_LIMIT:
+            return {
+                'statusCode': 400,
+                'headers': cors_headers,
+                'body': json.dumps({'error': f'limit must be between 1 and {MAX_HISTORY_LIMIT}'})
+            }
+        
+        dynamodb_table = os.environ.get('DYNAMODB_TABLE')
+        if not dynamodb_table:
+            print("ERROR: Missing environment variable: 'DYNAMODB_TABLE'")
+            return {
+                'statusCode': 500,
+                'headers': cors_headers,
+                'body': json.dumps({'error': "Missing environment variable: 'DYNAMODB_TABLE'"})
+            }
+        
+        # Page backwards in time with ?before=<next_before of the previous page>
+        meter = CostMeter()
+        scans = query_user_history(dynamodb_table, user_id, limit, query_params.get('before'), meter)
+        meter.emit('history', user_id, 'none')
+        
+        result = {
+            'user_id': user_id,
+            'scans': [
+                decimal_to_number({
+                    'scan_id': scan['scan_id'],
+                    'status': scan.get('status'),
+                    'created_at': scan.get('created_at'),
+                    'cats_found': scan.get('cats_found', scan.get('has_cat')),
+                    'highest_confidence': scan.get('highest_confidence')
+                })
+                for scan in scans
+            ]
+        }
+        if len(scans) == limit:
+            result['next_before'] = HISTORY_CURSOR_SEPARATOR.join(history_position(scans[-1]))
+        
+        return {
+            'statusCode': 200,
+            'headers': cors_headers,
+            'body': json.dumps(result)
+        }
+        
+    except Exception as e:
+        print(f"Error in history handler: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        return {
+            'statusCode': 500,
+            'headers': cors_headers,
+            'body': json.dumps({
+                'error': 'Internal server error',
+                'details': str(e)
+            })
+        }
+
+def user_shard_keys(user_id):
+    """
+    Every GSI partition key a user's scans may be stored under (mirrors upload/user_shards.py).
+    """
+    hot_users = {u.strip() for u in os.environ.get('HOT_USERS', DEFAULT_HOT_USERS).split(',') if u.strip()}
+    shard_count = int(os.environ.get('USER_SHARDS', DEFAULT_USER_SHARDS)) if user_id in hot_users else 1
+    return [f"{user_id}#{shard}" for shard in range(shard_count)]
+
+def history_position(item):
+    """A scan's place in the history order: newest created_at first, then highest scan id."""
+    return item.get('created_at', ''), item.get('scan_id', '')
+
+def query_user_history(table_name, user_id, limit, before=None, meter=None):
+    """
+    Fetch the newest `limit` scans across all of a user's shards, merged newest first.
+    
+    `before` is a next_before cursor, <created_at>|<scan_id>; only scans strictly
+    older in history order are returned. A bare created_at (the old cursor) is
+    still accepted and skips everything created at that instant.
+    """
+    meter = meter or CostMeter()
+    table = init_clients()['dynamodb'].Table(table_name)
+    cursor = tuple(before.split(HISTORY_CURSOR_SEPARATOR, 1)) if before else None
+    if cursor and len(cursor) == 1:
+        cursor = (cursor[0], '')
+    
+    def query_shard(shard_key):
+        condition = Key('user_shard').eq(shard_key)
+        if cursor:
+            created_at, scan_id = cursor
+            condition = condition & (Key('created_at').lte(created_at) if scan_id else Key('created_at').lt(created_at))
+        kwargs = {
+            'IndexName': USER_INDEX,
+            'KeyConditionExpression': condition,
+            'ScanIndexForward': False,
+            'Limit': limit,
+            'ReturnConsumedCapacity': 'TOTAL'
+        }
+        items = []
+        while True:
+            response = meter.dynamodb_read(table.query(**kwargs))
+            page = response.get('Items', [])
+            items.extend(item for item in page if not cursor or history_position(item) < cursor)
+            kwargs['ExclusiveStartKey'] = response.get('LastEvaluatedKey')
+            if not kwargs['ExclusiveStartKey'] or not page:
+                break
+            # The index orders scans created in the same instant arbitrarily; read on until
+            # every scan tied with the oldest one kept is in, so the cut by scan id is exact
+            if len(items) >= limit and page[-1].get('created_at', '') < items[limit - 1].get('created_at', ''):
+                break
+        items.sort(key=history_position, reverse=True)
+        return items[:limit]
+    
+    # Each shard returns its own newest-first page; a k-way merge keeps the global order
+    pages = list(_executor.map(query_shard, user_shard_keys(user_id)))
+    merged = heapq.merge(*pages, key=history_position, reverse=True)
+    return [item for _, item in zip(range(limit), merged)]
+
+# Build the clients during the Lambda init phase, which runs with boosted CPU
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+    try:
+        init_clients()
+    except Exception as e:
+        print(f"Deferred AWS client initialization: {str(e)}")
@@ -0,0 +1,159 @@
+"""
+Queue-depth-aware admission control for the upload Lambda.
+
+Before accepting an image the handler checks how far the processor has
+fallen behind: the processing queue's depth (GetQueueAttributes) and,
+when age thresholds are set, the age of its oldest message (the SQS
+ApproximateAgeOfOldestMessage metric in CloudWatch). Both are cached per
+container and refreshed every QUEUE_STATS_TTL_SECONDS, so the check costs
+nothing on most requests.
+
+Past the degrade thresholds new scans are queued in 'degraded' detection
+mode, which runs the same detection but skips the optional near-duplicate
+and thumbnail work; past the shed thresholds uploads are rejected with 503 and
+Retry-After. A threshold of 0 (the default) disables that check. If the
+queue state cannot be read the upload is accepted.
+"""
+import json
+import os
+import time
+
+ACCEPT = 'accept'
+DEGRADE = 'degrade'
+SHED = 'shed'
+
+METRIC_NAMESPACE = 'CatDetection/Upload'
+
+DEFAULT_STATS_TTL_SECONDS = 5
+# CloudWatch publishes the SQS age metric once a minute
+AGE_STATS_TTL_SECONDS = 60
+DEFAULT_RETRY_AFTER_SECONDS = 30
+MAX_RETRY_AFTER_SECONDS = 300
+
+# Cached queue state for this container
+_queue_state = {'depth': None, 'age_seconds': None, 'depth_fetched_at': 0.0, 'age_fetched_at': 0.0}
+
+
+def _env_number(name, default=0):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        print(f"Ignoring invalid {name}: {os.environ.get(name)!r}")
+        return float(default)
+
+
+def thresholds():
+    return {
+        'degrade_depth': _env_number('BACKPRESSURE_DEGRADE_DEPTH'),
+        'shed_depth': _env_number('BACKPRESSURE_SHED_DEPTH'),
+        'degrade_age': _env_number('BACKPRESSURE_DEGRADE_AGE_SECONDS'),
+        'shed_age': _env_number('BACKPRESSURE_SHED_AGE_SECONDS')
+    }
+
+
+def queue_state(sqs_client, cloudwatch_client, queue_url, now=None):
+    """
+    Return the cached {'depth', 'age_seconds'} of the processing queue, refreshing stale values.
+
+    Either value is None when it is not needed or could not be read.
+    """
+    now = time.monotonic() if now is None else now
+    limits = thresholds()
+    ttl = _env_number('QUEUE_STATS_TTL_SECONDS', DEFAULT_STATS_TTL_SECONDS)
+
+    if (limits['degrade_depth'] or limits['shed_depth']) and now - _queue_state['depth_fetched_at'] >= ttl:
+        _queue_state['depth_fetched_at'] = now
+        try:
+            attributes = sqs_client.get_queue_attributes(
+                QueueUrl=queue_url,
+                AttributeNames=['ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible']
+            )['Attributes']
+            # Messages being processed right now are still part of the backlog
+            _queue_state['depth'] = (int(attributes.get('ApproximateNumberOfMessages', 0))
+                                     + int(attributes.get('ApproximateNumberOfMessagesNotVisible', 0)))
+        except Exception as e:
+            print(f"Could not read queue depth: {str(e)}")
+            _queue_state['depth'] = None
+
+    if (limits['degrade_age'] or limits['shed_age']) and now - _queue_state['age_fetched_at'] >= AGE_STATS_TTL_SECONDS:
+        _queue_state['age_fetched_at'] = now
+        try:
+            _queue_state['age_seconds'] = oldest_message_age(cloudwatch_client, queue_url)
+        except Exception as e:
+            print(f"Could not read queue age: {str(e)}")
+            _queue_state['age_seconds'] = None
+
+    return {'depth': _queue_state['depth'], 'age_seconds': _queue_state['age_seconds']}
+
+
+def oldest_message_age(cloudwatch_client, queue_url):
+    """Latest ApproximateAgeOfOldestMessage for the queue, in seconds (None without data)."""
+    end = time.time()
+    response = cloudwatch_client.get_metric_statistics(
+        Namespace='AWS/SQS',
+        MetricName='ApproximateAgeOfOldestMessage',
+        Dimensions=[{'Name': 'QueueName', 'Value': queue_url.rstrip('/').split('/')[-1]}],
+        StartTime=end - 300,
+        EndTime=end,
+        Period=60,
+        Statistics=['Maximum']
+    )
+    datapoints = sorted(response.get('Datapoints', []), key=lambda d: d['Timestamp'])
+    return datapoints[-1]['Maximum'] if datapoints else None
+
+
+def admission_decision(state):
+    """
+    Map the queue state to (decision, reason); decision is ACCEPT, DEGRADE or SHED.
+    """
+    limits = thresholds()
+    depth = state.get('depth')
+    age = state.get('age_seconds')
+
+    if depth is not None and limits['shed_depth'] and depth >= limits['shed_depth']:
+        return SHED, f"queue depth {depth} >= {limits['shed_depth']:g}"
+    if age is not None and limits['shed_age'] and age >= limits['shed_age']:
+        return SHED, f"oldest message {age:.0f}s >= {limits['shed_age']:g}s"
+    if depth is not None and limits['degrade_depth'] and depth >= limits['degrade_depth']:
+        return DEGRADE, f"queue depth {depth} >= {limits['degrade_depth']:g}"
+    if age is not None and limits['degrade_age'] and age >= limits['degrade_age']:
+        return DEGRADE, f"oldest message {age:.0f}s >= {limits['degrade_age']:g}s"
+    return ACCEPT, None
+
+
+def retry_after_seconds(state):
+    """Suggest a Retry-After: the configured default, longer while the backlog is old."""
+    retry_after = _env_number('BACKPRESSURE_RETRY_AFTER_SECONDS', DEFAULT_RETRY_AFTER_SECONDS)
+    age = state.get('age_seconds')
+    if age:
+        retry_after = max(retry_after, age / 10)
+    return int(min(retry_after, MAX_RETRY_AFTER_SECONDS))
+
+
+def emit_decision_metric(decision, state):
+    """
+    Log the admission decision in CloudWatch embedded metric format.
+
+    CloudWatch turns the log line into UploadAdmissions (by Decision) and the
+    QueueDepth/QueueAgeSeconds the decision was based on, with no extra API call.
+    """
+    metrics = [{'Name': 'UploadAdmissions', 'Unit': 'Count'}]
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRIC_NAMESPACE,
+                'Dimensions': [['Decision']],
+                'Metrics': metrics
+            }]
+        },
+        'Decision': decision,
+        'UploadAdmissions': 1
+    }
+    if state.get('depth') is not None:
+        metrics.append({'Name': 'QueueDepth', 'Unit': 'Count'})
+        record['QueueDepth'] = state['depth']
+    if state.get('age_seconds') is not None:
+        metrics.append({'Name': 'QueueAgeSeconds', 'Unit': 'Seconds'})
+        record['QueueAgeSeconds'] = state['age_seconds']
+    print(json.dumps(record))
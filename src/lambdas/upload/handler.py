@@ -4,8 +4,39 @@ import uuid
 import base64
 from datetime import datetime
 import os
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 
+import backpressure
+import capture
+from cost_meter import CostMeter
+from image_validation import (
+    ImageValidationError, jpeg_dimensions, max_image_bytes, png_dimensions, sniff_content_type, validate_image
+)
+from user_shards import user_shard_key
+
+# Worker pool for overlapping the S3 and DynamoDB writes; kept at module level
+# so warm invocations reuse the threads instead of spawning new ones
+_executor = ThreadPoolExecutor(max_workers=4)
+
+# AWS clients, created once per container by init_clients()
+_aws = None
+
+
+def init_clients():
+    """
+    Create the AWS clients on first use and reuse them across warm invocations.
+    """
+    global _aws
+    if _aws is None:
+        _aws = {
+            's3': boto3.client('s3'),
+            'sqs': boto3.client('sqs'),
+            'cloudwatch': boto3.client('cloudwatch'),
+            'dynamodb': boto3.resource('dynamodb')
+        }
+    return _aws
+
 def lambda_handler(event, context):
     """
     Handle image upload requests with original environment variable names.
@@ -19,7 +50,13 @@ def lambda_handler(event, context):
     }
     
     try:
-        print(f"Upload Lambda started. Event: {json.dumps(event, default=str)}")
+        # Log the request without the body, which holds the whole image
+        print(f"Upload Lambda started. {event.get('httpMethod')} {event.get('path')}, "
+              f"body size: {len(event.get('body') or '')} chars")
+        
+        # Production-shaped traffic for offline replay, without the image itself
+        if capture.active():
+            capture.record('api', 'upload', capture.sanitize_api_event(event, capture_body_summary(event)))
         
         # Handle preflight OPTIONS request
         if event.get('httpMethod') == 'OPTIONS':
@@ -47,10 +84,10 @@ def lambda_handler(event, context):
         
         # Initialize AWS clients
         try:
-            s3_client = boto3.client('s3')
-            sqs_client = boto3.client('sqs')
-            dynamodb = boto3.resource('dynamodb')
-            print("AWS clients initialized successfully")
+            clients = init_clients()
+            s3_client = clients['s3']
+            sqs_client = clients['sqs']
+            dynamodb = clients['dynamodb']
         except Exception as e:
             return {
                 'statusCode': 500,
@@ -66,14 +103,33 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Request body is required'})
             }
         
-        try:
-            body = json.loads(event['body'])
-        except json.JSONDecodeError as e:
-            return {
-                'statusCode': 400,
-                'headers': cors_headers,
-                'body': json.dumps({'error': f'Invalid JSON: {str(e)}'})
+        request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        request_content_type = request_headers.get('content-type', '').split(';')[0].strip()
+        
+        if request_content_type.startswith('image/'):
+            # Binary upload: raw image bytes, which API Gateway delivers base64-encoded
+            # when the content type is one of the API's binary media types
+            if not event.get('isBase64Encoded'):
+                return {
+                    'statusCode': 415,
+                    'headers': cors_headers,
+                    'body': json.dumps({'error': 'Binary uploads are not enabled for this API'})
+                }
+            query_params = event.get('queryStringParameters') or {}
+            body = {
+                'image_data': event['body'],
+                'content_type': request_content_type,
+                'user_id': query_params.get('user_id', 'anonymous')
             }
+        else:
+            try:
+                body = json.loads(event['body'])
+            except json.JSONDecodeError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': cors_headers,
+                    'body': json.dumps({'error': f'Invalid JSON: {str(e)}'})
+                }
         
         print(f"Parsed body keys: {list(body.keys())}")
         
@@ -107,6 +163,15 @@ def lambda_handler(event, context):
         
         print(f"Generated scan_id: {scan_id}")
         
+        # Reject oversize payloads before paying for the base64 decode
+        estimated_size = len(body['image_data']) * 3 // 4
+        if estimated_size > max_image_bytes():
+            return {
+                'statusCode': 413,
+                'headers': cors_headers,
+                'body': json.dumps({'error': f'Image is too large; the maximum is {max_image_bytes()} bytes'})
+            }
+        
         # Decode image data
         try:
             image_data = base64.b64decode(body['image_data'])
@@ -119,62 +184,127 @@ def lambda_handler(event, context):
         
         print(f"Image decoded, size: {len(image_data)} bytes")
         
-        # Upload image to S3
-        s3_key = f"images/{scan_id}.{content_type.split('/')[-1]}"
-        
+        # Check magic bytes, header dimensions and truncation before any AWS call
         try:
-            s3_client.put_object(
-                Bucket=s3_bucket,
-                Key=s3_key,
-                Body=image_data,
-                ContentType=content_type
-            )
-            print(f"Uploaded to S3: s3://{s3_bucket}/{s3_key}")
-        except Exception as e:
-            print(f"S3 upload error: {str(e)}")
+            image_info = validate_image(image_data, content_type)
+        except ImageValidationError as e:
+            print(f"Image validation failed: {str(e)}")
             return {
-                'statusCode': 500,
+                'statusCode': e.status_code,
                 'headers': cors_headers,
-                'body': json.dumps({'error': f'Failed to upload to S3: {str(e)}'})
+                'body': json.dumps({'error': str(e)})
             }
         
-        # Create initial record in DynamoDB
-        try:
-            table = dynamodb.Table(dynamodb_table)
-            
-            # Convert file size to Decimal for DynamoDB
-            file_size = Decimal(str(len(image_data)))
-            
-            table.put_item(
-                Item={
-                    'scan_id': scan_id,
-                    'user_id': body.get('user_id', 'anonymous'),
-                    'status': 'PENDING',
-                    's3_bucket': s3_bucket,
-                    's3_key': s3_key,
-                    'image_key': s3_key,  # For compatibility
-                    'content_type': content_type,
-                    'file_size': file_size,
-                    'created_at': timestamp,
-                    'updated_at': timestamp
-                }
-            )
+        print(f"Image validated: {image_info['width']}x{image_info['height']}")
+        
+        # Shed or degrade load when the processor is behind. Decided only for valid uploads,
+        # right before the writes: the queue lookups are AWS calls, and invalid requests
+        # get their 4xx whatever the backlog
+        queue_state = backpressure.queue_state(sqs_client, clients['cloudwatch'], sqs_queue)
+        decision, reason = backpressure.admission_decision(queue_state)
+        backpressure.emit_decision_metric(decision, queue_state)
+        if decision == backpressure.SHED:
+            retry_after = backpressure.retry_after_seconds(queue_state)
+            print(f"Shedding upload: {reason}")
+            return {
+                'statusCode': 503,
+                'headers': {
+                    **cors_headers,
+                    'Retry-After': str(retry_after),
+                    'Access-Control-Expose-Headers': 'Retry-After'
+                },
+                'body': json.dumps({
+                    'error': 'The service is busy processing earlier uploads, please retry later',
+                    'retry_after': retry_after
+                })
+            }
+        detection_mode = 'degraded' if decision == backpressure.DEGRADE else 'full'
+        if reason:
+            print(f"Accepting upload in {detection_mode} detection mode: {reason}")
+        
+        # Upload image to S3 and create the initial DynamoDB record concurrently.
+        # Neither write depends on the other; the SQS message is only sent once
+        # both have landed, so the processor never sees a scan it can't find.
+        s3_key = f"images/{scan_id}.{content_type.split('/')[-1]}"
+        table = dynamodb.Table(dynamodb_table)
+        
+        # Convert file size to Decimal for DynamoDB
+        file_size = Decimal(str(len(image_data)))
+        
+        # Billable operations for this scan; sent to the processor, which stores them as cost_upload
+        meter = CostMeter()
+        meter.s3_put(len(image_data))
+        
+        s3_future = _executor.submit(
+            s3_client.put_object,
+            Bucket=s3_bucket,
+            Key=s3_key,
+            Body=image_data,
+            ContentType=content_type
+        )
+        user_id = body.get('user_id', 'anonymous')
+        dynamodb_future = _executor.submit(
+            lambda **kwargs: meter.dynamodb_write(table.put_item(**kwargs)),
+            ReturnConsumedCapacity='TOTAL',
+            Item={
+                'scan_id': scan_id,
+                'user_id': user_id,
+                'user_shard': user_shard_key(user_id, scan_id),
+                'status': 'PENDING',
+                's3_bucket': s3_bucket,
+                's3_key': s3_key,
+                'image_key': s3_key,  # For compatibility
+                'content_type': content_type,
+                'file_size': file_size,
+                'image_width': image_info['width'],
+                'image_height': image_info['height'],
+                'detection_mode': detection_mode,
+                'created_at': timestamp,
+                'updated_at': timestamp
+            }
+        )
+        s3_error = s3_future.exception()
+        dynamodb_error = dynamodb_future.exception()
+        
+        if s3_error is None:
+            print(f"Uploaded to S3: s3://{s3_bucket}/{s3_key}")
+        else:
+            print(f"S3 upload error: {str(s3_error)}")
+        
+        if dynamodb_error is None:
             print(f"Created DynamoDB record for scan_id: {scan_id}")
-        except Exception as e:
-            print(f"DynamoDB error: {str(e)}")
+        else:
+            print(f"DynamoDB error: {str(dynamodb_error)}")
+        
+        if s3_error is not None or dynamodb_error is not None:
+            # Undo whichever half succeeded so no orphaned object or record is left behind
+            rollback_upload(
+                s3_client, table, s3_bucket, s3_key, scan_id,
+                object_written=s3_error is None,
+                record_written=dynamodb_error is None,
+                meter=meter
+            )
+            meter.emit('upload', user_id, detection_mode)
+            if s3_error is not None:
+                error_msg = f'Failed to upload to S3: {str(s3_error)}'
+            else:
+                error_msg = f'Failed to create DynamoDB record: {str(dynamodb_error)}'
             return {
                 'statusCode': 500,
                 'headers': cors_headers,
-                'body': json.dumps({'error': f'Failed to create DynamoDB record: {str(e)}'})
+                'body': json.dumps({'error': error_msg})
             }
         
         # Send message to SQS for processing
+        meter.sqs_request()
         try:
             sqs_message = {
                 'scan_id': scan_id,
                 's3_bucket': s3_bucket,
                 's3_key': s3_key,
-                'image_key': s3_key  # For compatibility
+                'image_key': s3_key,  # For compatibility
+                'detection_mode': detection_mode,
+                'cost_upload': meter.as_dict()
             }
             
             sqs_client.send_message(
@@ -184,12 +314,21 @@ def lambda_handler(event, context):
             print(f"Sent SQS message for scan_id: {scan_id}")
         except Exception as e:
             print(f"SQS error: {str(e)}")
+            rollback_upload(
+                s3_client, table, s3_bucket, s3_key, scan_id,
+                object_written=True,
+                record_written=True,
+                meter=meter
+            )
+            meter.emit('upload', user_id, detection_mode)
             return {
                 'statusCode': 500,
                 'headers': cors_headers,
                 'body': json.dumps({'error': f'Failed to queue for processing: {str(e)}'})
             }
         
+        meter.emit('upload', user_id, detection_mode)
+        
         # Return success response
         return {
             'statusCode': 200,
@@ -197,6 +336,7 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'scan_id': scan_id,
                 'status': 'PENDING',
+                'detection_mode': detection_mode,
                 'message': 'Image uploaded successfully and queued for processing'
             })
         }
@@ -214,6 +354,65 @@ def lambda_handler(event, context):
             })
         }
 
+def capture_body_summary(event):
+    """
+    Describe an upload body for the capture corpus: its encoding, declared type,
+    user and the size, format and dimensions of the image, but not the image.
+    """
+    raw_body = event.get('body')
+    if not raw_body:
+        return None
+    summary = {'length': len(raw_body)}
+    try:
+        request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        if request_headers.get('content-type', '').startswith('image/'):
+            summary['encoding'] = 'binary'
+            query_params = event.get('queryStringParameters') or {}
+            summary['user_id'] = capture.pseudonym(query_params.get('user_id', 'anonymous'))
+            image_data = base64.b64decode(raw_body)
+        else:
+            summary['encoding'] = 'json'
+            body = json.loads(raw_body)
+            summary['content_type'] = body.get('content_type')
+            summary['user_id'] = capture.pseudonym(body.get('user_id', 'anonymous'))
+            image_data = base64.b64decode(body['image_data'])
+        summary['image_bytes'] = len(image_data)
+        summary['image_type'] = sniff_content_type(image_data)
+        if summary['image_type'] == 'image/png':
+            summary['width'], summary['height'] = png_dimensions(image_data)
+        elif summary['image_type'] == 'image/jpeg':
+            summary['width'], summary['height'] = jpeg_dimensions(image_data)
+    except Exception as e:
+        # Malformed uploads are part of real traffic; record as much as could be read
+        summary['malformed'] = str(e)[:200]
+    return summary
+
+def rollback_upload(s3_client, table, s3_bucket, s3_key, scan_id, object_written, record_written, meter=None):
+    """
+    Best-effort compensation for a partially completed upload.
+    """
+    meter = meter or CostMeter()
+    if object_written:
+        try:
+            s3_client.delete_object(Bucket=s3_bucket, Key=s3_key)
+            print(f"Rolled back S3 object: s3://{s3_bucket}/{s3_key}")
+        except Exception as e:
+            print(f"Failed to roll back S3 object {s3_key}: {str(e)}")
+    
+    if record_written:
+        try:
+            meter.dynamodb_write(table.delete_item(Key={'scan_id': scan_id}, ReturnConsumedCapacity='TOTAL'))
+            print(f"Rolled back DynamoDB record for scan_id: {scan_id}")
+        except Exception as e:
+            print(f"Failed to roll back DynamoDB record {scan_id}: {str(e)}")
+
 # Keep the old function name for compatibility
 def upload(event, context):
-    return lambda_handler(event, context)
\ No newline at end of file
+    return lambda_handler(event, context)
+
+# Build the clients during the Lambda init phase, which runs with boosted CPU
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+    try:
+        init_clients()
+    except Exception as e:
+        print(f"Deferred AWS client initialization: {str(e)}")
\ No newline at end of file
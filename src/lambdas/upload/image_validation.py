@@ -0,0 +1,122 @@
+"""
+Cheap image validation for the upload Lambda.
+
+Identifies the format from magic bytes and reads the dimensions from the
+image header only (PNG IHDR chunk, JPEG SOFn segment). Nothing is decoded,
+so a bad upload is rejected in microseconds, before it is stored, queued
+and sent to Rekognition.
+"""
+import os
+import struct
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_IEND = b'\x00\x00\x00\x00IEND\xaeB`\x82'
+JPEG_SOI = b'\xff\xd8'
+JPEG_EOI = b'\xff\xd9'
+
+# JPEG start-of-frame markers carry the image dimensions (C4, C8 and CC are not frames)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_SOS = 0xDA
+
+# Rekognition accepts S3 objects up to 15MB
+DEFAULT_MAX_IMAGE_BYTES = 15 * 1024 * 1024
+DEFAULT_MAX_IMAGE_DIMENSION = 10000
+
+
+class ImageValidationError(Exception):
+    """Raised when uploaded bytes are not an acceptable image."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def max_image_bytes():
+    return int(os.environ.get('MAX_IMAGE_BYTES', DEFAULT_MAX_IMAGE_BYTES))
+
+
+def max_image_dimension():
+    return int(os.environ.get('MAX_IMAGE_DIMENSION', DEFAULT_MAX_IMAGE_DIMENSION))
+
+
+def sniff_content_type(data):
+    """Return the MIME type indicated by the magic bytes, or None if unsupported."""
+    if data.startswith(PNG_SIGNATURE):
+        return 'image/png'
+    if data.startswith(JPEG_SOI + b'\xff'):
+        return 'image/jpeg'
+    return None
+
+
+def png_dimensions(data):
+    """Read width and height from the IHDR chunk, which must come first."""
+    if len(data) < 33 or data[12:16] != b'IHDR':
+        raise ImageValidationError('Truncated or corrupt PNG header')
+    width, height = struct.unpack('>II', data[16:24])
+    if not data.endswith(PNG_IEND):
+        raise ImageValidationError('Truncated PNG data (missing IEND chunk)')
+    return width, height
+
+
+def jpeg_dimensions(data):
+    """Walk the JPEG marker segments up to the first SOFn and read its dimensions."""
+    offset = 2
+    size = None
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            raise ImageValidationError('Corrupt JPEG marker stream')
+        marker = data[offset + 1]
+        # Fill bytes may pad between segments
+        if marker == 0xFF:
+            offset += 1
+            continue
+        segment_length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                break
+            height, width = struct.unpack('>HH', data[offset + 5:offset + 9])
+            size = (width, height)
+        elif marker == JPEG_SOS:
+            if size is None:
+                raise ImageValidationError('JPEG has no frame header before scan data')
+            # The entropy-coded data must be followed by an end-of-image marker
+            if data.rfind(JPEG_EOI, offset) == -1:
+                raise ImageValidationError('Truncated JPEG data (missing end-of-image marker)')
+            return size
+        offset += 2 + segment_length
+    raise ImageValidationError('Truncated or corrupt JPEG header')
+
+
+def validate_image(data, declared_content_type):
+    """
+    Validate decoded upload bytes against the configured limits.
+
+    Returns {'content_type', 'width', 'height'} or raises ImageValidationError.
+    """
+    limit = max_image_bytes()
+    if len(data) > limit:
+        raise ImageValidationError(f'Image is {len(data)} bytes; the maximum is {limit} bytes', status_code=413)
+    if not data:
+        raise ImageValidationError('Image data is empty')
+
+    content_type = sniff_content_type(data)
+    if content_type is None:
+        raise ImageValidationError('Only JPEG and PNG files are allowed')
+    if content_type != declared_content_type:
+        raise ImageValidationError(f'Image data is {content_type} but content_type is {declared_content_type}')
+
+    if content_type == 'image/png':
+        width, height = png_dimensions(data)
+    else:
+        width, height = jpeg_dimensions(data)
+
+    max_dimension = max_image_dimension()
+    if width == 0 or height == 0:
+        raise ImageValidationError('Image has zero width or height')
+    if width > max_dimension or height > max_dimension:
+        raise ImageValidationError(
+            f'Image is {width}x{height}; the maximum dimension is {max_dimension} pixels',
+            status_code=413
+        )
+
+    return {'content_type': content_type, 'width': width, 'height': height}
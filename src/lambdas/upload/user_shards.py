@@ -0,0 +1,33 @@
+"""
+Write-sharded keys for the user-shard-created-index GSI.
+
+Every scan stores user_shard = "<user_id>#<shard>". Ordinary users always use
+shard 0; high-volume users (HOT_USERS, e.g. "anonymous") are spread over
+USER_SHARDS partitions by a hash of the scan ID, so their writes no longer
+land on a single GSI partition. The shard is always the last '#'-separated
+segment, which keeps a user ID that itself contains '#' unambiguous.
+
+Readers query every shard of a hot user and merge by created_at
+(see history() in the status Lambda, which mirrors these settings).
+"""
+import os
+import zlib
+
+DEFAULT_HOT_USERS = 'anonymous'
+DEFAULT_USER_SHARDS = 16
+
+
+def hot_users():
+    return {u.strip() for u in os.environ.get('HOT_USERS', DEFAULT_HOT_USERS).split(',') if u.strip()}
+
+
+def user_shard_count():
+    return int(os.environ.get('USER_SHARDS', DEFAULT_USER_SHARDS))
+
+
+def user_shard_key(user_id, scan_id):
+    """GSI partition key for a new scan."""
+    shard = 0
+    if user_id in hot_users():
+        shard = zlib.crc32(scan_id.encode('utf-8')) % user_shard_count()
+    return f"{user_id}#{shard}"
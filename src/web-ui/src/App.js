@@ -1,8 +1,20 @@
 import React, { useState } from 'react';
 import axios from 'axios';
 import './App.css';
+import { resizeImage } from './imageResize';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL;
+// Post raw image bytes instead of base64 JSON when the API accepts binary bodies
+const BINARY_UPLOAD = process.env.REACT_APP_BINARY_UPLOAD === 'true';
+const USER_ID = 'demo-user';
+
+const readAsBase64 = (blob) =>
+  new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onload = (e) => resolve(e.target.result.split(',')[1]);
+    reader.onerror = () => reject(reader.error);
+    reader.readAsDataURL(blob);
+  });
 
 function App() {
   const [selectedFile, setSelectedFile] = useState(null);
@@ -10,6 +22,7 @@ function App() {
   const [result, setResult] = useState(null);
   const [loading, setLoading] = useState(false);
   const [showDebug, setShowDebug] = useState(false);
+  const [uploadProgress, setUploadProgress] = useState(null);
 
   const handleFileSelect = (event) => {
     const file = event.target.files[0];
@@ -20,29 +33,53 @@ function App() {
     }
   };
 
+  const postImage = async (image) => {
+    const onUploadProgress = (e) => {
+      if (e.total) {
+        setUploadProgress(Math.round((e.loaded / e.total) * 100));
+      }
+    };
+
+    if (BINARY_UPLOAD) {
+      try {
+        return await axios.post(`${API_BASE_URL}/upload`, image, {
+          params: { user_id: USER_ID },
+          headers: { 'Content-Type': image.type },
+          onUploadProgress
+        });
+      } catch (error) {
+        // Binary bodies not enabled on this API; fall back to the JSON path
+        if (error.response?.status !== 415) {
+          throw error;
+        }
+      }
+    }
+
+    const base64Data = await readAsBase64(image);
+    return axios.post(`${API_BASE_URL}/upload`, {
+      image_data: base64Data,
+      content_type: image.type,
+      user_id: USER_ID
+    }, { onUploadProgress });
+  };
+
   const uploadImage = async () => {
     if (!selectedFile) return;
 
     setLoading(true);
     setResult(null); // Clear previous results
+    setUploadProgress(0);
     try {
-      const reader = new FileReader();
-      reader.onload = async (e) => {
-        const base64Data = e.target.result.split(',')[1];
-        
-        const response = await axios.post(`${API_BASE_URL}/upload`, {
-          image_data: base64Data,
-          content_type: selectedFile.type,
-          user_id: 'demo-user'
-        });
+      const image = await resizeImage(selectedFile);
+      const response = await postImage(image);
 
-        setScanId(response.data.scan_id);
-        pollForResult(response.data.scan_id);
-      };
-      reader.readAsDataURL(selectedFile);
+      setUploadProgress(null);
+      setScanId(response.data.scan_id);
+      pollForResult(response.data.scan_id);
     } catch (error) {
       console.error('Upload failed:', error);
-      alert('Upload failed');
+      alert(`Upload failed${error.response?.data?.error ? `: ${error.response.data.error}` : ''}`);
+      setUploadProgress(null);
       setLoading(false);
     }
   };
@@ -133,6 +170,12 @@ function App() {
           >
             {loading ? 'Processing...' : 'Upload & Scan for Cats'}
           </button>
+          {uploadProgress !== null && (
+            <div style={{ marginTop: '10px', fontSize: '14px' }}>
+              <progress value={uploadProgress} max="100" style={{ width: '200px' }} />
+              <span style={{ marginLeft: '8px' }}>Uploading... {uploadProgress}%</span>
+            </div>
+          )}
         </div>
 
         {scanId && (
@@ -209,6 +252,34 @@ function App() {
                 
                 <p><strong>📋 Total Labels Detected:</strong> {result.total_labels}</p>
                 
+                {result.thumbnails && (
+                  <div className="thumbnails" style={{ margin: '15px 0' }}>
+                    <img
+                      src={result.thumbnails.preview}
+                      alt="Uploaded"
+                      style={{ maxWidth: '100%', borderRadius: '8px' }}
+                    />
+                    {result.thumbnails.cats.length > 0 && (
+                      <div style={{ display: 'flex', gap: '10px', marginTop: '10px', flexWrap: 'wrap' }}>
+                        {result.thumbnails.cats.map((url, index) => (
+                          <img
+                            key={index}
+                            src={url}
+                            alt={`Detected cat ${index + 1}`}
+                            style={{
+                              width: '128px',
+                              height: '128px',
+                              objectFit: 'cover',
+                              borderRadius: '8px',
+                              border: '2px solid #c3e6cb'
+                            }}
+                          />
+                        ))}
+                      </div>
+                    )}
+                  </div>
+                )}
+                
                 {showDebug && getDebugLabels(result) && (
                   <div className="debug-section" style={{ 
                     marginTop: '20px',
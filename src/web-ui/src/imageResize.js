@@ -0,0 +1,64 @@
+// Client-side downscaling so phones don't upload multi-megabyte originals.
+// Rekognition labels a 1600px image as well as a 4000px one.
+
+const DEFAULT_MAX_EDGE = 1600;
+const DEFAULT_QUALITY = 0.85;
+
+export const uploadMaxEdge = parseInt(process.env.REACT_APP_UPLOAD_MAX_EDGE, 10) || DEFAULT_MAX_EDGE;
+export const uploadQuality = parseFloat(process.env.REACT_APP_UPLOAD_QUALITY) || DEFAULT_QUALITY;
+
+const loadImage = (file) => {
+  // createImageBitmap decodes off the main thread where supported
+  if (window.createImageBitmap) {
+    return createImageBitmap(file);
+  }
+  return new Promise((resolve, reject) => {
+    const url = URL.createObjectURL(file);
+    const img = new Image();
+    img.onload = () => {
+      URL.revokeObjectURL(url);
+      resolve(img);
+    };
+    img.onerror = () => {
+      URL.revokeObjectURL(url);
+      reject(new Error('Could not read image'));
+    };
+    img.src = url;
+  });
+};
+
+const canvasToBlob = (canvas, type, quality) =>
+  new Promise((resolve, reject) => {
+    canvas.toBlob(
+      (blob) => (blob ? resolve(blob) : reject(new Error('Could not encode image'))),
+      type,
+      quality
+    );
+  });
+
+// Returns a Blob no larger than maxEdge on its longest side, re-encoded as JPEG.
+// The original file is returned when re-encoding would not make it smaller.
+export const resizeImage = async (file, { maxEdge = uploadMaxEdge, quality = uploadQuality } = {}) => {
+  const image = await loadImage(file);
+  const width = image.width;
+  const height = image.height;
+  const scale = Math.min(1, maxEdge / Math.max(width, height));
+
+  const canvas = document.createElement('canvas');
+  canvas.width = Math.round(width * scale);
+  canvas.height = Math.round(height * scale);
+  const context = canvas.getContext('2d');
+  // JPEG has no alpha channel; flatten transparent PNGs onto white
+  context.fillStyle = '#fff';
+  context.fillRect(0, 0, canvas.width, canvas.height);
+  context.drawImage(image, 0, 0, canvas.width, canvas.height);
+  if (image.close) {
+    image.close();
+  }
+
+  const blob = await canvasToBlob(canvas, 'image/jpeg', quality);
+  if (scale === 1 && blob.size >= file.size) {
+    return file;
+  }
+  return blob;
+};
@@ -52,6 +52,10 @@ module "lambda" {
   sqs_queue_arn       = module.storage.sqs_queue_arn
   dynamodb_table_name = module.storage.dynamodb_table_name
   dynamodb_table_arn  = module.storage.dynamodb_table_arn
+  stats_table_name    = module.storage.stats_table_name
+  stats_table_arn     = module.storage.stats_table_arn
+  phash_table_name    = module.storage.phash_table_name
+  phash_table_arn     = module.storage.phash_table_arn
 }
 
 # API Gateway Module
@@ -65,6 +69,10 @@ module "api_gateway" {
   status_lambda_invoke_arn = module.lambda.status_lambda_invoke_arn
   upload_lambda_function_name = module.lambda.upload_lambda_function_name
   status_lambda_function_name = module.lambda.status_lambda_function_name
+  stats_lambda_invoke_arn = module.lambda.stats_lambda_invoke_arn
+  stats_lambda_function_name = module.lambda.stats_lambda_function_name
+  history_lambda_invoke_arn = module.lambda.history_lambda_invoke_arn
+  history_lambda_function_name = module.lambda.history_lambda_function_name
 }
 
 # Web UI Module
@@ -87,7 +95,9 @@ module "monitoring" {
   lambda_function_names = [
     module.lambda.upload_lambda_function_name,
     module.lambda.process_lambda_function_name,
-    module.lambda.status_lambda_function_name
+    module.lambda.status_lambda_function_name,
+    module.lambda.stats_lambda_function_name,
+    module.lambda.history_lambda_function_name
   ]
   
   sqs_queue_name = module.storage.sqs_queue_name
@@ -1,6 +1,9 @@
 resource "aws_api_gateway_rest_api" "cat_detection" {
   name = "${var.environment}-${var.project}-api"
   
+  # Lets the web UI POST raw image bytes to /upload instead of base64 JSON
+  binary_media_types = ["image/jpeg", "image/png"]
+  
   endpoint_configuration {
     types = ["REGIONAL"]
   }
@@ -54,6 +57,14 @@ resource "aws_api_gateway_method" "status_get" {
   resource_id   = aws_api_gateway_resource.status_id.id
   http_method   = "GET"
   authorization = "NONE"
+  
+  # Declared so they can be used as cache keys. If-None-Match must be one, or a
+  # cached 304 would be served to clients that sent no validator.
+  request_parameters = {
+    "method.request.path.id"             = true
+    "method.request.querystring.debug"   = false
+    "method.request.header.If-None-Match" = false
+  }
 }
 
 resource "aws_api_gateway_integration" "status_integration" {
@@ -64,6 +75,91 @@ resource "aws_api_gateway_integration" "status_integration" {
   integration_http_method = "POST"
   type                   = "AWS_PROXY"
   uri                    = var.status_lambda_invoke_arn
+  
+  cache_key_parameters = [
+    "method.request.path.id",
+    "method.request.querystring.debug",
+    "method.request.header.If-None-Match"
+  ]
+}
+
+# Stats Resource
+resource "aws_api_gateway_resource" "stats" {
+  rest_api_id = aws_api_gateway_rest_api.cat_detection.id
+  parent_id   = aws_api_gateway_rest_api.cat_detection.root_resource_id
+  path_part   = "stats"
+}
+
+resource "aws_api_gateway_method" "stats_get" {
+  rest_api_id   = aws_api_gateway_rest_api.cat_detection.id
+  resource_id   = aws_api_gateway_resource.stats.id
+  http_method   = "GET"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_integration" "stats_integration" {
+  rest_api_id = aws_api_gateway_rest_api.cat_detection.id
+  resource_id = aws_api_gateway_resource.stats.id
+  http_method = aws_api_gateway_method.stats_get.http_method
+  
+  integration_http_method = "POST"
+  type                   = "AWS_PROXY"
+  uri                    = var.stats_lambda_invoke_arn
+}
+
+resource "aws_api_gateway_resource" "stats_user" {
+  rest_api_id = aws_api_gateway_rest_api.cat_detection.id
+  parent_id   = aws_api_gateway_resource.stats.id
+  path_part   = "{user_id}"
+}
+
+# Admin only, like /history: per-user counts are not public
+resource "aws_api_gateway_method" "stats_user_get" {
+  rest_api_id   = aws_api_gateway_rest_api.cat_detection.id
+  resource_id   = aws_api_gateway_resource.stats_user.id
+  http_method   = "GET"
+  authorization = "AWS_IAM"
+}
+
+resource "aws_api_gateway_integration" "stats_user_integration" {
+  rest_api_id = aws_api_gateway_rest_api.cat_detection.id
+  resource_id = aws_api_gateway_resource.stats_user.id
+  http_method = aws_api_gateway_method.stats_user_get.http_method
+  
+  integration_http_method = "POST"
+  type                   = "AWS_PROXY"
+  uri                    = var.stats_lambda_invoke_arn
+}
+
+# History Resource
+resource "aws_api_gateway_resource" "history" {
+  rest_api_id = aws_api_gateway_rest_api.cat_detection.id
+  parent_id   = aws_api_gateway_rest_api.cat_detection.root_resource_id
+  path_part   = "history"
+}
+
+resource "aws_api_gateway_resource" "history_user" {
+  rest_api_id = aws_api_gateway_rest_api.cat_detection.id
+  parent_id   = aws_api_gateway_resource.history.id
+  path_part   = "{user_id}"
+}
+
+# Admin only: a scan listing would expose scan ids, which are all that protects /status
+resource "aws_api_gateway_method" "history_get" {
+  rest_api_id   = aws_api_gateway_rest_api.cat_detection.id
+  resource_id   = aws_api_gateway_resource.history_user.id
+  http_method   = "GET"
+  authorization = "AWS_IAM"
+}
+
+resource "aws_api_gateway_integration" "history_integration" {
+  rest_api_id = aws_api_gateway_rest_api.cat_detection.id
+  resource_id = aws_api_gateway_resource.history_user.id
+  http_method = aws_api_gateway_method.history_get.http_method
+  
+  integration_http_method = "POST"
+  type                   = "AWS_PROXY"
+  uri                    = var.history_lambda_invoke_arn
 }
 
 # CORS for upload
@@ -128,16 +224,61 @@ resource "aws_lambda_permission" "status_api_gateway" {
   source_arn    = "${aws_api_gateway_rest_api.cat_detection.execution_arn}/*/*"
 }
 
+resource "aws_lambda_permission" "stats_api_gateway" {
+  statement_id  = "AllowExecutionFromAPIGateway"
+  action        = "lambda:InvokeFunction"
+  function_name = var.stats_lambda_function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_api_gateway_rest_api.cat_detection.execution_arn}/*/*"
+}
+
+resource "aws_lambda_permission" "history_api_gateway" {
+  statement_id  = "AllowExecutionFromAPIGateway"
+  action        = "lambda:InvokeFunction"
+  function_name = var.history_lambda_function_name
+  principal     = "apigateway.amazonaws.com"
+  source_arn    = "${aws_api_gateway_rest_api.cat_detection.execution_arn}/*/*"
+}
+
 # Deployment
 resource "aws_api_gateway_deployment" "deployment" {
   depends_on = [
     aws_api_gateway_integration.upload_integration,
     aws_api_gateway_integration.status_integration,
+    aws_api_gateway_integration.stats_integration,
+    aws_api_gateway_integration.stats_user_integration,
+    aws_api_gateway_integration.history_integration,
     aws_api_gateway_integration.upload_options_integration
   ]
   
   rest_api_id = aws_api_gateway_rest_api.cat_detection.id
-  
+
+  # A deployment is a snapshot of the API; without a new one, existing stages
+  # never see added resources, methods or API-level settings. One trigger per
+  # part of the API, hashing everything a change to that part touches.
+  triggers = {
+    stats = sha1(jsonencode([
+      aws_api_gateway_resource.stats,
+      aws_api_gateway_resource.stats_user,
+      aws_api_gateway_method.stats_get,
+      aws_api_gateway_method.stats_user_get,
+      aws_api_gateway_integration.stats_integration,
+      aws_api_gateway_integration.stats_user_integration
+    ]))
+    binary_media_types = sha1(jsonencode(aws_api_gateway_rest_api.cat_detection.binary_media_types))
+    history = sha1(jsonencode([
+      aws_api_gateway_resource.history,
+      aws_api_gateway_resource.history_user,
+      aws_api_gateway_method.history_get,
+      aws_api_gateway_integration.history_integration
+    ]))
+    # Cache key parameters are declared on the status method and integration
+    status_cache = sha1(jsonencode([
+      aws_api_gateway_method.status_get,
+      aws_api_gateway_integration.status_integration
+    ]))
+  }
+
   lifecycle {
     create_before_destroy = true
   }
@@ -149,6 +290,9 @@ resource "aws_api_gateway_stage" "stage" {
   rest_api_id   = aws_api_gateway_rest_api.cat_detection.id
   stage_name    = var.environment
   
+  cache_cluster_enabled = var.enable_status_cache
+  cache_cluster_size    = var.enable_status_cache ? var.status_cache_cluster_size : null
+  
   tags = {
     Environment = var.environment
     Project     = var.project
@@ -168,4 +312,25 @@ resource "aws_api_gateway_method_settings" "throttling" {
     # data_trace_enabled    = true
     metrics_enabled       = true
   }
+}
+
+# Status response caching. API Gateway caches every response for the full TTL,
+# in-progress ones included, so the TTL bounds how stale a polled status can be.
+resource "aws_api_gateway_method_settings" "status_cache" {
+  count = var.enable_status_cache ? 1 : 0
+  
+  rest_api_id = aws_api_gateway_rest_api.cat_detection.id
+  stage_name  = aws_api_gateway_stage.stage.stage_name
+  method_path = "status/{id}/GET"
+
+  settings {
+    throttling_rate_limit  = var.throttle_rate_limit
+    throttling_burst_limit = var.throttle_burst_limit
+    metrics_enabled        = true
+    caching_enabled        = true
+    cache_ttl_in_seconds   = var.status_cache_ttl_seconds
+    cache_data_encrypted   = true
+    require_authorization_for_cache_control = true
+    unauthorized_cache_control_header_strategy = "SUCCEED_WITHOUT_RESPONSE_HEADER"
+  }
 }
\ No newline at end of file
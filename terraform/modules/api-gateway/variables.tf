@@ -28,6 +28,26 @@ variable "status_lambda_function_name" {
   type        = string
 }
 
+variable "stats_lambda_invoke_arn" {
+  description = "Invoke ARN of the stats Lambda function"
+  type        = string
+}
+
+variable "stats_lambda_function_name" {
+  description = "Name of the stats Lambda function"
+  type        = string
+}
+
+variable "history_lambda_invoke_arn" {
+  description = "Invoke ARN of the history Lambda function"
+  type        = string
+}
+
+variable "history_lambda_function_name" {
+  description = "Name of the history Lambda function"
+  type        = string
+}
+
 variable "throttle_rate_limit" {
   description = "API Gateway throttle rate limit"
   type        = number
@@ -50,4 +70,22 @@ variable "cors_allow_origins" {
   description = "CORS allowed origins"
   type        = list(string)
   default     = ["*"]
-}
\ No newline at end of file
+}
+
+variable "enable_status_cache" {
+  description = "Enable the API Gateway stage cache for GET /status/{id}"
+  type        = bool
+  default     = false
+}
+
+variable "status_cache_cluster_size" {
+  description = "API Gateway cache cluster size in GB"
+  type        = string
+  default     = "0.5"
+}
+
+variable "status_cache_ttl_seconds" {
+  description = "Seconds a cached status response is served; also the worst-case delay for a poll to see a status change"
+  type        = number
+  default     = 5
+}
@@ -45,12 +45,17 @@ resource "aws_iam_role_policy" "lambda_custom_policy" {
           "dynamodb:GetItem",
           "dynamodb:PutItem",
           "dynamodb:UpdateItem",
+          "dynamodb:DeleteItem",
           "dynamodb:Query",
-          "dynamodb:Scan"
+          "dynamodb:Scan",
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem"
         ]
         Resource = [
           var.dynamodb_table_arn,
-          "${var.dynamodb_table_arn}/index/*"
+          "${var.dynamodb_table_arn}/index/*",
+          var.stats_table_arn,
+          var.phash_table_arn
         ]
       },
       {
@@ -70,6 +75,14 @@ resource "aws_iam_role_policy" "lambda_custom_policy" {
         ]
         Resource = "*"
       },
+      {
+        # Upload backpressure reads the queue's ApproximateAgeOfOldestMessage
+        Effect = "Allow"
+        Action = [
+          "cloudwatch:GetMetricStatistics"
+        ]
+        Resource = "*"
+      },
       {
         Effect = "Allow"
         Action = [
@@ -1,3 +1,12 @@
+# Opt-in traffic capture for offline replay; see tests/perf/replay.py
+locals {
+  capture_environment = {
+    CAPTURE_MODE        = var.capture_mode
+    CAPTURE_SAMPLE_RATE = var.capture_sample_rate
+    CAPTURE_SALT        = var.capture_salt
+  }
+}
+
 # Upload Lambda Function
 resource "aws_lambda_function" "upload" {
   filename         = "${path.module}/../../../dist/upload.zip"
@@ -10,12 +19,18 @@ resource "aws_lambda_function" "upload" {
   reserved_concurrent_executions = var.reserved_concurrency
   
   environment {
-    variables = {
+    variables = merge({
       ENVIRONMENT = var.environment
       S3_BUCKET   = var.s3_bucket_name
       SQS_QUEUE   = var.sqs_queue_url
       DYNAMODB_TABLE = var.dynamodb_table_name
-    }
+      HOT_USERS      = join(",", var.hot_users)
+      USER_SHARDS    = var.user_shards
+      BACKPRESSURE_DEGRADE_DEPTH       = var.backpressure_degrade_depth
+      BACKPRESSURE_SHED_DEPTH          = var.backpressure_shed_depth
+      BACKPRESSURE_DEGRADE_AGE_SECONDS = var.backpressure_degrade_age_seconds
+      BACKPRESSURE_SHED_AGE_SECONDS    = var.backpressure_shed_age_seconds
+    }, local.capture_environment)
   }
   
   dynamic "tracing_config" {
@@ -47,10 +62,15 @@ resource "aws_lambda_function" "process" {
   reserved_concurrent_executions = var.reserved_concurrency
   
   environment {
-    variables = {
+    variables = merge({
       ENVIRONMENT = var.environment
       DYNAMODB_TABLE = var.dynamodb_table_name
-    }
+      STATS_TABLE    = var.stats_table_name
+      STATS_SHARDS   = var.stats_shards
+      PHASH_TABLE        = var.phash_table_name
+      PHASH_MAX_DISTANCE = var.phash_max_distance
+      THUMBNAILS_ENABLED = var.enable_thumbnails ? "true" : "false"
+    }, local.capture_environment)
   }
   
   dynamic "tracing_config" {
@@ -81,12 +101,84 @@ resource "aws_lambda_function" "status" {
   memory_size     = 256  # Status checks need less memory
   
   environment {
-    variables = {
+    variables = merge({
       ENVIRONMENT = var.environment
       DYNAMODB_TABLE = var.dynamodb_table_name
+      THUMBNAIL_URL_EXPIRY_SECONDS = var.thumbnail_url_expiry_seconds
+    }, local.capture_environment)
+  }
+  
+  dynamic "tracing_config" {
+    for_each = var.enable_x_ray_tracing ? [1] : []
+    content {
+      mode = "Active"
     }
   }
   
+  depends_on = [
+    aws_iam_role_policy_attachment.lambda_basic
+  ]
+  
+  tags = {
+    Environment = var.environment
+    Project     = var.project
+  }
+}
+
+# Stats Lambda Function (shares the status package)
+resource "aws_lambda_function" "stats" {
+  filename         = "${path.module}/../../../dist/status.zip"
+  function_name    = "${var.environment}-${var.project}-stats"
+  role            = aws_iam_role.lambda_role.arn
+  handler         = "handler.stats"
+  runtime         = "python3.11"
+  timeout         = 15
+  memory_size     = 256
+  
+  environment {
+    variables = merge({
+      ENVIRONMENT  = var.environment
+      STATS_TABLE  = var.stats_table_name
+      STATS_SHARDS = var.stats_shards
+    }, local.capture_environment)
+  }
+  
+  dynamic "tracing_config" {
+    for_each = var.enable_x_ray_tracing ? [1] : []
+    content {
+      mode = "Active"
+    }
+  }
+  
+  depends_on = [
+    aws_iam_role_policy_attachment.lambda_basic
+  ]
+  
+  tags = {
+    Environment = var.environment
+    Project     = var.project
+  }
+}
+
+# History Lambda Function (shares the status package)
+resource "aws_lambda_function" "history" {
+  filename         = "${path.module}/../../../dist/status.zip"
+  function_name    = "${var.environment}-${var.project}-history"
+  role            = aws_iam_role.lambda_role.arn
+  handler         = "handler.history"
+  runtime         = "python3.11"
+  timeout         = 15
+  memory_size     = 256
+  
+  environment {
+    variables = merge({
+      ENVIRONMENT    = var.environment
+      DYNAMODB_TABLE = var.dynamodb_table_name
+      HOT_USERS      = join(",", var.hot_users)
+      USER_SHARDS    = var.user_shards
+    }, local.capture_environment)
+  }
+  
   dynamic "tracing_config" {
     for_each = var.enable_x_ray_tracing ? [1] : []
     content {
@@ -43,6 +43,26 @@ output "status_lambda_arn" {
   value       = aws_lambda_function.status.arn
 }
 
+output "stats_lambda_function_name" {
+  description = "Name of the stats Lambda function"
+  value       = aws_lambda_function.stats.function_name
+}
+
+output "stats_lambda_invoke_arn" {
+  description = "Invoke ARN of the stats Lambda function"
+  value       = aws_lambda_function.stats.invoke_arn
+}
+
+output "history_lambda_function_name" {
+  description = "Name of the history Lambda function"
+  value       = aws_lambda_function.history.function_name
+}
+
+output "history_lambda_invoke_arn" {
+  description = "Invoke ARN of the history Lambda function"
+  value       = aws_lambda_function.history.invoke_arn
+}
+
 output "lambda_role_arn" {
   description = "ARN of the Lambda execution role"
   value       = aws_iam_role.lambda_role.arn
@@ -38,6 +38,105 @@ variable "dynamodb_table_arn" {
   type        = string
 }
 
+variable "stats_table_name" {
+  description = "Name of the DynamoDB statistics table"
+  type        = string
+}
+
+variable "stats_table_arn" {
+  description = "ARN of the DynamoDB statistics table"
+  type        = string
+}
+
+variable "stats_shards" {
+  description = "Number of counter shards per statistics bucket"
+  type        = number
+  default     = 10
+}
+
+variable "phash_table_name" {
+  description = "Name of the DynamoDB perceptual-hash index table"
+  type        = string
+}
+
+variable "phash_table_arn" {
+  description = "ARN of the DynamoDB perceptual-hash index table"
+  type        = string
+}
+
+variable "phash_max_distance" {
+  description = "Hamming distance within which a near-duplicate's result is reused (0-3)"
+  type        = number
+  default     = 3
+}
+
+variable "hot_users" {
+  description = "User IDs whose scans are spread over several user index partitions"
+  type        = list(string)
+  default     = ["anonymous"]
+}
+
+variable "user_shards" {
+  description = "Number of user index partitions for each hot user"
+  type        = number
+  default     = 16
+}
+
+variable "backpressure_degrade_depth" {
+  description = "Queue depth at which new scans use the degraded detection mode (0 disables)"
+  type        = number
+  default     = 500
+}
+
+variable "backpressure_shed_depth" {
+  description = "Queue depth at which uploads are rejected with 503 (0 disables)"
+  type        = number
+  default     = 5000
+}
+
+variable "backpressure_degrade_age_seconds" {
+  description = "Oldest queued message age at which new scans use the degraded detection mode (0 disables)"
+  type        = number
+  default     = 300
+}
+
+variable "backpressure_shed_age_seconds" {
+  description = "Oldest queued message age at which uploads are rejected with 503 (0 disables)"
+  type        = number
+  default     = 1800
+}
+
+variable "enable_thumbnails" {
+  description = "Render a preview and cat crops for each scan"
+  type        = bool
+  default     = true
+}
+
+variable "capture_mode" {
+  description = "Record sanitized requests for offline replay: off, or log to write them to CloudWatch Logs"
+  type        = string
+  default     = "off"
+}
+
+variable "capture_sample_rate" {
+  description = "Fraction of requests recorded while capture is on"
+  type        = number
+  default     = 0.01
+}
+
+variable "capture_salt" {
+  description = "Salt for the user id pseudonyms in captured requests"
+  type        = string
+  default     = ""
+  sensitive   = true
+}
+
+variable "thumbnail_url_expiry_seconds" {
+  description = "Lifetime of the presigned thumbnail URLs returned by the status endpoint"
+  type        = number
+  default     = 3600
+}
+
 variable "lambda_memory_size" {
   description = "Memory size for Lambda functions"
   type        = number
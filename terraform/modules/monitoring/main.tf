@@ -156,6 +156,30 @@ resource "aws_cloudwatch_metric_alarm" "upload_throttles" {
   }
 }
 
+resource "aws_cloudwatch_metric_alarm" "upload_shedding" {
+  alarm_name          = "${var.environment}-${var.project}-upload-shedding"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = "1"
+  metric_name         = "UploadAdmissions"
+  namespace           = "CatDetection/Upload"
+  period              = "300"
+  statistic           = "Sum"
+  threshold           = "0"
+  treat_missing_data  = "notBreaching"
+  alarm_description   = "Uploads are being rejected because the processing backlog is too long"
+  
+  dimensions = {
+    Decision = "shed"
+  }
+  
+  alarm_actions = var.enable_sns_alerts ? [aws_sns_topic.alerts[0].arn] : []
+  
+  tags = {
+    Environment = var.environment
+    Project     = var.project
+  }
+}
+
 # Custom Metrics Dashboard
 resource "aws_cloudwatch_dashboard" "cat_detection" {
   dashboard_name = "${var.environment}-${var.project}"
@@ -248,6 +272,27 @@ resource "aws_cloudwatch_dashboard" "cat_detection" {
           stat    = "Sum"
         }
       },
+      {
+        type   = "metric"
+        x      = 12
+        y      = 18
+        width  = 12
+        height = 6
+
+        properties = {
+          metrics = [
+            ["CatDetection/Upload", "UploadAdmissions", "Decision", "accept"],
+            ["...", "degrade"],
+            ["...", "shed"]
+          ]
+          view    = "timeSeries"
+          stacked = true
+          region  = var.aws_region
+          title   = "Upload Admission Decisions"
+          period  = 300
+          stat    = "Sum"
+        }
+      },
       {
         type   = "metric"
         x      = 0
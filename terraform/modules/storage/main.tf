@@ -53,19 +53,44 @@ resource "aws_dynamodb_table" "scan_results" {
     type = "S"
   }
   
+  dynamic "attribute" {
+    for_each = var.enable_legacy_user_index ? ["user_id"] : []
+    content {
+      name = attribute.value
+      type = "S"
+    }
+  }
+  
   attribute {
-    name = "user_id"
+    name = "created_at"
     type = "S"
   }
   
   attribute {
-    name = "created_at"
+    name = "user_shard"
     type = "S"
   }
   
+  # Legacy index keyed on the raw user_id; every anonymous upload lands on one
+  # partition. Disable once migrate_user_shards.py has backfilled user_shard.
+  dynamic "global_secondary_index" {
+    for_each = var.enable_legacy_user_index ? [1] : []
+    content {
+      name            = "user-created-index"
+      hash_key        = "user_id"
+      range_key       = "created_at"
+      projection_type = "ALL"
+      
+      # Only set capacity if using PROVISIONED billing
+      read_capacity  = var.dynamodb_billing_mode == "PROVISIONED" ? var.dynamodb_read_capacity : null
+      write_capacity = var.dynamodb_billing_mode == "PROVISIONED" ? var.dynamodb_write_capacity : null
+    }
+  }
+  
+  # Write-sharded user index: user_shard is "<user_id>#<shard>"
   global_secondary_index {
-    name            = "user-created-index"
-    hash_key        = "user_id"
+    name            = "user-shard-created-index"
+    hash_key        = "user_shard"
     range_key       = "created_at"
     projection_type = "ALL"
     
@@ -84,6 +109,54 @@ resource "aws_dynamodb_table" "scan_results" {
   }
 }
 
+# DynamoDB Table for materialized detection statistics.
+# Items are sharded daily counters keyed "global#<day>#<shard>" and
+# "user#<user_id>#<day>#<shard>", incremented by the process Lambda.
+resource "aws_dynamodb_table" "scan_stats" {
+  name         = "${var.environment}-${var.project}-scan-stats"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "stat_key"
+  
+  attribute {
+    name = "stat_key"
+    type = "S"
+  }
+  
+  point_in_time_recovery {
+    enabled = var.enable_point_in_time_recovery
+  }
+  
+  tags = {
+    Environment = var.environment
+    Project     = var.project
+  }
+}
+
+# DynamoDB Table for the perceptual-hash index used to reuse results of
+# near-duplicate images. Each scan hash is stored under one item per band
+# ("b<band>#<bits>"), so a Hamming-distance lookup is a few exact queries.
+resource "aws_dynamodb_table" "phash_index" {
+  name         = "${var.environment}-${var.project}-phash-index"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "band_key"
+  range_key    = "scan_id"
+  
+  attribute {
+    name = "band_key"
+    type = "S"
+  }
+  
+  attribute {
+    name = "scan_id"
+    type = "S"
+  }
+  
+  tags = {
+    Environment = var.environment
+    Project     = var.project
+  }
+}
+
 # SQS Queue for Processing
 resource "aws_sqs_queue" "processing_queue" {
   name                       = "${var.environment}-${var.project}-processing-queue"
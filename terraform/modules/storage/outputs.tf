@@ -18,6 +18,26 @@ output "dynamodb_table_arn" {
   value       = aws_dynamodb_table.scan_results.arn
 }
 
+output "stats_table_name" {
+  description = "Name of the DynamoDB statistics table"
+  value       = aws_dynamodb_table.scan_stats.name
+}
+
+output "stats_table_arn" {
+  description = "ARN of the DynamoDB statistics table"
+  value       = aws_dynamodb_table.scan_stats.arn
+}
+
+output "phash_table_name" {
+  description = "Name of the DynamoDB perceptual-hash index table"
+  value       = aws_dynamodb_table.phash_index.name
+}
+
+output "phash_table_arn" {
+  description = "ARN of the DynamoDB perceptual-hash index table"
+  value       = aws_dynamodb_table.phash_index.arn
+}
+
 output "sqs_queue_url" {
   description = "URL of the SQS queue"
   value       = aws_sqs_queue.processing_queue.url
@@ -32,6 +32,12 @@ variable "enable_point_in_time_recovery" {
   default     = false
 }
 
+variable "enable_legacy_user_index" {
+  description = "Keep the unsharded user-created-index GSI (disable after backfilling user_shard)"
+  type        = bool
+  default     = true
+}
+
 variable "sqs_visibility_timeout_seconds" {
   description = "SQS visibility timeout in seconds"
   type        = number
@@ -0,0 +1,151 @@
+"""
+Measure near-duplicate reuse quality of the perceptual-hash index.
+
+Each base image is indexed, then every base gets re-uploaded as several
+typical variants (re-compressed, resized, screenshotted with a border,
+slightly cropped). A variant that finds its own base is a hit; one that
+finds a different base is a false reuse. Distinct images that were never
+indexed are also looked up, to measure false reuse on new content.
+
+Uses the images in --corpus (JPEG/PNG) when given, otherwise a synthetic
+corpus of random shapes.
+
+Usage:
+    python tests/perf/bench_phash.py [--corpus DIR] [--images 300] [--max-distance 3]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/lambdas/process'))
+
+import perceptual_hash
+
+
+def synthetic_image(rng, size=(640, 480)):
+    top = tuple(rng.randrange(256) for _ in range(3))
+    image = Image.new('RGB', size, top)
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randrange(6, 16)):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(20, 300), y0 + rng.randrange(20, 300)
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle([x0, y0, x1, y1], fill=colour)
+        else:
+            draw.ellipse([x0, y0, x1, y1], fill=colour)
+    return image
+
+
+def load_corpus(directory, limit):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+            images.append(Image.open(os.path.join(directory, name)).convert('RGB'))
+        if len(images) >= limit:
+            break
+    return images
+
+
+def encode(image, image_format='JPEG', **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **kwargs)
+    return buffer.getvalue()
+
+
+def variants(image):
+    """Typical ways the same photo gets re-uploaded."""
+    width, height = image.size
+    border = max(4, width // 20)
+    screenshot = Image.new('RGB', (width + 2 * border, height + 2 * border), (245, 245, 245))
+    screenshot.paste(image, (border, border))
+    crop = image.crop((width // 50, height // 50, width - width // 50, height - height // 50))
+    return {
+        'recompressed': encode(image, quality=50),
+        'resized': encode(image.resize((width // 2, height // 2)), quality=85),
+        'screenshot': encode(screenshot, 'PNG'),
+        'cropped': encode(crop, quality=85),
+    }
+
+
+class MemoryIndex:
+    """The band index as process/handler.py uses it, held in a dict."""
+
+    def __init__(self):
+        self.bands = {}
+
+    def add(self, value, scan_id):
+        for key in perceptual_hash.band_keys(value):
+            self.bands.setdefault(key, []).append((scan_id, value))
+
+    def lookup(self, value, max_distance):
+        best = None
+        for key in perceptual_hash.band_keys(value):
+            for scan_id, other in self.bands.get(key, []):
+                distance = perceptual_hash.hamming_distance(value, other)
+                if distance <= max_distance and (best is None or distance < best[1]):
+                    best = (scan_id, distance)
+        return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Perceptual-hash reuse hit rate and false-reuse rate')
+    parser.add_argument('--corpus', help='Directory of JPEG/PNG images (default: synthetic)')
+    parser.add_argument('--images', type=int, default=300)
+    parser.add_argument('--max-distance', type=int, default=perceptual_hash.MAX_INDEXED_DISTANCE)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.corpus:
+        images = load_corpus(args.corpus, args.images)
+    else:
+        images = [synthetic_image(rng) for _ in range(args.images)]
+
+    # Half the corpus is indexed; the other half stays unseen
+    indexed, unseen = images[:len(images) // 2], images[len(images) // 2:]
+    index = MemoryIndex()
+    skipped = 0
+    for scan_id, image in enumerate(indexed):
+        value = perceptual_hash.dhash(encode(image, quality=90))
+        if perceptual_hash.is_informative(value):
+            index.add(value, scan_id)
+        else:
+            skipped += 1
+
+    hits = {}
+    totals = {}
+    false_reuse = 0
+    lookups = 0
+    for scan_id, image in enumerate(indexed):
+        for kind, data in variants(image).items():
+            value = perceptual_hash.dhash(data)
+            match = index.lookup(value, args.max_distance)
+            lookups += 1
+            totals[kind] = totals.get(kind, 0) + 1
+            if match and match[0] == scan_id:
+                hits[kind] = hits.get(kind, 0) + 1
+            elif match:
+                false_reuse += 1
+
+    unseen_false = 0
+    for image in unseen:
+        if index.lookup(perceptual_hash.dhash(encode(image, quality=85)), args.max_distance):
+            unseen_false += 1
+
+    print(f"corpus: {'synthetic' if not args.corpus else args.corpus}, "
+          f"{len(indexed)} indexed ({skipped} too flat to index), {len(unseen)} unseen, "
+          f"max distance {args.max_distance}")
+    for kind, total in totals.items():
+        print(f"  hit rate {kind:13s} {hits.get(kind, 0) / total:6.1%}")
+    print(f"  hit rate {'overall':13s} {sum(hits.values()) / lookups:6.1%}")
+    print(f"  false reuse (variants)      {false_reuse / lookups:6.2%}")
+    print(f"  false reuse (unseen images) {unseen_false / max(1, len(unseen)):6.2%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Measure upload handler latency against stubbed AWS services.
+
+Usage:
+    python tests/perf/bench_upload.py [--requests 200] [--latency-ms 20] [--jitter-ms 10]
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import time
+
+from PIL import Image
+
+from harness import Latency, install_stubs, load_handler, percentiles
+
+
+def sample_jpeg(size=(10, 10)):
+    """Same shape of payload the integration tests send: a small red JPEG."""
+    img = Image.new('RGB', size, color='red')
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def upload_event(image_bytes, content_type='image/jpeg'):
+    return {
+        'httpMethod': 'POST',
+        'body': json.dumps({
+            'image_data': base64.b64encode(image_bytes).decode('utf-8'),
+            'content_type': content_type,
+            'user_id': 'bench-user'
+        })
+    }
+
+
+def run(requests, latency_ms, jitter_ms):
+    os.environ.setdefault('S3_BUCKET', 'bench-bucket')
+    os.environ.setdefault('SQS_QUEUE', 'https://sqs.local/bench-queue')
+    os.environ.setdefault('DYNAMODB_TABLE', 'bench-table')
+
+    handler = load_handler('upload')
+    install_stubs(handler, Latency(latency_ms, jitter_ms))
+    event = upload_event(sample_jpeg())
+
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        # Handlers log every step; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = handler.lambda_handler(event, None)
+        timings.append((time.perf_counter() - start) * 1000.0)
+        assert response['statusCode'] == 200, response
+    return percentiles(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    args = parser.parse_args()
+
+    result = run(args.requests, args.latency_ms, args.jitter_ms)
+    print(f"upload handler, {args.requests} requests, "
+          f"{args.latency_ms:.0f}ms +{args.jitter_ms:.0f}ms jitter per AWS call")
+    print('  '.join(f'{k}={v:.1f}ms' for k, v in result.items()))
+
+
+if __name__ == '__main__':
+    main()
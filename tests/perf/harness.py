@@ -0,0 +1,306 @@
+"""
+Local performance harness for the Lambda handlers.
+
+Loads a handler module from src/lambdas and swaps its boto3 reference for
+in-memory stand-ins that sleep for a configurable latency on every call,
+so handler overhead and call ordering can be measured without AWS.
+"""
+import importlib.util
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+LAMBDAS_DIR = os.path.join(os.path.dirname(__file__), '../../src/lambdas')
+COMMON_DIR = os.path.abspath(os.path.join(LAMBDAS_DIR, 'common'))
+
+
+def load_handler(name):
+    """Import src/lambdas/<name>/handler.py under a unique module name."""
+    lambda_dir = os.path.abspath(os.path.join(LAMBDAS_DIR, name))
+    path = os.path.join(lambda_dir, 'handler.py')
+    # Handlers import their sibling modules the way the Lambda runtime resolves them;
+    # build-lambdas.sh packages the common modules alongside them
+    for directory in (COMMON_DIR, lambda_dir):
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(f'{name}_handler', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Latency:
+    """Simulated network round trip: a base delay plus uniform jitter (ms)."""
+
+    def __init__(self, base_ms=20.0, jitter_ms=10.0):
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+
+    def wait(self):
+        time.sleep((self.base_ms + random.uniform(0, self.jitter_ms)) / 1000.0)
+
+
+class StubS3:
+    def __init__(self, latency):
+        self.latency = latency
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.latency.wait()
+        with self._lock:
+            self.objects[(Bucket, Key)] = Body
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.latency.wait()
+        body = self.objects[(Bucket, Key)]
+        return {'Body': _Body(body), 'ContentLength': len(body)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.latency.wait()
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600, **kwargs):
+        # Presigning is local in boto3 too, so no latency
+        return f"https://{Params['Bucket']}.s3.local/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+
+class _Body:
+    def __init__(self, data):
+        self._data = data
+
+    def read(self):
+        return self._data
+
+
+class StubSQS:
+    def __init__(self, latency):
+        self.latency = latency
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self.latency.wait()
+        with self._lock:
+            self.messages.append(MessageBody)
+        return {'MessageId': str(len(self.messages))}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames, **kwargs):
+        self.latency.wait()
+        return {'Attributes': {
+            'ApproximateNumberOfMessages': str(len(self.messages)),
+            'ApproximateNumberOfMessagesNotVisible': '0'
+        }}
+
+
+class StubCloudWatch:
+    def __init__(self, latency):
+        self.latency = latency
+        self.queue_age_seconds = None
+
+    def get_metric_statistics(self, **kwargs):
+        self.latency.wait()
+        if self.queue_age_seconds is None:
+            return {'Datapoints': []}
+        return {'Datapoints': [{'Timestamp': 0, 'Maximum': self.queue_age_seconds}]}
+
+
+class StubRekognition:
+    """detect_labels answered from canned responses by image key, else with default_labels."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.responses = {}
+        self.default_labels = []
+
+    def detect_labels(self, Image, **kwargs):
+        self.latency.wait()
+        key = Image.get('S3Object', {}).get('Name')
+        return {'Labels': self.responses.get(key, self.default_labels)}
+
+
+def _update_clauses(expression):
+    """Split an UpdateExpression into (action, clause) pairs, e.g. ('SET', '#a = :a')."""
+    parts = re.split(r'\b(SET|ADD|REMOVE|DELETE)\b', expression)
+    for action, body in zip(parts[1::2], parts[2::2]):
+        # Commas inside if_not_exists(...) don't separate clauses
+        for clause in re.split(r',(?![^()]*\))', body):
+            if clause.strip():
+                yield action, clause.strip()
+
+
+def apply_update(item, expression, names=None, values=None):
+    """
+    Apply the subset of UpdateExpression syntax the handlers use: SET with plain
+    values or if_not_exists, ADD to numbers, and REMOVE.
+    """
+    names = names or {}
+    values = values or {}
+    for action, clause in _update_clauses(expression):
+        if action == 'SET':
+            path, _, value = (p.strip() for p in clause.partition('='))
+            match = re.match(r'if_not_exists\(\s*([^,\s]+)\s*,\s*([^)\s]+)\s*\)', value)
+            if match:
+                if names.get(match.group(1), match.group(1)) not in item:
+                    item[names.get(path, path)] = values[match.group(2)]
+            else:
+                item[names.get(path, path)] = values[value]
+        elif action == 'ADD':
+            path, value = clause.split()
+            item[names.get(path, path)] = item.get(names.get(path, path), 0) + values[value]
+        elif action == 'REMOVE':
+            item.pop(names.get(clause, clause), None)
+
+
+def _key_conditions(condition):
+    """Flatten a boto3 key condition into [(operator, attribute, value), ...]."""
+    expression = condition.get_expression()
+    if expression['operator'] == 'AND':
+        return [c for part in expression['values'] for c in _key_conditions(part)]
+    attribute, *operands = expression['values']
+    return [(expression['operator'], attribute.name, operands)]
+
+
+KEY_OPERATORS = {
+    '=': lambda value, operands: value == operands[0],
+    '<': lambda value, operands: value < operands[0],
+    '<=': lambda value, operands: value <= operands[0],
+    '>': lambda value, operands: value > operands[0],
+    '>=': lambda value, operands: value >= operands[0],
+    'BETWEEN': lambda value, operands: operands[0] <= value <= operands[1],
+    'begins_with': lambda value, operands: value.startswith(operands[0])
+}
+
+
+class StubTable:
+    def __init__(self, latency):
+        self.latency = latency
+        self.items = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(Key):
+        # Every table the handlers use has a single-attribute hash key
+        return next(iter(Key.values()))
+
+    def put_item(self, Item, **kwargs):
+        self.latency.wait()
+        with self._lock:
+            self.items[Item['scan_id']] = dict(Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self.latency.wait()
+        item = self.items.get(self._key(Key))
+        return {'Item': dict(item)} if item is not None else {}
+
+    def delete_item(self, Key, **kwargs):
+        self.latency.wait()
+        with self._lock:
+            self.items.pop(self._key(Key), None)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE', **kwargs):
+        """Condition expressions are not evaluated."""
+        self.latency.wait()
+        with self._lock:
+            old = self.items.get(self._key(Key))
+            item = dict(old) if old is not None else dict(Key)
+            apply_update(item, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            self.items[self._key(Key)] = item
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': dict(item)}
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            return {'Attributes': dict(old)}
+        return {}
+
+    def query(self, KeyConditionExpression, ScanIndexForward=True, Limit=None, ExclusiveStartKey=None, **kwargs):
+        """
+        Evaluate a boto3 Key() condition against every item, whatever the index;
+        results are ordered by created_at, the sort key of the user index, and
+        items with the same created_at in insertion order. Pages by Limit.
+        """
+        self.latency.wait()
+        conditions = _key_conditions(KeyConditionExpression)
+        with self._lock:
+            items = [
+                dict(item) for item in self.items.values()
+                if all(name in item and KEY_OPERATORS[op](item[name], operands)
+                       for op, name, operands in conditions)
+            ]
+        items.sort(key=lambda item: item.get('created_at', ''), reverse=not ScanIndexForward)
+        if ExclusiveStartKey:
+            start = next(i for i, item in enumerate(items) if item['scan_id'] == ExclusiveStartKey['scan_id'])
+            items = items[start + 1:]
+        if Limit and len(items) > Limit:
+            return {'Items': items[:Limit], 'LastEvaluatedKey': {'scan_id': items[Limit - 1]['scan_id']}}
+        return {'Items': items}
+
+
+class StubDynamoDB:
+    def __init__(self, latency):
+        self.latency = latency
+        self.tables = {}
+
+    def Table(self, name):
+        if name not in self.tables:
+            self.tables[name] = StubTable(self.latency)
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self.latency.wait()
+        responses = {}
+        for name, request in RequestItems.items():
+            items = self.Table(name).items
+            responses[name] = [dict(items[k]) for k in map(StubTable._key, request['Keys']) if k in items]
+        return {'Responses': responses}
+
+
+class StubBoto3:
+    """Drop-in for the boto3 module as used by the handlers."""
+
+    def __init__(self, latency=None, rekognition_latency=None):
+        latency = latency or Latency()
+        self.clients = {
+            's3': StubS3(latency),
+            'sqs': StubSQS(latency),
+            'cloudwatch': StubCloudWatch(latency),
+            'rekognition': StubRekognition(rekognition_latency or latency),
+        }
+        self.resources = {
+            'dynamodb': StubDynamoDB(latency),
+        }
+
+    def client(self, name, *args, **kwargs):
+        return self.clients[name]
+
+    def resource(self, name, *args, **kwargs):
+        return self.resources[name]
+
+
+def install_stubs(module, latency=None, stubs=None):
+    """
+    Point a loaded handler module at a fresh set of stubbed AWS services, or at
+    `stubs` so several handlers share the same in-memory state.
+    """
+    stubs = stubs or StubBoto3(latency)
+    module.boto3 = stubs
+    module._aws = None
+    return stubs
+
+
+def percentiles(samples_ms, points=(50, 90, 99)):
+    """Nearest-rank percentiles of a list of millisecond timings."""
+    ordered = sorted(samples_ms)
+    result = {}
+    for p in points:
+        index = max(0, min(len(ordered) - 1, int(round(p / 100.0 * len(ordered))) - 1))
+        result[f'p{p}'] = ordered[index]
+    return result
@@ -0,0 +1,335 @@
+"""
+Replay a capture corpus through the handlers against stubbed AWS services.
+
+A corpus is the JSONL written by the handlers' capture mode (see
+src/lambdas/common/capture.py) or exported from CloudWatch Logs with
+scripts/export_capture.py. Every API event and SQS record in it is
+replayed on the corpus timeline, compressed by --speedup (0 replays as
+fast as the workers allow):
+
+- uploads get a synthesized image of the recorded type, dimensions and
+  byte size in place of the original
+- SQS records are processed against a synthesized copy of the scanned
+  image, with Rekognition answering from the recorded detect_labels
+  responses
+- status polls, stats and history requests run as recorded; scans the
+  corpus only polls are seeded as completed
+
+Scans created by replayed uploads are not processed again: the recorded
+SQS records already carry the processing load. The report gives latency
+percentiles and status codes per handler, and how far dispatch lagged
+behind the timeline.
+
+Usage:
+    python tests/perf/replay.py CORPUS [CORPUS ...] [--speedup 10] [--workers 32]
+                                [--latency-ms 20] [--jitter-ms 10] [--rekognition-ms 400]
+                                [--sources upload,process,status,stats,history]
+"""
+import argparse
+import base64
+import functools
+import io
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from harness import Latency, StubBoto3, install_stubs, load_handler, percentiles
+
+CORPUS_VERSION = 1
+SOURCES = ('upload', 'process', 'status', 'stats', 'history')
+
+# Used for SQS records whose image the processor never downloaded
+DEFAULT_IMAGE = {'image_type': 'image/jpeg', 'width': 1600, 'height': 1200, 'image_bytes': 400 * 1024}
+
+# Largest JPEG marker segment: the marker plus a 16-bit length that counts itself
+JPEG_SEGMENT_MAX = 65535 + 2
+
+
+def load_corpus(paths):
+    """Read corpus records from JSONL files (or directories of them), oldest first."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.jsonl'))
+        else:
+            files.append(path)
+
+    records = []
+    for path in files:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                # Accept raw {"capture": ...} log lines as well as exported records
+                record = record.get('capture', record)
+                if record.get('v') == CORPUS_VERSION:
+                    records.append(record)
+    records.sort(key=lambda r: r['t'])
+    return records
+
+
+def _pad_jpeg(data, size):
+    """
+    Grow a JPEG to `size` bytes with APP15 segments right after the SOI marker.
+
+    Not comment segments: Pillow copies a source comment into every JPEG it saves
+    from the image, which would inflate the thumbnails as well.
+    """
+    padding = []
+    remaining = size - len(data)
+    while remaining >= 4:
+        take = min(remaining, JPEG_SEGMENT_MAX)
+        # A segment is at least 4 bytes, so don't leave a remainder too small for one
+        if 0 < remaining - take < 4:
+            take -= 4
+        padding.append(b'\xff\xef' + struct.pack('>H', take - 2) + b'\x00' * (take - 4))
+        remaining -= take
+    return data[:2] + b''.join(padding) + data[2:]
+
+
+def _pad_png(data, size):
+    """Grow a PNG to `size` bytes with a tEXt chunk just before IEND."""
+    remaining = size - len(data)
+    if remaining < 16:
+        return data
+    chunk = b'tEXt' + b'pad\x00' + b' ' * (remaining - 16)
+    chunk = struct.pack('>I', len(chunk) - 4) + chunk + struct.pack('>I', zlib.crc32(chunk) & 0xffffffff)
+    return data[:-12] + chunk + data[-12:]
+
+
+@functools.lru_cache(maxsize=64)
+def synthesize_image(image_type, width, height, size):
+    """
+    A valid image with the recorded type and dimensions, padded to the recorded byte size.
+
+    The pixels are a smooth gradient, so decoding costs what the dimensions dictate
+    while the payload size comes from the padding.
+    """
+    from PIL import Image
+
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    buffer = io.BytesIO()
+    if image_type == 'image/png':
+        image.save(buffer, format='PNG')
+        return _pad_png(buffer.getvalue(), size)
+    image.save(buffer, format='JPEG', quality=85)
+    return _pad_jpeg(buffer.getvalue(), size)
+
+
+def image_for(summary):
+    summary = summary if summary and summary.get('width') else DEFAULT_IMAGE
+    return synthesize_image(summary.get('image_type') or 'image/jpeg', summary['width'], summary['height'],
+                            summary.get('image_bytes') or 0)
+
+
+def upload_event(api):
+    """Rebuild an upload event from its recorded shape."""
+    event = {k: v for k, v in api.items() if k != 'body'}
+    summary = api.get('body')
+    if not summary:
+        event['body'] = None
+        return event
+    if not summary.get('width'):
+        # Unreadable uploads are replayed as an unreadable body of the same length
+        event['body'] = '#' * summary.get('length', 0)
+        return event
+
+    image_data = base64.b64encode(image_for(summary)).decode('utf-8')
+    if summary.get('encoding') == 'binary':
+        event['body'] = image_data
+        event['isBase64Encoded'] = True
+    else:
+        event['body'] = json.dumps({
+            'image_data': image_data,
+            'content_type': summary.get('content_type'),
+            'user_id': summary.get('user_id', 'anonymous')
+        })
+    return event
+
+
+class SourceStats:
+    def __init__(self):
+        self.timings = []
+        self.outcomes = {}
+        self._lock = threading.Lock()
+
+    def add(self, elapsed_ms, outcome):
+        with self._lock:
+            self.timings.append(elapsed_ms)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+
+class Replayer:
+    """Feeds a corpus through the upload, process and status handlers sharing one set of stubs."""
+
+    def __init__(self, records, latency=None, rekognition_latency=None, speedup=1.0, workers=32, sources=SOURCES):
+        self.records = [r for r in records if r['kind'] != 'rekognition' and r['source'] in sources]
+        self.speedup = speedup
+        self.workers = workers
+        self.stats = {}
+        self.max_lag_ms = 0.0
+
+        for name, value in (('S3_BUCKET', 'replay-bucket'), ('SQS_QUEUE', 'https://sqs.local/replay-queue'),
+                            ('DYNAMODB_TABLE', 'replay-scans'), ('STATS_TABLE', 'replay-stats')):
+            os.environ.setdefault(name, value)
+        # A replay must not record itself into the corpus it is reading
+        os.environ['CAPTURE_MODE'] = 'off'
+        self.stubs = StubBoto3(latency or Latency(0, 0), rekognition_latency)
+        self.handlers = {name: self._load(name) for name in ('upload', 'process', 'status')}
+
+        # Rekognition answers with what it said in production, per image
+        rekognition = self.stubs.clients['rekognition']
+        for record in records:
+            if record['kind'] == 'rekognition':
+                rekognition.responses[record['data']['image_key']] = record['data']['Labels']
+        self._seed_scans()
+
+    def _load(self, name):
+        module = load_handler(name)
+        install_stubs(module, stubs=self.stubs)
+        return module
+
+    @property
+    def table(self):
+        return self.stubs.resources['dynamodb'].Table(os.environ['DYNAMODB_TABLE'])
+
+    def _seed_scans(self):
+        """
+        Create the scan items uploads would have: PENDING for scans the corpus processes,
+        COMPLETED for scans it only polls.
+        """
+        for record in self.records:
+            created_at = datetime.utcfromtimestamp(record['t']).isoformat()
+            if record['kind'] == 'sqs':
+                scan_id = record['data']['message']['scan_id']
+                status = 'PENDING'
+            else:
+                scan_id = (record['data'].get('pathParameters') or {}).get('id')
+                status = 'COMPLETED'
+            if scan_id and scan_id not in self.table.items:
+                self.table.items[scan_id] = {
+                    'scan_id': scan_id, 'status': status, 'user_id': 'anonymous',
+                    'created_at': created_at, 'updated_at': created_at
+                }
+                if status == 'COMPLETED':
+                    self.table.items[scan_id].update(
+                        {'cats_found': False, 'cat_count': 0, 'highest_confidence': 0, 'total_labels': 0})
+
+    def _prepare(self, record):
+        """Build the handler call for a record; untimed, like the work API Gateway and SQS do."""
+        data = record['data']
+        if record['kind'] == 'sqs':
+            message = data['message']
+            key = message.get('image_key') or message.get('s3_key')
+            self.stubs.clients['s3'].objects[(message.get('s3_bucket'), key)] = image_for(data.get('image'))
+            return self.handlers['process'].process, {'Records': [{'body': json.dumps(message)}]}
+        if record['source'] == 'upload':
+            return self.handlers['upload'].lambda_handler, upload_event(data)
+        entry_point = {'status': 'lambda_handler', 'stats': 'stats', 'history': 'history'}[record['source']]
+        event = dict(data)
+        if record['source'] == 'history' or (event.get('pathParameters') or {}).get('user_id'):
+            # Captures drop the request context; /history and /stats/{user_id} are only
+            # reachable with IAM authorization
+            event['requestContext'] = {'identity': {'userArn': 'arn:aws:iam::000000000000:user/replay'}}
+        return getattr(self.handlers['status'], entry_point), event
+
+    def _invoke(self, record):
+        function, event = self._prepare(record)
+        start = time.perf_counter()
+        try:
+            response = function(event, None)
+            outcome = str(response['statusCode']) if isinstance(response, dict) else 'ok'
+        except Exception as e:
+            outcome = type(e).__name__
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        self.stats.setdefault(record['source'], SourceStats()).add(elapsed_ms, outcome)
+        if record['kind'] == 'sqs':
+            # Only the scan item is kept; drop the synthesized image once it is processed
+            message = record['data']['message']
+            self.stubs.clients['s3'].objects.pop(
+                (message.get('s3_bucket'), message.get('image_key') or message.get('s3_key')), None)
+
+    def run(self):
+        """Replay every record, paced by the corpus timeline; returns the wall-clock seconds taken."""
+        for source in {r['source'] for r in self.records}:
+            self.stats.setdefault(source, SourceStats())
+        if not self.records:
+            return 0.0
+
+        first = self.records[0]['t']
+        started = time.perf_counter()
+        # Handlers log every step; keep the replay output readable
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = []
+                for record in self.records:
+                    if self.speedup > 0:
+                        due = (record['t'] - first) / self.speedup
+                        delay = due - (time.perf_counter() - started)
+                        if delay > 0:
+                            time.sleep(delay)
+                        else:
+                            self.max_lag_ms = max(self.max_lag_ms, -delay * 1000.0)
+                    futures.append(pool.submit(self._invoke, record))
+                for future in futures:
+                    future.result()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        return time.perf_counter() - started
+
+    def report(self):
+        return {
+            source: {
+                'requests': len(stats.timings),
+                'outcomes': dict(sorted(stats.outcomes.items())),
+                **({k: round(v, 1) for k, v in percentiles(stats.timings).items()} if stats.timings else {})
+            }
+            for source, stats in sorted(self.stats.items())
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('corpus', nargs='+', help='Corpus JSONL files or directories')
+    parser.add_argument('--speedup', type=float, default=1.0, help='Timeline compression; 0 = as fast as possible')
+    parser.add_argument('--workers', type=int, default=32, help='Concurrent handler invocations')
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--rekognition-ms', type=float, default=400.0, help='Simulated detect_labels latency')
+    parser.add_argument('--sources', default=','.join(SOURCES), help='Comma-separated handlers to replay')
+    args = parser.parse_args()
+
+    records = load_corpus(args.corpus)
+    sources = tuple(s.strip() for s in args.sources.split(',') if s.strip())
+    replayer = Replayer(
+        records,
+        latency=Latency(args.latency_ms, args.jitter_ms),
+        rekognition_latency=Latency(args.rekognition_ms, args.rekognition_ms / 4),
+        speedup=args.speedup,
+        workers=args.workers,
+        sources=sources
+    )
+    if not replayer.records:
+        print('Nothing to replay')
+        return
+    span = replayer.records[-1]['t'] - replayer.records[0]['t']
+    elapsed = replayer.run()
+    print(f"Replayed {len(replayer.records)} events spanning {span:.0f}s in {elapsed:.1f}s "
+          f"(speedup {args.speedup:g}, max dispatch lag {replayer.max_lag_ms:.0f}ms)")
+    for source, result in replayer.report().items():
+        outcomes = ', '.join(f'{k}: {v}' for k, v in result['outcomes'].items())
+        timings = '  '.join(f"{k}={result[k]:.1f}ms" for k in ('p50', 'p90', 'p99') if k in result)
+        print(f"  {source:8s} {result['requests']:6d} requests  {timings}  [{outcomes}]")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../perf'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/lambdas/upload'))
+
+import backpressure
+from harness import Latency, install_stubs, load_handler
+from test_upload_handler import upload_event
+
+
+@pytest.fixture(autouse=True)
+def fresh_queue_state(monkeypatch):
+    monkeypatch.setattr(backpressure, '_queue_state', {
+        'depth': None, 'age_seconds': None, 'depth_fetched_at': float('-inf'), 'age_fetched_at': float('-inf')
+    })
+
+
+@pytest.fixture
+def thresholds(monkeypatch):
+    monkeypatch.setenv('BACKPRESSURE_DEGRADE_DEPTH', '100')
+    monkeypatch.setenv('BACKPRESSURE_SHED_DEPTH', '1000')
+    monkeypatch.setenv('BACKPRESSURE_DEGRADE_AGE_SECONDS', '300')
+    monkeypatch.setenv('BACKPRESSURE_SHED_AGE_SECONDS', '1800')
+
+
+def sqs_with_depth(visible, in_flight=0):
+    sqs = MagicMock()
+    sqs.get_queue_attributes.return_value = {'Attributes': {
+        'ApproximateNumberOfMessages': str(visible),
+        'ApproximateNumberOfMessagesNotVisible': str(in_flight)
+    }}
+    return sqs
+
+
+class TestAdmissionDecision:
+    """Test how queue state maps to accept/degrade/shed"""
+
+    def test_disabled_by_default(self):
+        assert backpressure.admission_decision({'depth': 10 ** 6, 'age_seconds': 10 ** 6}) == (backpressure.ACCEPT, None)
+
+    def test_depth_thresholds(self, thresholds):
+        assert backpressure.admission_decision({'depth': 99})[0] == backpressure.ACCEPT
+        assert backpressure.admission_decision({'depth': 100})[0] == backpressure.DEGRADE
+        assert backpressure.admission_decision({'depth': 1000})[0] == backpressure.SHED
+
+    def test_age_thresholds(self, thresholds):
+        assert backpressure.admission_decision({'depth': 5, 'age_seconds': 400})[0] == backpressure.DEGRADE
+        assert backpressure.admission_decision({'depth': 5, 'age_seconds': 2000})[0] == backpressure.SHED
+
+    def test_unknown_state_is_accepted(self, thresholds):
+        assert backpressure.admission_decision({'depth': None, 'age_seconds': None})[0] == backpressure.ACCEPT
+
+
+class TestQueueState:
+    """Test the cached queue depth and age"""
+
+    def test_depth_includes_in_flight_messages(self, thresholds):
+        state = backpressure.queue_state(sqs_with_depth(40, 60), MagicMock(), 'https://sqs/q', now=0)
+        assert state['depth'] == 100
+
+    def test_depth_is_cached_between_refreshes(self, thresholds, monkeypatch):
+        monkeypatch.setenv('QUEUE_STATS_TTL_SECONDS', '5')
+        sqs = sqs_with_depth(10)
+        backpressure.queue_state(sqs, MagicMock(), 'https://sqs/q', now=100)
+        backpressure.queue_state(sqs, MagicMock(), 'https://sqs/q', now=104)
+        assert sqs.get_queue_attributes.call_count == 1
+        backpressure.queue_state(sqs, MagicMock(), 'https://sqs/q', now=105)
+        assert sqs.get_queue_attributes.call_count == 2
+
+    def test_age_is_read_from_cloudwatch(self, thresholds):
+        cloudwatch = MagicMock()
+        cloudwatch.get_metric_statistics.return_value = {'Datapoints': [
+            {'Timestamp': 1, 'Maximum': 120.0}, {'Timestamp': 2, 'Maximum': 600.0}
+        ]}
+        state = backpressure.queue_state(sqs_with_depth(0), cloudwatch, 'https://sqs/eu/123/dev-queue', now=0)
+        assert state['age_seconds'] == 600.0
+        dimensions = cloudwatch.get_metric_statistics.call_args.kwargs['Dimensions']
+        assert dimensions == [{'Name': 'QueueName', 'Value': 'dev-queue'}]
+
+    def test_read_failure_fails_open(self, thresholds):
+        sqs = MagicMock()
+        sqs.get_queue_attributes.side_effect = Exception('AccessDenied')
+        state = backpressure.queue_state(sqs, MagicMock(), 'https://sqs/q', now=0)
+        assert backpressure.admission_decision(state)[0] == backpressure.ACCEPT
+
+
+class TestUploadBackpressure:
+    """Test the upload Lambda's response to a long backlog"""
+
+    @pytest.fixture
+    def upload_handler(self, monkeypatch, thresholds):
+        monkeypatch.setenv('S3_BUCKET', 'test-bucket')
+        monkeypatch.setenv('SQS_QUEUE', 'https://sqs.local/test-queue')
+        monkeypatch.setenv('DYNAMODB_TABLE', 'test-table')
+        handler = load_handler('upload')
+        stubs = install_stubs(handler, Latency(0, 0))
+        return handler, stubs
+
+    def test_sheds_with_retry_after(self, upload_handler):
+        handler, stubs = upload_handler
+        stubs.clients['sqs'].messages = ['{}'] * 1000
+
+        response = handler.lambda_handler(upload_event(), None)
+
+        assert response['statusCode'] == 503
+        assert int(response['headers']['Retry-After']) > 0
+        assert len(stubs.clients['s3'].objects) == 0
+        assert len(stubs.clients['sqs'].messages) == 1000
+
+    def test_invalid_upload_gets_4xx_while_shedding(self, upload_handler, monkeypatch):
+        handler, stubs = upload_handler
+        stubs.clients['sqs'].messages = ['{}'] * 1000
+        sqs = MagicMock(wraps=stubs.clients['sqs'])
+        stubs.clients['sqs'] = sqs
+        handler._aws = None
+
+        event = upload_event()
+        event['body'] = 'not json'
+        assert handler.lambda_handler(event, None)['statusCode'] == 400
+        assert handler.lambda_handler(upload_event(b'GIF89a' + b'\x00' * 100), None)['statusCode'] == 400
+        monkeypatch.setenv('MAX_IMAGE_BYTES', '64')
+        assert handler.lambda_handler(upload_event(), None)['statusCode'] == 413
+        sqs.get_queue_attributes.assert_not_called()
+
+    def test_degrades_detection_mode(self, upload_handler):
+        handler, stubs = upload_handler
+        stubs.clients['sqs'].messages = ['{}'] * 150
+
+        response = handler.lambda_handler(upload_event(), None)
+
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['detection_mode'] == 'degraded'
+        assert json.loads(stubs.clients['sqs'].messages[-1])['detection_mode'] == 'degraded'
+        item = next(iter(stubs.resources['dynamodb'].Table('test-table').items.values()))
+        assert item['detection_mode'] == 'degraded'
+
+
+class TestDegradedProcessing:
+    """Test what the process Lambda skips for scans queued in degraded mode"""
+
+    def test_same_detection_without_optional_work(self, monkeypatch):
+        monkeypatch.setenv('DYNAMODB_TABLE', 'test-table')
+        monkeypatch.setenv('PHASH_TABLE', 'test-phash')
+        monkeypatch.setenv('THUMBNAILS_ENABLED', 'true')
+        process = load_handler('process')
+        stubs = install_stubs(process, Latency(0, 0))
+        rekognition = MagicMock()
+        rekognition.detect_labels.return_value = {'Labels': []}
+        stubs.clients['rekognition'] = rekognition
+        message = {'scan_id': 'scan-1', 's3_bucket': 'test-bucket', 's3_key': 'images/scan-1.jpeg',
+                   'detection_mode': 'degraded'}
+
+        # No image in the stub bucket: any download would fail the scan
+        process.process({'Records': [{'body': json.dumps(message)}]}, None)
+
+        assert rekognition.detect_labels.call_args.kwargs['MinConfidence'] == process.DETECTION_SETTINGS['MinConfidence']
+        item = stubs.resources['dynamodb'].Table('test-table').items['scan-1']
+        assert item['status'] == 'COMPLETED'
+        assert 'thumbnail_keys' not in item and 'phash' not in item
@@ -0,0 +1,168 @@
+import base64
+import io
+import json
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../perf'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/lambdas/common'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/lambdas/upload'))
+
+import capture
+from harness import Latency, StubBoto3, install_stubs, load_handler
+from image_validation import validate_image
+from replay import Replayer, load_corpus, synthesize_image, upload_event as replay_upload_event
+from test_upload_handler import upload_event
+
+CAT_LABELS = [{
+    'Name': 'Cat',
+    'Confidence': 97.5,
+    'Categories': [{'Name': 'Animals and Pets'}],
+    'Instances': [{'Confidence': 97.5, 'BoundingBox': {'Width': 0.5, 'Height': 0.5, 'Left': 0.1, 'Top': 0.2}}]
+}]
+
+
+@pytest.fixture
+def capture_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv('CAPTURE_MODE', 'file')
+    monkeypatch.setenv('CAPTURE_DIR', str(tmp_path))
+    monkeypatch.setenv('S3_BUCKET', 'test-bucket')
+    monkeypatch.setenv('SQS_QUEUE', 'https://sqs.local/test-queue')
+    monkeypatch.setenv('DYNAMODB_TABLE', 'test-table')
+    return tmp_path
+
+
+def jpeg(size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color='gray').save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class TestSanitizing:
+    """Test what a capture record keeps of a request"""
+
+    def test_api_event_keeps_only_what_handlers_read(self):
+        event = {
+            'httpMethod': 'GET',
+            'resource': '/history/{user_id}',
+            'pathParameters': {'user_id': 'alice@example.com'},
+            'queryStringParameters': {'limit': '5'},
+            'headers': {'Authorization': 'secret', 'If-None-Match': '"abc"', 'X-Forwarded-For': '10.0.0.1'},
+            'requestContext': {'identity': {'sourceIp': '10.0.0.1'}},
+            'body': None
+        }
+        sanitized = capture.sanitize_api_event(event)
+
+        assert sanitized['headers'] == {'if-none-match': '"abc"'}
+        assert sanitized['pathParameters']['user_id'] == capture.pseudonym('alice@example.com')
+        assert 'alice' not in json.dumps(sanitized)
+        assert 'requestContext' not in sanitized
+
+    def test_pseudonyms_are_stable_and_salted(self, monkeypatch):
+        assert capture.pseudonym('alice') == capture.pseudonym('alice')
+        assert capture.pseudonym('anonymous') == 'anonymous'
+        unsalted = capture.pseudonym('alice')
+        monkeypatch.setenv('CAPTURE_SALT', 'pepper')
+        assert capture.pseudonym('alice') != unsalted
+
+    def test_sampling_is_off_by_default_and_keyed(self, monkeypatch):
+        assert not capture.active('scan-1')
+        monkeypatch.setenv('CAPTURE_MODE', 'log')
+        monkeypatch.setenv('CAPTURE_SAMPLE_RATE', '0.5')
+        keys = [f'scan-{i}' for i in range(200)]
+        sampled = [capture.active(key) for key in keys]
+        assert sampled == [capture.active(key) for key in keys]
+        assert 50 < sum(sampled) < 150
+
+    def test_log_mode_prints_capture_lines(self, monkeypatch, capsys):
+        monkeypatch.setenv('CAPTURE_MODE', 'log')
+        capture.record('rekognition', 'process', {'Labels': []})
+        line = json.loads(capsys.readouterr().out.strip())
+        assert line['capture']['kind'] == 'rekognition'
+
+
+class TestHandlerCapture:
+    """Test the records the handlers write in capture mode"""
+
+    def test_upload_records_image_shape_not_bytes(self, capture_dir):
+        handler = load_handler('upload')
+        install_stubs(handler, Latency(0, 0))
+        image = jpeg((64, 48))
+        event = upload_event(image)
+        event['body'] = json.dumps({**json.loads(event['body']), 'user_id': 'alice'})
+
+        assert handler.lambda_handler(event, None)['statusCode'] == 200
+
+        [record] = load_corpus([str(capture_dir)])
+        assert record['kind'] == 'api' and record['source'] == 'upload'
+        body = record['data']['body']
+        assert (body['width'], body['height'], body['image_bytes']) == (64, 48, len(image))
+        assert body['user_id'] == capture.pseudonym('alice')
+        assert base64.b64encode(image).decode('utf-8')[:40] not in (capture_dir / os.listdir(capture_dir)[0]).read_text()
+
+    def test_process_records_message_and_labels(self, capture_dir):
+        handler = load_handler('process')
+        stubs = install_stubs(handler, Latency(0, 0))
+        stubs.clients['rekognition'].default_labels = CAT_LABELS
+        stubs.clients['s3'].objects[('test-bucket', 'images/scan-1.jpeg')] = jpeg((320, 240))
+        message = {'scan_id': 'scan-1', 's3_bucket': 'test-bucket', 's3_key': 'images/scan-1.jpeg'}
+
+        handler.process({'Records': [{'body': json.dumps(message)}]}, None)
+
+        records = {r['kind']: r for r in load_corpus([str(capture_dir)])}
+        assert records['sqs']['data']['message'] == message
+        assert records['sqs']['data']['image']['width'] == 320
+        assert records['rekognition']['data']['image_key'] == 'images/scan-1.jpeg'
+        assert records['rekognition']['data']['Labels'] == CAT_LABELS
+
+
+class TestReplay:
+    """Test rebuilding and replaying recorded traffic"""
+
+    @pytest.mark.parametrize('image_type', ['image/jpeg', 'image/png'])
+    def test_synthesized_image_matches_recorded_shape(self, image_type):
+        data = synthesize_image(image_type, 800, 600, 300_000)
+
+        assert len(data) == 300_000
+        assert validate_image(data, image_type)['width'] == 800
+        Image.open(io.BytesIO(data)).load()
+
+    def test_rebuilt_binary_upload(self):
+        event = replay_upload_event({
+            'httpMethod': 'POST', 'headers': {'content-type': 'image/png'},
+            'queryStringParameters': {'user_id': 'user-1'}, 'isBase64Encoded': True,
+            'body': {'encoding': 'binary', 'image_type': 'image/png', 'width': 40, 'height': 30, 'image_bytes': 5000}
+        })
+        assert event['isBase64Encoded']
+        assert len(base64.b64decode(event['body'])) == 5000
+
+    def test_recorded_traffic_replays_through_handlers(self, capture_dir, monkeypatch):
+        monkeypatch.setenv('STATS_TABLE', 'test-stats')
+        stubs = StubBoto3(Latency(0, 0))
+        stubs.clients['rekognition'].default_labels = CAT_LABELS
+        upload, process, status = (load_handler(name) for name in ('upload', 'process', 'status'))
+        for module in (upload, process, status):
+            install_stubs(module, stubs=stubs)
+
+        # Record a small session: an upload, its processing and two polls
+        assert upload.lambda_handler(upload_event(jpeg((200, 150))), None)['statusCode'] == 200
+        message = json.loads(stubs.clients['sqs'].messages[0])
+        process.process({'Records': [{'body': json.dumps(message)}]}, None)
+        for _ in range(2):
+            poll = {'httpMethod': 'GET', 'pathParameters': {'id': message['scan_id']}}
+            assert status.lambda_handler(poll, None)['statusCode'] == 200
+
+        corpus = load_corpus([str(capture_dir)])
+        assert [r['kind'] for r in corpus].count('api') == 3
+
+        replayer = Replayer(corpus, speedup=0, workers=4)
+        replayer.run()
+        report = replayer.report()
+
+        assert report['upload']['outcomes'] == {'200': 1}
+        assert report['process']['outcomes'] == {'ok': 1}
+        assert report['status']['outcomes'] == {'200': 2}
+        assert replayer.table.items[message['scan_id']]['cats_found'] is True
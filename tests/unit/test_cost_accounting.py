@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../perf'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/lambdas/common'))
+
+from cost_meter import CostMeter, consumed_capacity
+from cost_report import DEFAULT_PRICES, summarize
+from harness import Latency, install_stubs, load_handler
+from test_upload_handler import upload_event
+
+
+class TestCostMeter:
+    """Test the per-scan operation counters"""
+
+    def test_consumed_capacity_single_and_batch(self):
+        assert consumed_capacity({'ConsumedCapacity': {'TableName': 't', 'CapacityUnits': 1.5}}) == 1.5
+        assert consumed_capacity({'ConsumedCapacity': [
+            {'TableName': 'a', 'CapacityUnits': 1.0}, {'TableName': 'b', 'CapacityUnits': 0.5}
+        ]}) == 1.5
+        assert consumed_capacity({}) == 0
+
+    def test_counts_and_item_form(self):
+        meter = CostMeter()
+        meter.dynamodb_write({'ConsumedCapacity': {'CapacityUnits': 1.0}})
+        meter.dynamodb_read({'ConsumedCapacity': {'CapacityUnits': 0.5}})
+        meter.rekognition_call()
+        meter.s3_get(2048)
+
+        assert meter.as_item() == {
+            'dynamodb_wcu': Decimal('1.0'),
+            'dynamodb_rcu': Decimal('0.5'),
+            'rekognition_calls': Decimal('1'),
+            's3_get_requests': Decimal('1'),
+            's3_bytes_out': Decimal('2048')
+        }
+
+    def test_emits_embedded_metric_log(self, capsys):
+        meter = CostMeter()
+        meter.rekognition_call()
+        meter.emit('process', 'alice', 'degraded')
+
+        record = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+        assert record['UserId'] == 'alice'
+        assert record['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['Stage', 'DetectionMode']]
+        assert record['DetectionMode'] == 'degraded'
+        assert record['rekognition_calls'] == 1
+        assert record['_aws']['CloudWatchMetrics'][0]['Metrics'] == [{'Name': 'rekognition_calls', 'Unit': 'Count'}]
+
+
+class TestUploadCost:
+    """Test the cost record handed from upload to the processor"""
+
+    def test_upload_cost_travels_with_the_message(self, monkeypatch):
+        monkeypatch.setenv('S3_BUCKET', 'test-bucket')
+        monkeypatch.setenv('SQS_QUEUE', 'https://sqs.local/test-queue')
+        monkeypatch.setenv('DYNAMODB_TABLE', 'test-table')
+        handler = load_handler('upload')
+        stubs = install_stubs(handler, Latency(0, 0))
+
+        response = handler.lambda_handler(upload_event(), None)
+
+        assert response['statusCode'] == 200
+        cost = json.loads(stubs.clients['sqs'].messages[0])['cost_upload']
+        assert cost['s3_put_requests'] == 1
+        assert cost['s3_bytes_in'] > 0
+        assert cost['sqs_requests'] == 1
+
+
+class TestCostReport:
+    """Test the cost report aggregation"""
+
+    def test_cost_per_thousand_by_mode_and_result(self):
+        items = [
+            {'user_id': 'alice', 'status': 'COMPLETED', 'detection_mode': 'full',
+             'cost_upload': {'s3_put_requests': Decimal('1'), 'dynamodb_wcu': Decimal('1')},
+             'cost_process': {'rekognition_calls': Decimal('1'), 'dynamodb_wcu': Decimal('3')}},
+            {'user_id': 'bob', 'status': 'COMPLETED', 'reused_from': 'scan-1',
+             'cost_process': {'dynamodb_rcu': Decimal('4'), 'dynamodb_wcu': Decimal('2')}},
+            {'user_id': 'carol', 'status': 'COMPLETED'}
+        ]
+
+        groups = summarize(items, DEFAULT_PRICES)
+
+        assert groups['overall'].scans == 2
+        assert groups['by_result']['fresh'].counters['rekognition_calls'] == 1
+        assert groups['by_result']['reused'].per_thousand(DEFAULT_PRICES) < groups['by_result']['fresh'].per_thousand(DEFAULT_PRICES)
+        fresh = 0.005e-3 + 4 * 1.25e-6 + 0.001
+        assert abs(groups['by_user']['alice'].per_thousand(DEFAULT_PRICES) - fresh * 1000) < 1e-9
@@ -0,0 +1,62 @@
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/lambdas/upload'))
+
+from image_validation import ImageValidationError, validate_image
+
+
+def encode(size=(40, 30), image_format='JPEG', **kwargs):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color='blue').save(buffer, format=image_format, **kwargs)
+    return buffer.getvalue()
+
+
+class TestImageValidation:
+    """Test header sniffing of uploaded images"""
+
+    def test_jpeg_dimensions(self):
+        info = validate_image(encode((40, 30)), 'image/jpeg')
+        assert info == {'content_type': 'image/jpeg', 'width': 40, 'height': 30}
+
+    def test_progressive_jpeg_dimensions(self):
+        info = validate_image(encode((64, 48), progressive=True), 'image/jpeg')
+        assert (info['width'], info['height']) == (64, 48)
+
+    def test_png_dimensions(self):
+        info = validate_image(encode((25, 50), 'PNG'), 'image/png')
+        assert info == {'content_type': 'image/png', 'width': 25, 'height': 50}
+
+    def test_rejects_unsupported_format(self):
+        with pytest.raises(ImageValidationError, match='JPEG and PNG'):
+            validate_image(encode(image_format='GIF'), 'image/jpeg')
+
+    def test_rejects_mislabeled_image(self):
+        with pytest.raises(ImageValidationError, match='content_type'):
+            validate_image(encode(image_format='PNG'), 'image/jpeg')
+
+    def test_rejects_truncated_jpeg(self):
+        data = encode((200, 200))
+        with pytest.raises(ImageValidationError, match='Truncated'):
+            validate_image(data[:len(data) // 2], 'image/jpeg')
+
+    def test_rejects_truncated_png(self):
+        data = encode((200, 200), 'PNG')
+        with pytest.raises(ImageValidationError, match='Truncated'):
+            validate_image(data[:-20], 'image/png')
+
+    def test_rejects_oversize_dimensions(self, monkeypatch):
+        monkeypatch.setenv('MAX_IMAGE_DIMENSION', '100')
+        with pytest.raises(ImageValidationError) as error:
+            validate_image(encode((101, 10)), 'image/jpeg')
+        assert error.value.status_code == 413
+
+    def test_rejects_oversize_bytes(self, monkeypatch):
+        monkeypatch.setenv('MAX_IMAGE_BYTES', '10')
+        with pytest.raises(ImageValidationError) as error:
+            validate_image(encode(), 'image/jpeg')
+        assert error.value.status_code == 413
@@ -0,0 +1,125 @@
+import io
+import os
+import sys
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/lambdas/process'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../perf'))
+
+import perceptual_hash
+from harness import load_handler
+
+
+def sample_image(quality=90, size=(320, 240)):
+    image = Image.new('RGB', (320, 240), (30, 120, 200))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([40, 30, 180, 200], fill=(240, 200, 40))
+    draw.ellipse([150, 60, 300, 220], fill=(200, 30, 60))
+    buffer = io.BytesIO()
+    image.resize(size).save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class TestPerceptualHash:
+    """Test the dHash and its band index keys"""
+
+    def test_recompressed_and_resized_copies_are_close(self):
+        original = perceptual_hash.dhash(sample_image())
+        recompressed = perceptual_hash.dhash(sample_image(quality=40))
+        resized = perceptual_hash.dhash(sample_image(size=(160, 120)))
+
+        assert perceptual_hash.hamming_distance(original, recompressed) <= 3
+        assert perceptual_hash.hamming_distance(original, resized) <= 3
+
+    def test_exif_rotated_copy_matches(self):
+        # Pixels stored rotated, with an Orientation tag telling viewers to turn them back
+        image = Image.open(io.BytesIO(sample_image())).transpose(Image.Transpose.ROTATE_90)
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=90, exif=exif)
+
+        distance = perceptual_hash.hamming_distance(
+            perceptual_hash.dhash(sample_image()), perceptual_hash.dhash(buffer.getvalue()))
+        assert distance <= perceptual_hash.MAX_INDEXED_DISTANCE
+
+    def test_close_hashes_share_a_band(self):
+        value = perceptual_hash.dhash(sample_image())
+        # Flip one bit in each of three different bands
+        near = value ^ (1 << 0) ^ (1 << 20) ^ (1 << 40)
+
+        assert perceptual_hash.hamming_distance(value, near) == 3
+        assert set(perceptual_hash.band_keys(value)) & set(perceptual_hash.band_keys(near))
+
+    def test_flat_images_are_not_informative(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 100), (128, 128, 128)).save(buffer, format='PNG')
+
+        assert not perceptual_hash.is_informative(perceptual_hash.dhash(buffer.getvalue()))
+
+    def test_hex_round_trip(self):
+        value = perceptual_hash.dhash(sample_image())
+        assert perceptual_hash.from_hex(perceptual_hash.to_hex(value)) == value
+
+
+class TestNearDuplicateLookup:
+    """Test result reuse in the process Lambda"""
+
+    def test_reuses_closest_completed_scan(self, monkeypatch):
+        monkeypatch.setenv('PHASH_TABLE', 'test-phash')
+        process = load_handler('process')
+        value = perceptual_hash.dhash(sample_image())
+        stored = perceptual_hash.to_hex(value ^ 1)
+
+        index = MagicMock()
+        index.query.return_value = {'Items': [{'band_key': 'b0#0000', 'scan_id': 'source', 'phash': stored}]}
+        scans = MagicMock()
+        scans.get_item.return_value = {'Item': {
+            'scan_id': 'source', 'status': 'COMPLETED', 'cats_found': True, 'cat_count': 1,
+            'highest_confidence': Decimal('97.1'), 'total_labels': 3,
+            'debug_data': {'cat_labels': [{'Name': 'Cat'}], 'all_labels': [{'Name': 'Cat'}]}
+        }}
+        tables = {'test-phash': index, 'scans': scans}
+        process._aws = {'dynamodb': MagicMock(Table=lambda name: tables[name])}
+
+        match = process.find_near_duplicate(value, 'new-scan', 'scans')
+
+        assert match['scan_id'] == 'source'
+        assert match['distance'] == 1
+        assert match['result']['cats_found'] is True
+        assert match['result']['highest_confidence'] == Decimal('97.1')
+
+    def test_ignores_matches_beyond_threshold(self, monkeypatch):
+        monkeypatch.setenv('PHASH_TABLE', 'test-phash')
+        monkeypatch.setenv('PHASH_MAX_DISTANCE', '1')
+        process = load_handler('process')
+        value = perceptual_hash.dhash(sample_image())
+
+        index = MagicMock()
+        index.query.return_value = {'Items': [
+            {'band_key': 'b0#0000', 'scan_id': 'far', 'phash': perceptual_hash.to_hex(value ^ 0b11)}
+        ]}
+        process._aws = {'dynamodb': MagicMock(Table=MagicMock(return_value=index))}
+
+        assert process.find_near_duplicate(value, 'new-scan', 'scans') is None
+
+    def test_reads_every_page_of_a_band(self, monkeypatch):
+        monkeypatch.setenv('PHASH_TABLE', 'test-phash')
+        process = load_handler('process')
+        value = perceptual_hash.dhash(sample_image())
+
+        index = MagicMock()
+        far = {'band_key': 'b0#0000', 'scan_id': 'far', 'phash': perceptual_hash.to_hex(value ^ 0xff)}
+        near = {'band_key': 'b0#0000', 'scan_id': 'near', 'phash': perceptual_hash.to_hex(value)}
+        index.query.side_effect = lambda **kwargs: (
+            {'Items': [near]} if 'ExclusiveStartKey' in kwargs else {'Items': [far], 'LastEvaluatedKey': {'k': 1}}
+        )
+        scans = MagicMock()
+        scans.get_item.return_value = {'Item': {'scan_id': 'near', 'status': 'COMPLETED', 'cats_found': False}}
+        tables = {'test-phash': index, 'scans': scans}
+        process._aws = {'dynamodb': MagicMock(Table=lambda name: tables[name])}
+
+        assert process.find_near_duplicate(value, 'new-scan', 'scans')['scan_id'] == 'near'
@@ -0,0 +1,142 @@
+import json
+import os
+import sys
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+
+import redetect
+from redetect import Checkpoint, Redetector, export_pages
+
+
+def scan_item(scan_id, labels, cats_found):
+    cat_labels = [label for label in labels if cats_found and label['Name'] == 'Cat']
+    return {
+        'scan_id': scan_id,
+        'status': 'COMPLETED',
+        'updated_at': '2026-10-01T00:00:00',
+        'cats_found': cats_found,
+        'cat_count': len(cat_labels),
+        'highest_confidence': max([l['Confidence'] for l in cat_labels], default=Decimal('0')),
+        'debug_data': {'cat_labels': cat_labels, 'all_labels': labels}
+    }
+
+
+LYNX = [{'Name': 'Lynx', 'Confidence': Decimal('91.5'), 'Categories': [], 'Instances': []}]
+CAT = [{'Name': 'Cat', 'Confidence': Decimal('98.0'), 'Categories': [], 'Instances': []}]
+
+
+@pytest.fixture
+def lynx_is_a_cat(monkeypatch):
+    original = redetect.process_handler.is_cat_related
+    monkeypatch.setattr(redetect.process_handler, 'is_cat_related',
+                        lambda name: name.lower() == 'lynx' or original(name))
+
+
+def redetector(table, **kwargs):
+    return Redetector(table, 'rescore', workers=2, write_rate=1000, detect_rate=1000, **kwargs)
+
+
+class TestRescore:
+    """Test re-scoring stored labels with a changed taxonomy"""
+
+    def test_dry_run_counts_flips_without_writing(self, lynx_is_a_cat):
+        table = MagicMock()
+        job = redetector(table, dry_run=True)
+        job.run_segment(0, iter([([scan_item('a', LYNX, False), scan_item('b', CAT, True)], 2, None)]))
+
+        assert job.counts['flipped_to_cat'] == 1
+        assert job.counts['unchanged'] == 1
+        assert job.counts['scanned'] == 2
+        assert job.sample_flips[0]['scan_id'] == 'a'
+        table.update_item.assert_not_called()
+
+    def test_update_is_conditional_on_updated_at(self, lynx_is_a_cat):
+        table = MagicMock()
+        job = redetector(table)
+        job.process_item(scan_item('a', LYNX, False))
+
+        params = table.update_item.call_args.kwargs
+        assert params['ExpressionAttributeValues'][':seen'] == '2026-10-01T00:00:00'
+        assert 'updated_at' in params['ExpressionAttributeNames'].values()
+        assert job.counts['updated'] == 1
+
+    def test_concurrent_change_is_a_conflict(self, lynx_is_a_cat):
+        table = MagicMock()
+        table.update_item.side_effect = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, 'UpdateItem')
+        job = redetector(table)
+        job.process_item(scan_item('a', LYNX, False))
+
+        assert job.counts['conflicts'] == 1
+        assert job.counts['updated'] == 0
+
+
+class TestRedetect:
+    """Test running detection again on the stored images"""
+
+    def test_scans_without_bucket_use_the_default(self, monkeypatch):
+        detect = MagicMock(return_value={'cats_found': True, 'cat_count': 1, 'highest_confidence': Decimal('98.0'),
+                                         'total_labels': 1, 'cat_labels': CAT, 'all_labels': CAT})
+        monkeypatch.setattr(redetect.process_handler, 'detect_cats_in_image', detect)
+        job = Redetector(MagicMock(), 'redetect', workers=2, write_rate=1000, detect_rate=1000,
+                         dry_run=True, bucket='dev-images')
+        old = dict(scan_item('old', LYNX, False), image_key='images/old.jpeg')
+        new = dict(scan_item('new', LYNX, False), image_key='images/new.jpeg', s3_bucket='other-images')
+        job.run_segment(0, iter([([old, new, scan_item('lost', LYNX, False)], 3, None)]))
+
+        assert sorted(call.args[:2] for call in detect.call_args_list) == [
+            ('images/new.jpeg', 'other-images'), ('images/old.jpeg', 'dev-images')
+        ]
+        assert job.counts['flipped_to_cat'] == 2
+        assert job.counts['skipped'] == 1
+
+
+class TestCheckpoint:
+    """Test resume positions"""
+
+    def test_resume_position_is_saved_per_page(self, tmp_path):
+        path = str(tmp_path / 'checkpoint.json')
+        settings = {'mode': 'rescore', 'source': 'scan', 'segments': 4, 'dry_run': False}
+        job = redetector(MagicMock(), checkpoint=Checkpoint(path, settings))
+        job.run_segment(3, iter([([], 10, {'scan_id': 'k1'}), ([], 5, None)]))
+        job.run_segment(1, iter([([], 7, {'scan_id': 'k2'})]))
+
+        resumed = Checkpoint(path, settings)
+        assert resumed.segment(3)['done'] and resumed.segment(3)['position'] is None
+        assert resumed.segment(1)['position'] == {'scan_id': 'k2'}
+        assert resumed.counts['scanned'] == 22
+
+        with pytest.raises(SystemExit):
+            Checkpoint(path, dict(settings, segments=8))
+
+    def test_resume_counts_only_checkpointed_work(self, tmp_path, lynx_is_a_cat):
+        path = str(tmp_path / 'checkpoint.json')
+        settings = {'mode': 'rescore', 'source': 'scan', 'segments': 2, 'dry_run': True}
+        job = redetector(MagicMock(), dry_run=True, checkpoint=Checkpoint(path, settings))
+        # Segment 1 has processed an item but crashes before checkpointing its page
+        job.process_item(scan_item('b', LYNX, False), segment=1)
+        job.run_segment(0, iter([([scan_item('a', LYNX, False)], 1, {'scan_id': 'a'})]))
+
+        resumed = redetector(MagicMock(), dry_run=True, checkpoint=Checkpoint(path, settings))
+        assert resumed.counts['flipped_to_cat'] == 1
+        resumed.run_segment(1, iter([([scan_item('b', LYNX, False)], 1, None)]))
+        assert resumed.counts['flipped_to_cat'] == 2
+        assert Checkpoint(path, settings).counts['flipped_to_cat'] == 2
+
+    def test_export_pages_resume_by_line(self, tmp_path):
+        path = tmp_path / 'data.json'
+        lines = [json.dumps({'Item': {'scan_id': {'S': f's{i}'}, 'status': {'S': 'COMPLETED'}}})
+                 for i in range(250)]
+        path.write_text('\n'.join(lines) + '\n')
+
+        pages = list(export_pages(str(path), None))
+        assert [(len(items), scanned, position) for items, scanned, position in pages] == [
+            (100, 100, 100), (100, 100, 200), (50, 50, None)
+        ]
+        resumed = list(export_pages(str(path), 200))
+        assert resumed[0][0][0]['scan_id'] == 's200'
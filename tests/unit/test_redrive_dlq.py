@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../scripts'))
+
+from redrive_dlq import Redriver, classify_failure
+
+
+def dlq_message(scan_id, index):
+    return {
+        'MessageId': f'msg-{index}',
+        'ReceiptHandle': f'receipt-{index}',
+        'Body': json.dumps({'scan_id': scan_id, 's3_bucket': 'bucket', 's3_key': f'images/{scan_id}.jpeg'})
+    }
+
+
+class TestClassifyFailure:
+    """Test which DLQ scans are worth redriving"""
+
+    def test_transient_error_is_retried(self):
+        item = {'status': 'ERROR', 'error_message': 'ThrottlingException: Rate exceeded'}
+        assert classify_failure(item, max_redrives=3) is None
+
+    def test_invalid_image_is_permanent(self):
+        item = {'status': 'ERROR', 'error_message': 'An error occurred (InvalidImageFormatException)'}
+        assert classify_failure(item, max_redrives=3) == 'InvalidImageFormatException'
+
+    def test_missing_record_is_permanent(self):
+        assert classify_failure(None, max_redrives=3) == 'scan record not found'
+
+    def test_redrive_limit(self):
+        item = {'status': 'ERROR', 'error_message': 'timeout', 'redrive_count': 3}
+        assert classify_failure(item, max_redrives=3) is not None
+
+
+class TestRedriver:
+    """Test a single redrive batch end to end against mocked AWS clients"""
+
+    def test_batch_redrives_only_retryable_scans(self):
+        sqs = MagicMock()
+        sqs.send_message_batch.return_value = {'Successful': [{'Id': '0'}], 'Failed': []}
+        dynamodb = MagicMock()
+        dynamodb.batch_get_item.return_value = {'Responses': {'scans': [
+            {'scan_id': 'retry', 'status': 'ERROR', 'error_message': 'ThrottlingException'},
+            {'scan_id': 'done', 'status': 'COMPLETED'},
+            {'scan_id': 'bad', 'status': 'ERROR', 'error_message': 'InvalidImageFormatException'}
+        ]}}
+
+        redriver = Redriver(sqs, dynamodb, 'dlq-url', 'queue-url', 'scans', rate=100, max_redrives=3)
+        messages = [dlq_message('retry', 0), dlq_message('done', 1), dlq_message('bad', 2)]
+        redriver.process_batch(messages)
+
+        sent = sqs.send_message_batch.call_args.kwargs['Entries']
+        assert [json.loads(e['MessageBody'])['scan_id'] for e in sent] == ['retry']
+        deleted = sqs.delete_message_batch.call_args.kwargs['Entries']
+        assert sorted(e['ReceiptHandle'] for e in deleted) == ['receipt-0', 'receipt-1']
+        assert redriver.counts == {'received': 0, 'redriven': 1, 'stale': 1, 'duplicate': 0, 'permanent': 1,
+                                   'failed': 0}
+        assert redriver.permanent == {'bad': 'InvalidImageFormatException'}
+        dynamodb.Table.return_value.update_item.assert_called_once()
+
+    def test_dry_run_changes_nothing(self):
+        sqs = MagicMock()
+        dynamodb = MagicMock()
+        dynamodb.batch_get_item.return_value = {'Responses': {'scans': [
+            {'scan_id': 'retry', 'status': 'ERROR', 'error_message': 'timeout'}
+        ]}}
+
+        redriver = Redriver(sqs, dynamodb, 'dlq-url', 'queue-url', 'scans', rate=100,
+                            max_redrives=3, dry_run=True)
+        redriver.process_batch([dlq_message('retry', 0)])
+
+        assert redriver.counts['redriven'] == 1
+        sqs.send_message_batch.assert_not_called()
+        sqs.delete_message_batch.assert_not_called()
+        dynamodb.Table.return_value.update_item.assert_not_called()
+
+    def test_pending_scan_is_redriven(self):
+        # The processor can fail before its first status update, leaving the scan PENDING
+        sqs = MagicMock()
+        sqs.send_message_batch.return_value = {'Successful': [{'Id': '0'}], 'Failed': []}
+        dynamodb = MagicMock()
+        dynamodb.batch_get_item.return_value = {'Responses': {'scans': [
+            {'scan_id': 'stuck', 'status': 'PENDING', 'updated_at': '2026-10-01T00:00:00'}
+        ]}}
+
+        redriver = Redriver(sqs, dynamodb, 'dlq-url', 'queue-url', 'scans', rate=100, max_redrives=3)
+        redriver.process_batch([dlq_message('stuck', 0)])
+
+        assert redriver.counts['redriven'] == 1
+        assert redriver.counts['stale'] == 0
+
+    def test_reset_requires_the_scan_unchanged_since_read(self):
+        sqs = MagicMock()
+        sqs.send_message_batch.return_value = {'Successful': [{'Id': '0'}], 'Failed': []}
+        dynamodb = MagicMock()
+        dynamodb.batch_get_item.return_value = {'Responses': {'scans': [
+            {'scan_id': 'retry', 'status': 'ERROR', 'error_message': 'timeout',
+             'updated_at': '2026-10-01T00:00:00', 'redrive_count': 1}
+        ]}}
+
+        redriver = Redriver(sqs, dynamodb, 'dlq-url', 'queue-url', 'scans', rate=100, max_redrives=3)
+        redriver.process_batch([dlq_message('retry', 0)])
+
+        update = dynamodb.Table.return_value.update_item.call_args.kwargs
+        assert update['ConditionExpression'] == '#updated = :seen_updated_at AND #redrives = :seen_redrive_count'
+        assert update['ExpressionAttributeValues'][':seen_updated_at'] == '2026-10-01T00:00:00'
+        assert update['ExpressionAttributeValues'][':seen_redrive_count'] == 1
+
+    def test_each_scan_is_redriven_once_per_run(self):
+        sqs = MagicMock()
+        sqs.send_message_batch.return_value = {'Successful': [{'Id': '0'}], 'Failed': []}
+        dynamodb = MagicMock()
+        dynamodb.batch_get_item.return_value = {'Responses': {'scans': [
+            {'scan_id': 'twice', 'status': 'ERROR', 'error_message': 'timeout', 'updated_at': '2026-10-01T00:00:00'}
+        ]}}
+
+        redriver = Redriver(sqs, dynamodb, 'dlq-url', 'queue-url', 'scans', rate=100, max_redrives=3)
+        redriver.process_batch([dlq_message('twice', 0), dlq_message('twice', 1)])
+        redriver.process_batch([dlq_message('twice', 2)])
+
+        dynamodb.Table.return_value.update_item.assert_called_once()
+        assert len(sqs.send_message_batch.call_args_list) == 1
+        assert redriver.counts['duplicate'] == 2
+        deleted = [e['ReceiptHandle'] for call in sqs.delete_message_batch.call_args_list
+                   for e in call.kwargs['Entries']]
+        assert sorted(deleted) == ['receipt-0', 'receipt-1', 'receipt-2']
+
+    def test_message_kept_unless_scan_completed(self):
+        sqs = MagicMock()
+        dynamodb = MagicMock()
+        dynamodb.batch_get_item.return_value = {'Responses': {'scans': [
+            {'scan_id': 'racing', 'status': 'ERROR', 'error_message': 'timeout'}
+        ]}}
+        table = dynamodb.Table.return_value
+        table.update_item.side_effect = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+        table.get_item.return_value = {'Item': {'scan_id': 'racing', 'status': 'DELETED'}}
+
+        redriver = Redriver(sqs, dynamodb, 'dlq-url', 'queue-url', 'scans', rate=100, max_redrives=3)
+        redriver.process_batch([dlq_message('racing', 0)])
+
+        sqs.delete_message_batch.assert_not_called()
+        assert redriver.counts['failed'] == 1
@@ -0,0 +1,162 @@
+import json
+import os
+import sys
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../perf'))
+
+from harness import load_handler
+
+
+@pytest.fixture
+def stats_env(monkeypatch):
+    monkeypatch.setenv('STATS_TABLE', 'test-stats')
+    monkeypatch.setenv('STATS_SHARDS', '4')
+
+
+class TestRecordScanStats:
+    """Test the counter updates made by the process Lambda"""
+
+    def test_confidence_bucket(self):
+        process = load_handler('process')
+        assert process.confidence_bucket(Decimal('70.5')) == 'conf_70'
+        assert process.confidence_bucket(Decimal('89.99')) == 'conf_80'
+        assert process.confidence_bucket(Decimal('100')) == 'conf_90'
+
+    def test_shard_is_stable_and_in_range(self, stats_env):
+        process = load_handler('process')
+        shard = process.stats_shard('scan-123')
+        assert shard == process.stats_shard('scan-123')
+        assert 0 <= shard < 4
+
+    def test_updates_global_and_user_buckets(self, stats_env):
+        process = load_handler('process')
+        table = MagicMock()
+        process._aws = {'dynamodb': MagicMock(Table=MagicMock(return_value=table))}
+
+        process.record_scan_stats('scan-123', 'alice', cats_found=True, highest_confidence=Decimal('95.5'))
+
+        keys = [call.kwargs['Key']['stat_key'] for call in table.update_item.call_args_list]
+        assert keys[0].startswith('global#')
+        assert keys[1].startswith('user#alice#')
+        params = table.update_item.call_args_list[0].kwargs
+        assert params['ExpressionAttributeNames'] == {'#hist': 'conf_90'}
+        assert params['ExpressionAttributeValues'][':cats'] == 1
+
+    def test_disabled_without_stats_table(self, monkeypatch):
+        monkeypatch.delenv('STATS_TABLE', raising=False)
+        process = load_handler('process')
+        process._aws = {'dynamodb': MagicMock()}
+
+        process.record_scan_stats('scan-123', 'alice', error=True)
+
+        process._aws['dynamodb'].Table.assert_not_called()
+
+
+class TestErrorCountedOnce:
+    """Test that retries and later successes don't inflate the error counters"""
+
+    def test_only_the_first_failed_attempt_counts(self, stats_env):
+        process = load_handler('process')
+        scans, stats = MagicMock(), MagicMock()
+        process._aws = {'dynamodb': MagicMock(Table=lambda name: stats if name == 'test-stats' else scans)}
+        scans.update_item.side_effect = [
+            {},
+            ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+        ]
+
+        assert process.claim_error_stats('scan-123', 'test-table', '2026-10-18') is True
+        assert process.claim_error_stats('scan-123', 'test-table', '2026-10-18') is False
+        assert scans.update_item.call_args.kwargs['ConditionExpression'] == 'attribute_not_exists(stats_recorded)'
+        assert scans.update_item.call_args.kwargs['ExpressionAttributeValues'][':day'] == '2026-10-18'
+
+    def test_success_after_failure_retracts_the_error(self, stats_env):
+        process = load_handler('process')
+        scans, stats = MagicMock(), MagicMock()
+        process._aws = {'dynamodb': MagicMock(Table=lambda name: stats if name == 'test-stats' else scans)}
+        scans.update_item.return_value = {'Attributes': {'user_id': 'alice', 'stats_recorded': 'ERROR'}}
+        result = {'cats_found': False, 'cat_count': 0, 'highest_confidence': 0, 'total_labels': 0,
+                  'cat_labels': [], 'all_labels': []}
+
+        process.store_scan_results('scan-123', 'images/scan-123.jpeg', result, 'test-table')
+
+        values = stats.update_item.call_args.kwargs['ExpressionAttributeValues']
+        assert values[':scans'] == 1
+        assert values[':errors'] == -1
+
+    def test_error_is_retracted_from_the_day_it_was_counted(self, stats_env):
+        process = load_handler('process')
+        scans, stats = MagicMock(), MagicMock()
+        process._aws = {'dynamodb': MagicMock(Table=lambda name: stats if name == 'test-stats' else scans)}
+        scans.update_item.return_value = {'Attributes': {
+            'user_id': 'alice', 'stats_recorded': 'ERROR', 'error_stats_day': '2026-10-01'
+        }}
+        result = {'cats_found': False, 'cat_count': 0, 'highest_confidence': 0, 'total_labels': 0,
+                  'cat_labels': [], 'all_labels': []}
+
+        process.store_scan_results('scan-123', 'images/scan-123.jpeg', result, 'test-table')
+
+        updates = {call.kwargs['Key']['stat_key'].split('#')[-2]: call.kwargs['ExpressionAttributeValues']
+                   for call in stats.update_item.call_args_list if call.kwargs['Key']['stat_key'].startswith('global')}
+        assert updates['2026-10-01'] == {':errors': -1}
+        today = process.stats_day()
+        assert updates[today][':scans'] == 1 and updates[today][':errors'] == 0
+
+    def test_redelivered_success_is_not_counted(self, stats_env):
+        process = load_handler('process')
+        scans, stats = MagicMock(), MagicMock()
+        process._aws = {'dynamodb': MagicMock(Table=lambda name: stats if name == 'test-stats' else scans)}
+        scans.update_item.return_value = {'Attributes': {'user_id': 'alice', 'stats_recorded': True}}
+        result = {'cats_found': True, 'cat_count': 1, 'highest_confidence': Decimal('90'), 'total_labels': 1,
+                  'cat_labels': [], 'all_labels': []}
+
+        process.store_scan_results('scan-123', 'images/scan-123.jpeg', result, 'test-table')
+
+        stats.update_item.assert_not_called()
+
+
+class TestReadStats:
+    """Test the aggregation done by the stats endpoint"""
+
+    def test_user_stats_require_iam_identity(self, stats_env):
+        status = load_handler('status')
+        status._aws = {'dynamodb': MagicMock()}
+
+        for event in ({'httpMethod': 'GET', 'queryStringParameters': {'user_id': 'alice'}},
+                      {'httpMethod': 'GET', 'pathParameters': {'user_id': 'alice'}}):
+            assert status.stats(event, None)['statusCode'] == 403
+        status._aws['dynamodb'].batch_get_item.assert_not_called()
+
+        status._aws['dynamodb'].batch_get_item.return_value = {'Responses': {}}
+        admin = {'identity': {'userArn': 'arn:aws:iam::123456789012:user/support'}}
+        response = status.stats({'httpMethod': 'GET', 'requestContext': admin,
+                                 'pathParameters': {'user_id': 'alice'}}, None)
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['user']['user_id'] == 'alice'
+
+    def test_sums_shards_and_histogram(self, stats_env):
+        status = load_handler('status')
+        dynamodb = MagicMock()
+        dynamodb.batch_get_item.return_value = {
+            'Responses': {'test-stats': [
+                {'stat_key': 'global#2026-10-18#0', 'total_scans': Decimal('3'),
+                 'cats_found': Decimal('2'), 'error_count': Decimal('0'), 'conf_90': Decimal('2')},
+                {'stat_key': 'global#2026-10-18#1', 'total_scans': Decimal('1'),
+                 'cats_found': Decimal('0'), 'error_count': Decimal('1')}
+            ]}
+        }
+        status._aws = {'dynamodb': dynamodb}
+
+        totals = status.read_stats('test-stats', 'global', ['2026-10-18'])
+
+        requested = dynamodb.batch_get_item.call_args.kwargs['RequestItems']['test-stats']['Keys']
+        assert len(requested) == 4
+        assert totals['total_scans'] == 4
+        assert totals['cats_found'] == 2
+        assert totals['error_count'] == 1
+        assert totals['hit_rate'] == 0.5
+        assert totals['confidence_histogram'] == {'90': 2}
@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../perf'))
+
+from harness import load_handler
+
+
+def status_event(if_none_match=None, debug=False):
+    event = {
+        'httpMethod': 'GET',
+        'pathParameters': {'id': 'scan-1'},
+        'queryStringParameters': {'debug': 'true'} if debug else None,
+        'headers': {}
+    }
+    if if_none_match:
+        event['headers']['If-None-Match'] = if_none_match
+    return event
+
+
+@pytest.fixture
+def status_with_item(monkeypatch):
+    monkeypatch.setenv('DYNAMODB_TABLE', 'test-table')
+
+    def make(item):
+        status = load_handler('status')
+        table = MagicMock()
+        table.get_item.return_value = {'Item': item}
+        status._aws = {'dynamodb': MagicMock(Table=MagicMock(return_value=table))}
+        return status
+    return make
+
+
+COMPLETED = {'scan_id': 'scan-1', 'status': 'COMPLETED', 'updated_at': '2026-10-18T12:00:00',
+             'cats_found': True, 'highest_confidence': 97}
+
+
+class TestStatusCaching:
+    """Test ETag and Cache-Control handling on GET /status/{id}"""
+
+    def test_completed_scan_is_cacheable(self, status_with_item):
+        status = status_with_item(COMPLETED)
+        response = status.lambda_handler(status_event(), None)
+
+        assert response['statusCode'] == 200
+        assert response['headers']['Cache-Control'] == 'public, max-age=86400'
+        assert response['headers']['ETag'].startswith('"')
+
+    def test_in_progress_scan_must_revalidate(self, status_with_item):
+        status = status_with_item({'scan_id': 'scan-1', 'status': 'PROCESSING', 'updated_at': '2026-10-18T12:00:00'})
+        response = status.lambda_handler(status_event(), None)
+        assert response['headers']['Cache-Control'] == 'no-cache'
+
+    def test_matching_etag_returns_304(self, status_with_item):
+        status = status_with_item(COMPLETED)
+        etag = status.lambda_handler(status_event(), None)['headers']['ETag']
+
+        response = status.lambda_handler(status_event(if_none_match=f'"other", W/{etag}'), None)
+
+        assert response['statusCode'] == 304
+        assert response['body'] == ''
+        assert response['headers']['ETag'] == etag
+
+    def test_etag_changes_with_update_and_debug(self, status_with_item):
+        status = status_with_item(COMPLETED)
+        plain = status.status_etag(COMPLETED, False)
+        assert status.status_etag(COMPLETED, True) != plain
+        assert status.status_etag(dict(COMPLETED, updated_at='2026-10-19T08:00:00'), False) != plain
+
+        response = status.lambda_handler(status_event(if_none_match=plain, debug=True), None)
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['scan_id'] == 'scan-1'
+
+
+    def test_reused_result_does_not_reveal_its_source(self, status_with_item):
+        status = status_with_item(dict(COMPLETED, reused_from='someone-elses-scan', reuse_distance=2))
+        response = status.lambda_handler(status_event(debug=True), None)
+
+        assert json.loads(response['body'])['reused'] is True
+        assert 'someone-elses-scan' not in response['body']
+
+
+class TestThumbnailCaching:
+    """Test cache headers for responses carrying presigned thumbnail URLs"""
+
+    ITEM = dict(COMPLETED, s3_bucket='bucket',
+                thumbnail_keys={'preview': 'thumbnails/scan-1/preview.jpg', 'cats': ['thumbnails/scan-1/cat-0.jpg']})
+
+    def test_fresh_only_until_the_url_window_ends(self, status_with_item, monkeypatch):
+        monkeypatch.setenv('THUMBNAIL_URL_EXPIRY_SECONDS', '3600')
+        status = status_with_item(self.ITEM)
+
+        headers = status.cache_headers_for(self.ITEM, False, now=1800 * 10 + 300)
+
+        assert headers['ETag'].startswith('W/"')
+        assert headers['Cache-Control'] == 'public, max-age=1500'
+        assert status.cache_headers_for(self.ITEM, False, now=1800 * 11)['ETag'] != headers['ETag']
+
+    def test_response_has_presigned_urls_and_weak_etag_revalidates(self, status_with_item):
+        status = status_with_item(self.ITEM)
+        status._aws['s3'] = MagicMock(generate_presigned_url=MagicMock(side_effect=lambda op, Params, ExpiresIn: f"https://signed/{Params['Key']}"))
+
+        response = status.lambda_handler(status_event(), None)
+        body = json.loads(response['body'])
+        assert body['thumbnails']['preview'] == 'https://signed/thumbnails/scan-1/preview.jpg'
+        assert body['thumbnails']['cats'] == ['https://signed/thumbnails/scan-1/cat-0.jpg']
+
+        revalidated = status.lambda_handler(status_event(if_none_match=response['headers']['ETag']), None)
+        assert revalidated['statusCode'] == 304
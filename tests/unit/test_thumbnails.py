@@ -0,0 +1,86 @@
+import io
+import os
+import sys
+from decimal import Decimal
+
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/lambdas/process'))
+
+import thumbnails
+
+
+def cat_label(*boxes, confidence='95'):
+    return {
+        'Name': 'Cat',
+        'Confidence': Decimal(confidence),
+        'Instances': [
+            {'Confidence': Decimal(confidence),
+             'BoundingBox': {'Left': Decimal(str(l)), 'Top': Decimal(str(t)),
+                             'Width': Decimal(str(w)), 'Height': Decimal(str(h))}}
+            for l, t, w, h in boxes
+        ]
+    }
+
+
+def jpeg(size=(2000, 1500)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (120, 80, 40)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class TestThumbnails:
+    """Test the preview and cat crops rendered from bounding boxes"""
+
+    def test_duplicate_boxes_from_two_labels_are_merged(self):
+        boxes = thumbnails.cat_boxes([
+            cat_label((0.1, 0.1, 0.3, 0.3)),
+            cat_label((0.11, 0.1, 0.3, 0.3), confidence='80'),
+            cat_label((0.6, 0.5, 0.2, 0.2), confidence='85')
+        ])
+        assert [round(b[1], 2) for b in boxes] == [0.1, 0.6]
+
+    def test_crop_is_padded_and_clamped(self):
+        box = (95.0, 0.0, 0.5, 0.5, 0.5)
+        assert thumbnails.crop_rectangle(box, 1000, 800) == (0, 360, 550, 800)
+
+    def test_renders_small_jpegs(self):
+        original = jpeg()
+        rendered = thumbnails.render_thumbnails(original, [cat_label((0.25, 0.25, 0.5, 0.5))])
+
+        preview = Image.open(io.BytesIO(rendered['preview']))
+        assert max(preview.size) == thumbnails.PREVIEW_EDGE
+        assert len(rendered['cats']) == 1
+        crop = Image.open(io.BytesIO(rendered['cats'][0]))
+        assert max(crop.size) == thumbnails.CROP_EDGE
+        assert len(rendered['preview']) + len(rendered['cats'][0]) < len(original)
+
+    def test_no_cats_gives_preview_only(self):
+        rendered = thumbnails.render_thumbnails(jpeg(), [])
+        assert rendered['cats'] == []
+        assert rendered['preview']
+
+    def test_large_image_is_decoded_at_reduced_scale(self, monkeypatch):
+        from PIL import ImageOps
+        decoded = []
+        exif_transpose = ImageOps.exif_transpose
+        monkeypatch.setattr(ImageOps, 'exif_transpose', lambda image: decoded.append(image.size) or exif_transpose(image))
+        buffer = io.BytesIO()
+        Image.new('L', (9000, 9000), 128).save(buffer, format='JPEG')
+
+        rendered = thumbnails.render_thumbnails(buffer.getvalue(), [
+            cat_label((0.2, 0.2, 0.5, 0.5)),
+            # Padded, this box is 216px across: a full-size crop would need the whole image decoded
+            cat_label((0.8, 0.8, 0.02, 0.02), confidence='90')
+        ])
+
+        assert decoded == [(1125, 1125)]
+        assert len(rendered['cats']) == 1
+        assert max(Image.open(io.BytesIO(rendered['cats'][0])).size) == thumbnails.CROP_EDGE
+        assert max(Image.open(io.BytesIO(rendered['preview'])).size) == thumbnails.PREVIEW_EDGE
+
+    def test_image_the_decoder_cannot_reduce_is_not_rendered(self, monkeypatch):
+        monkeypatch.setattr(thumbnails, 'MAX_DECODED_PIXELS', 1_000_000)
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 1000)).save(buffer, format='PNG')
+        assert thumbnails.render_thumbnails(buffer.getvalue(), [cat_label((0.2, 0.2, 0.5, 0.5))]) is None
@@ -0,0 +1,132 @@
+import base64
+import io
+import json
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../perf'))
+
+from harness import Latency, install_stubs, load_handler
+
+
+@pytest.fixture
+def upload_handler(monkeypatch):
+    monkeypatch.setenv('S3_BUCKET', 'test-bucket')
+    monkeypatch.setenv('SQS_QUEUE', 'https://sqs.local/test-queue')
+    monkeypatch.setenv('DYNAMODB_TABLE', 'test-table')
+    handler = load_handler('upload')
+    stubs = install_stubs(handler, Latency(0, 0))
+    return handler, stubs
+
+
+def upload_event(image_data=None, content_type='image/jpeg'):
+    if image_data is None:
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10), color='red').save(buffer, format='JPEG')
+        image_data = buffer.getvalue()
+    return {
+        'httpMethod': 'POST',
+        'body': json.dumps({
+            'image_data': base64.b64encode(image_data).decode('utf-8'),
+            'content_type': content_type
+        })
+    }
+
+
+class TestUploadFanOut:
+    """Test the concurrent S3/DynamoDB writes and their compensation"""
+
+    def test_successful_upload_writes_everything(self, upload_handler):
+        handler, stubs = upload_handler
+        response = handler.lambda_handler(upload_event(), None)
+
+        assert response['statusCode'] == 200
+        assert len(stubs.clients['s3'].objects) == 1
+        assert len(stubs.resources['dynamodb'].Table('test-table').items) == 1
+        assert len(stubs.clients['sqs'].messages) == 1
+
+    def test_dynamodb_failure_rolls_back_s3_object(self, upload_handler):
+        handler, stubs = upload_handler
+        table = stubs.resources['dynamodb'].Table('test-table')
+
+        def failing_put_item(**kwargs):
+            raise Exception('throttled')
+        table.put_item = failing_put_item
+
+        response = handler.lambda_handler(upload_event(), None)
+
+        assert response['statusCode'] == 500
+        assert 'DynamoDB' in json.loads(response['body'])['error']
+        assert stubs.clients['s3'].objects == {}
+        assert stubs.clients['sqs'].messages == []
+
+    def test_sqs_failure_rolls_back_object_and_record(self, upload_handler):
+        handler, stubs = upload_handler
+
+        def failing_send_message(**kwargs):
+            raise Exception('queue unavailable')
+        stubs.clients['sqs'].send_message = failing_send_message
+
+        response = handler.lambda_handler(upload_event(), None)
+
+        assert response['statusCode'] == 500
+        assert stubs.clients['s3'].objects == {}
+        assert stubs.resources['dynamodb'].Table('test-table').items == {}
+
+
+class TestUploadValidation:
+    """Test that bad images are rejected before any AWS call"""
+
+    def test_corrupt_image_never_reaches_aws(self, upload_handler):
+        handler, stubs = upload_handler
+        response = handler.lambda_handler(upload_event(b'not an image at all'), None)
+
+        assert response['statusCode'] == 400
+        assert stubs.clients['s3'].objects == {}
+        assert stubs.clients['sqs'].messages == []
+
+    def test_oversize_payload_rejected_before_decode(self, upload_handler, monkeypatch):
+        handler, stubs = upload_handler
+        monkeypatch.setenv('MAX_IMAGE_BYTES', '100')
+        response = handler.lambda_handler(upload_event(), None)
+
+        assert response['statusCode'] == 413
+        assert stubs.clients['s3'].objects == {}
+
+
+class TestBinaryUpload:
+    """Test the raw image body upload path"""
+
+    def test_binary_body_is_accepted(self, upload_handler):
+        handler, stubs = upload_handler
+        json_event = upload_event()
+        image_data = json.loads(json_event['body'])['image_data']
+        event = {
+            'httpMethod': 'POST',
+            'headers': {'Content-Type': 'image/jpeg'},
+            'queryStringParameters': {'user_id': 'binary-user'},
+            'isBase64Encoded': True,
+            'body': image_data
+        }
+
+        response = handler.lambda_handler(event, None)
+
+        assert response['statusCode'] == 200
+        item = list(stubs.resources['dynamodb'].Table('test-table').items.values())[0]
+        assert item['user_id'] == 'binary-user'
+
+    def test_binary_body_without_binary_media_types(self, upload_handler):
+        handler, stubs = upload_handler
+        event = {
+            'httpMethod': 'POST',
+            'headers': {'content-type': 'image/jpeg'},
+            'isBase64Encoded': False,
+            'body': '\xff\xd8\xff mangled'
+        }
+
+        response = handler.lambda_handler(event, None)
+
+        assert response['statusCode'] == 415
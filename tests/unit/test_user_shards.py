@@ -0,0 +1,127 @@
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../perf'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/lambdas/upload'))
+
+from harness import Latency, install_stubs, load_handler
+from user_shards import user_shard_key
+
+
+@pytest.fixture
+def shard_env(monkeypatch):
+    monkeypatch.setenv('HOT_USERS', 'anonymous,kiosk')
+    monkeypatch.setenv('USER_SHARDS', '4')
+    monkeypatch.setenv('DYNAMODB_TABLE', 'test-table')
+
+
+class TestUserShardKey:
+    """Test the GSI partition keys written by the upload Lambda"""
+
+    def test_regular_user_uses_shard_zero(self, shard_env):
+        assert user_shard_key('alice', 'scan-1') == 'alice#0'
+        assert user_shard_key('alice', 'scan-2') == 'alice#0'
+
+    def test_hot_user_is_spread_over_shards(self, shard_env):
+        keys = {user_shard_key('anonymous', f'scan-{i}') for i in range(200)}
+        assert keys == {f'anonymous#{shard}' for shard in range(4)}
+
+    def test_shard_is_stable_per_scan(self, shard_env):
+        assert user_shard_key('kiosk', 'scan-123') == user_shard_key('kiosk', 'scan-123')
+
+    def test_history_reads_the_shards_upload_writes(self, shard_env):
+        status = load_handler('status')
+        written = {user_shard_key('anonymous', f'scan-{i}') for i in range(200)}
+        assert set(status.user_shard_keys('anonymous')) == written
+        assert status.user_shard_keys('alice') == ['alice#0']
+
+
+# Request context of an IAM-signed call
+ADMIN = {'identity': {'userArn': 'arn:aws:iam::123456789012:user/support'}}
+
+
+class TestHistory:
+    """Test the history endpoint's fan-out and merge"""
+
+    def make_status(self, pages):
+        status = load_handler('status')
+        table = MagicMock()
+        # Without ?before the condition is a single user_shard = <key> comparison
+        table.query.side_effect = lambda **kwargs: {'Items': pages.get(
+            kwargs['KeyConditionExpression'].get_expression()['values'][1], [])}
+        status._aws = {'dynamodb': MagicMock(Table=MagicMock(return_value=table))}
+        return status, table
+
+    def test_merges_shards_newest_first(self, shard_env):
+        pages = {
+            'anonymous#0': [{'scan_id': 'a', 'created_at': '2026-10-18T12:00:00'},
+                            {'scan_id': 'b', 'created_at': '2026-10-18T09:00:00'}],
+            'anonymous#2': [{'scan_id': 'c', 'created_at': '2026-10-18T11:00:00'}],
+            'anonymous#3': [{'scan_id': 'd', 'created_at': '2026-10-18T10:00:00'}],
+        }
+        status, table = self.make_status(pages)
+
+        response = status.history(
+            {'httpMethod': 'GET', 'requestContext': ADMIN, 'pathParameters': {'user_id': 'anonymous'},
+             'queryStringParameters': {'limit': '3'}}, None)
+
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert [scan['scan_id'] for scan in body['scans']] == ['a', 'c', 'd']
+        assert body['next_before'] == '2026-10-18T10:00:00|d'
+        assert table.query.call_count == 4
+        assert all(call.kwargs['IndexName'] == 'user-shard-created-index'
+                   for call in table.query.call_args_list)
+
+    def test_regular_user_queries_one_shard(self, shard_env):
+        status, table = self.make_status({'alice#0': [{'scan_id': 'a', 'created_at': '2026-10-18T12:00:00'}]})
+
+        response = status.history(
+            {'httpMethod': 'GET', 'requestContext': ADMIN, 'pathParameters': {'user_id': 'alice'}, 'queryStringParameters': None}, None)
+
+        body = json.loads(response['body'])
+        assert [scan['scan_id'] for scan in body['scans']] == ['a']
+        assert 'next_before' not in body
+        assert table.query.call_count == 1
+
+    def test_pages_through_scans_created_in_the_same_instant(self, shard_env, monkeypatch):
+        monkeypatch.setenv('DYNAMODB_TABLE', 'test-table')
+        status = load_handler('status')
+        stubs = install_stubs(status, Latency(0, 0))
+        table = stubs.resources['dynamodb'].Table('test-table')
+        # Five scans created in the same instant, stored out of scan id order
+        scans = [('newest', '12:00'), ('c', '11:00'), ('e', '11:00'), ('a', '11:00'), ('d', '11:00'),
+                 ('b', '11:00'), ('oldest', '10:00')]
+        for scan_id, time in scans:
+            table.put_item(Item={'scan_id': scan_id, 'user_shard': 'alice#0', 'created_at': f'2026-10-18T{time}:00'})
+
+        seen, before = [], None
+        while True:
+            params = {'limit': '2', **({'before': before} if before else {})}
+            body = json.loads(status.history({'httpMethod': 'GET', 'requestContext': ADMIN,
+                                              'pathParameters': {'user_id': 'alice'},
+                                              'queryStringParameters': params}, None)['body'])
+            seen += [scan['scan_id'] for scan in body['scans']]
+            before = body.get('next_before')
+            if not before:
+                break
+
+        assert seen == ['newest', 'e', 'd', 'c', 'b', 'a', 'oldest']
+
+    def test_rejects_invalid_limit(self, shard_env):
+        status = load_handler('status')
+        response = status.history(
+            {'httpMethod': 'GET', 'requestContext': ADMIN, 'pathParameters': {'user_id': 'alice'},
+             'queryStringParameters': {'limit': '1000'}}, None)
+        assert response['statusCode'] == 400
+
+    def test_refuses_callers_without_iam_identity(self, shard_env):
+        status, table = self.make_status({})
+        response = status.history(
+            {'httpMethod': 'GET', 'pathParameters': {'user_id': 'anonymous'}, 'queryStringParameters': None}, None)
+        assert response['statusCode'] == 403
+        table.query.assert_not_called()